@@ -0,0 +1,109 @@
+import os
+import random
+from typing import Dict, List
+
+
+_WORDS = [
+    'Dark', 'Night', 'River', 'Crown', 'Empire', 'Silent', 'Lost', 'Iron', 'Golden', 'Wild',
+    'Black', 'Broken', 'Hidden', 'Last', 'Red', 'Winter', 'Blue', 'Shadow', 'Fire', 'Stone',
+    'City', 'House', 'Road', 'Storm', 'Kingdom', 'Harbor', 'Garden', 'Station', 'Island', 'Valley',
+]
+_QUALITIES = ['720p', '1080p', '2160p']
+_SOURCES = ['WEB-DL', 'BluRay', 'HDTV', 'WEBRip']
+_CODECS = ['x264', 'x265', 'H.264', 'HEVC']
+_GROUPS = ['NTb', 'FLUX', 'SPARKS', 'RARBG', 'GalaxyTV', 'playWEB']
+_EXTENSIONS = ['.mkv', '.mkv', '.mkv', '.mp4', '.avi']
+
+
+def _title(rng: random.Random, used: set, words: int) -> str:
+    """Título inventado y único de 2-3 palabras."""
+    while True:
+        title = ' '.join(rng.sample(_WORDS, words))
+        if title not in used:
+            used.add(title)
+            return title
+
+
+def _release(rng: random.Random) -> str:
+    return f"{rng.choice(_QUALITIES)}.{rng.choice(_SOURCES)}.{rng.choice(_CODECS)}-{rng.choice(_GROUPS)}"
+
+
+def _touch(path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'\0')
+
+
+def episode_name(rng: random.Random, show: str, season: int, episode: int) -> str:
+    """Nombre de episodio con uno de los formatos habituales de release."""
+    dotted = show.replace(' ', '.')
+    style = rng.randrange(4)
+    ext = rng.choice(_EXTENSIONS)
+    if style == 0:
+        return f"{dotted}.S{season:02d}E{episode:02d}.{_release(rng)}{ext}"
+    if style == 1:
+        return f"{show} - {season}x{episode:02d} - Episode {episode}{ext}"
+    if style == 2:
+        return f"{dotted.lower()}.s{season:02d}e{episode:02d}.{rng.choice(_QUALITIES)}{ext}"
+    return f"[{rng.choice(_GROUPS)}] {show} S{season:02d}E{episode:02d} [{rng.choice(_QUALITIES)}]{ext}"
+
+
+def generate_library(watch_dir: str, files: int, movie_ratio: float = 0.3, seed: int = 1) -> Dict[str, List[str]]:
+    """Genera un árbol WATCH_DIR sintético con unos `files` videos (de 1 byte).
+
+    Mezcla películas sueltas o en carpeta, temporadas completas en carpeta y episodios sueltos,
+    además de archivos no video (.nfo, .srt). Con la misma semilla el árbol es idéntico."""
+    rng = random.Random(seed)
+    used = set()
+    created = {'movies': [], 'episodes': [], 'show_dirs': [], 'titles': {'movie': [], 'tv': []}}
+    movies = int(files * movie_ratio)
+
+    for _ in range(movies):
+        title = _title(rng, used, 2)
+        created['titles']['movie'].append(title)
+        year = rng.randrange(1970, 2025)
+        name = f"{title.replace(' ', '.')}.{year}.{_release(rng)}"
+        ext = rng.choice(_EXTENSIONS)
+        if rng.random() < 0.5:
+            path = os.path.join(watch_dir, name + ext)
+        else:
+            path = os.path.join(watch_dir, name, name + ext)
+            _touch(os.path.join(watch_dir, name, name + '.nfo'))
+        _touch(path)
+        created['movies'].append(path)
+
+    remaining = files - movies
+    while remaining > 0:
+        show = _title(rng, used, rng.choice((2, 3)))
+        created['titles']['tv'].append(show)
+        for season in range(1, rng.randrange(1, 4) + 1):
+            episodes = min(remaining, rng.randrange(6, 13))
+            if episodes <= 0:
+                break
+            in_folder = rng.random() < 0.7
+            season_dir = os.path.join(watch_dir, f"{show.replace(' ', '.')}.S{season:02d}.{_release(rng)}")
+            if in_folder:
+                created['show_dirs'].append(season_dir)
+            for episode in range(1, episodes + 1):
+                name = episode_name(rng, show, season, episode)
+                path = os.path.join(season_dir if in_folder else watch_dir, name)
+                _touch(path)
+                if in_folder and rng.random() < 0.2:
+                    _touch(os.path.splitext(path)[0] + '.srt')
+                created['episodes'].append(path)
+            remaining -= episodes
+
+    return created
+
+
+def add_new_files(watch_dir: str, files: int, seed: int = 2) -> List[str]:
+    """Añade una temporada nueva de una serie nueva (lo que llega en una importación)."""
+    rng = random.Random(seed)
+    show = f"Fresh {_title(rng, set(), 2)}"
+    season_dir = os.path.join(watch_dir, f"{show.replace(' ', '.')}.S01.{_release(rng)}")
+    paths = []
+    for episode in range(1, files + 1):
+        path = os.path.join(season_dir, episode_name(rng, show, 1, episode))
+        _touch(path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""Benchmarks de Media Sorter sobre una biblioteca sintética y un TMDb local.
+
+Cada caso se ejecuta en un proceso propio con un directorio temporal y cachés frías, ya que
+la configuración y las cachés de src son únicas por proceso. Ejemplo:
+
+    python bench/run.py --files 2000 --latency 0.05 --output bench-results.json
+    python bench/run.py --cases initial_scan map_persistence --backend sqlite
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.library import add_new_files, generate_library  # noqa: E402
+from bench.tmdb_stub import TmdbStub, write_export  # noqa: E402
+
+CASES = ['initial_scan', 'incremental_batch', 'startup_cleanup', 'delete_cascade', 'map_persistence', 'offline_export']
+
+
+def _timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    value = func(*args, **kwargs)
+    return value, time.perf_counter() - started
+
+
+class _Bench:
+    """Entorno de un caso: biblioteca sintética, stub de TMDb y src importado contra ambos."""
+
+    def __init__(self, args, workdir):
+        self.args = args
+        self.watch_dir = os.path.join(workdir, 'watch')
+        self.stub = TmdbStub(args.latency).start()
+        try:
+            os.environ.update({
+                'WATCH_DIR': self.watch_dir,
+                'SERIES_DIR': os.path.join(workdir, 'series'),
+                'MOVIES_DIR': os.path.join(workdir, 'movies'),
+                'CONFIG_DIR': os.path.join(workdir, 'config'),
+                'TMDB_API_KEY': 'bench',
+                'TMDB_API_URL': self.stub.url,
+                'LINKS_BACKEND': args.backend,
+            })
+            for var in ('SERIES_DIR', 'MOVIES_DIR', 'CONFIG_DIR'):
+                os.makedirs(os.environ[var], exist_ok=True)
+            self.library = generate_library(self.watch_dir, args.files, seed=args.seed)
+
+            from src.config import get_config, setup_logging
+            setup_logging()
+            logging.getLogger().setLevel(logging.WARNING)
+            get_config().validate_paths()
+
+            from src.organizer import set_link_manager
+            from src.link_manager import create_link_manager
+            self.link_manager = create_link_manager()
+            set_link_manager(self.link_manager)
+        except BaseException:
+            # Sin caso que ejecutar: el servidor del stub no debe sobrevivir al fallo
+            self.stub.stop()
+            raise
+
+    def organize(self, paths=None):
+        from src.scanner import iter_classified
+        from src.organizer import organize_items
+        return organize_items(iter_classified(paths))
+
+    def initial(self):
+        """Organización inicial completa (no cronometrada en los demás casos)."""
+        result = self.organize()
+        self.link_manager.save()
+        return result
+
+
+def case_initial_scan(bench):
+    result, seconds = _timed(bench.organize)
+    return {'seconds': seconds, 'items': result.items, 'linked': result.linked,
+            'plan_seconds': result.plan_seconds, 'mkdir_seconds': result.mkdir_seconds,
+            'link_seconds': result.link_seconds, 'tmdb_requests': bench.stub.requests}
+
+
+def case_incremental_batch(bench):
+    bench.initial()
+    requests_before = bench.stub.requests
+    new_paths = add_new_files(bench.watch_dir, bench.args.batch)
+    result, seconds = _timed(bench.organize, new_paths)
+    return {'seconds': seconds, 'files': len(new_paths), 'linked': result.linked,
+            'tmdb_requests': bench.stub.requests - requests_before}
+
+
+def case_startup_cleanup(bench):
+    bench.initial()
+    # Borrar el 10% de las fuentes junto con sus enlaces: entradas rotas del mapa
+    sources = sorted(bench.link_manager.get_all_sources())[::10]
+    for source in sources:
+        for link in bench.link_manager.get_links(source):
+            os.remove(link)
+        os.remove(source)
+
+    from src.link_manager import create_link_manager
+    link_manager, load_seconds = _timed(create_link_manager)
+    cleaned, cleanup_seconds = _timed(link_manager.cleanup_broken_links)
+    return {'seconds': load_seconds + cleanup_seconds, 'load_seconds': load_seconds,
+            'cleanup_seconds': cleanup_seconds, 'entries': link_manager.get_stats()['total_sources'] + cleaned,
+            'cleaned': cleaned}
+
+
+def case_delete_cascade(bench):
+    bench.initial()
+    from src.watcher import MediaWatcher
+    watcher = MediaWatcher(bench.link_manager)
+    # Borrar todas las carpetas de temporada, como al eliminar una biblioteca de series
+    dirs = [d for d in bench.library['show_dirs'] if os.path.isdir(d)]
+    started = time.perf_counter()
+    for dir_path in dirs:
+        shutil.rmtree(dir_path)
+        watcher._handle_deleted(dir_path, True)
+    seconds = time.perf_counter() - started
+    return {'seconds': seconds, 'directories': len(dirs),
+            'remaining_sources': bench.link_manager.get_stats()['total_sources']}
+
+
+def case_map_persistence(bench):
+    bench.initial()
+    link_manager = bench.link_manager
+    entries = bench.args.map_entries
+    fake_root = os.path.join(bench.watch_dir, 'synthetic')
+
+    def add_entries():
+        with link_manager.batch():
+            for i in range(entries):
+                link_manager.add_link(os.path.join(fake_root, f"{i:07d}.mkv"),
+                                      os.path.join(fake_root + '-dest', f"{i:07d}.mkv"))
+
+    _, add_seconds = _timed(add_entries)
+    _, save_seconds = _timed(link_manager.save)
+    from src.link_manager import create_link_manager
+    reloaded, load_seconds = _timed(create_link_manager)
+    _, remove_seconds = _timed(reloaded.remove_subtree, fake_root)
+    return {'seconds': add_seconds + save_seconds + load_seconds + remove_seconds,
+            'add_seconds': add_seconds, 'save_seconds': save_seconds, 'load_seconds': load_seconds,
+            'remove_subtree_seconds': remove_seconds, 'entries': reloaded.get_stats()['total_sources'] + entries}
+
+
+def case_offline_export(bench):
+    """Escaneo inicial sin red, resolviendo desde exportaciones de TMDb (índice incluido)."""
+    import dataclasses
+    from src.config import get_config, set_config
+    export_dir = os.path.join(os.path.dirname(bench.watch_dir), 'exports')
+    os.makedirs(export_dir)
+    write_export(os.path.join(export_dir, 'movie_ids_01_01_2024.json.gz'), bench.library['titles']['movie'])
+    write_export(os.path.join(export_dir, 'tv_series_ids_01_01_2024.json.gz'), bench.library['titles']['tv'], kind='tv')
+    set_config(dataclasses.replace(get_config(), tmdb_export_dir=export_dir, tmdb_offline=True))
+
+    from src.tmdb_export import get_export_index
+    _, index_seconds = _timed(get_export_index)
+    result, seconds = _timed(bench.organize)
+    return {'seconds': seconds, 'index_seconds': index_seconds, 'items': result.items,
+            'linked': result.linked, 'tmdb_requests': bench.stub.requests}
+
+
+def _run_case(args):
+    """Ejecuta un único caso en este proceso e imprime su resultado como JSON."""
+    workdir = tempfile.mkdtemp(prefix='media-sorter-bench-')
+    try:
+        bench = _Bench(args, workdir)
+        try:
+            result = globals()[f"case_{args.case}"](bench)
+        finally:
+            bench.stub.stop()
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(result))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _run_all(args):
+    results = {
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': {'files': args.files, 'batch': args.batch, 'latency': args.latency,
+                   'map_entries': args.map_entries, 'backend': args.backend, 'seed': args.seed},
+        'cases': {},
+    }
+    for case in args.cases:
+        command = [sys.executable, os.path.abspath(__file__), '--case', case,
+                   '--files', str(args.files), '--batch', str(args.batch), '--latency', str(args.latency),
+                   '--map-entries', str(args.map_entries), '--backend', args.backend, '--seed', str(args.seed)]
+        print(f"⏱️ {case}...", file=sys.stderr, flush=True)
+        completed = subprocess.run(command, stdout=subprocess.PIPE, text=True)
+        if completed.returncode != 0:
+            results['cases'][case] = {'error': f"exit code {completed.returncode}"}
+            continue
+        results['cases'][case] = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(f"   {results['cases'][case]['seconds']:.3f}s", file=sys.stderr, flush=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"📄 Resultados en {args.output}", file=sys.stderr)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmarks de Media Sorter")
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES)
+    parser.add_argument('--files', type=int, default=2000, help="videos en la biblioteca sintética")
+    parser.add_argument('--batch', type=int, default=24, help="archivos del lote incremental")
+    parser.add_argument('--latency', type=float, default=0.05, help="latencia del stub de TMDb (segundos)")
+    parser.add_argument('--map-entries', type=int, default=50000, help="entradas extra en map_persistence")
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json', help="LINKS_BACKEND")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench-results.json')
+    parser.add_argument('--keep', action='store_true', help="conservar el directorio temporal")
+    parser.add_argument('--case', choices=CASES, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    arguments = _parse_args(sys.argv[1:])
+    if arguments.case:
+        _run_case(arguments)
+    else:
+        _run_all(arguments)
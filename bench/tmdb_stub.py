@@ -0,0 +1,111 @@
+import gzip
+import json
+import time
+import zlib
+import threading
+from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def write_export(path: str, titles, kind: str = 'movie', seed: int = 0):
+    """Escribe una exportación diaria de IDs de TMDb (JSON lines con gzip) con los `titles`
+    dados, con los mismos IDs que devuelve el stub en las búsquedas."""
+    key = 'original_title' if kind == 'movie' else 'original_name'
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for i, title in enumerate(titles):
+            entry = {'id': zlib.crc32(title.encode('utf-8')), key: title, 'popularity': (i * 7919 + seed) % 1000 / 10}
+            if kind == 'movie':
+                entry.update({'adult': False, 'video': False})
+            f.write(json.dumps(entry) + '\n')
+
+
+class TmdbStub:
+    """Servidor local que imita los endpoints de TMDb usados por tmdb_utils.
+
+    Cada respuesta espera `latency` segundos. Los títulos que contienen `missing_marker` no
+    devuelven resultados. Con fail() se inyectan respuestas de error (429, 5xx) para probar los
+    reintentos. Se usa exportando TMDB_API_URL=stub.url antes de importar src."""
+
+    def __init__(self, latency: float = 0.05, missing_marker: str = 'Unknown'):
+        self.latency = latency
+        self.missing_marker = missing_marker
+        self.requests = 0
+        self._failures = []  # [[fragmento de ruta, código, veces restantes, Retry-After]]
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='tmdb-stub', daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/3"
+
+    def start(self) -> 'TmdbStub':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def fail(self, status: int, times: int = 1, path: str = '', retry_after: Optional[float] = 0):
+        """Las próximas `times` peticiones cuya ruta contiene `path` responden `status` (p. ej. 429,
+        503 o 404) en lugar del resultado, con la cabecera Retry-After si no es None."""
+        with self._lock:
+            self._failures.append([path, status, times, retry_after])
+        return self
+
+    def _next_failure(self, path: str):
+        with self._lock:
+            for failure in self._failures:
+                if failure[0] in path:
+                    failure[2] -= 1
+                    if failure[2] <= 0:
+                        self._failures.remove(failure)
+                    return failure[1], failure[3]
+        return None
+
+    def _respond(self, path: str, query: dict) -> dict:
+        parts = path.strip('/').split('/')[1:]  # Sin el prefijo de versión
+        if parts[:1] == ['search']:
+            title = query.get('query', [''])[0]
+            if self.missing_marker and self.missing_marker.lower() in title.lower():
+                return {'results': []}
+            item_id = zlib.crc32(title.encode('utf-8'))
+            return {'results': [{'id': item_id, 'title': title, 'name': title, 'release_date': '2001-01-01'}]}
+        # Detalles en es-ES: el título se marca para distinguirlo del de búsqueda
+        return {'id': parts[-1], 'title': f"Titulo {parts[-1]}", 'name': f"Serie {parts[-1]}"}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                url = urlparse(self.path)
+                failure = stub._next_failure(url.path)
+                if failure is not None:
+                    status, retry_after = failure
+                    body = json.dumps({'status_code': status, 'status_message': 'stub'}).encode('utf-8')
+                    self.send_response(status)
+                    if retry_after is not None:
+                        self.send_header('Retry-After', str(retry_after))
+                else:
+                    body = json.dumps(stub._respond(url.path, parse_qs(url.query))).encode('utf-8')
+                    self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
@@ -1,33 +1,79 @@
 #!/usr/bin/env python3
+import time
+
+# Referencia del presupuesto de arranque: lo primero que se ejecuta del script
+_STARTED = time.perf_counter()
+
 import sys
 import os
+import argparse
 import logging
+import threading
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-if __name__ == "__main__":
-    from src.scanner import scan_and_classify
-    from src.organizer import organize_items, set_link_manager
-    from src.config import WATCH_DIR, TMDB_API_KEY, SERIES_DIR, MOVIES_DIR
-    from src.link_manager import LinkManager
+from src.config import ConfigError, get_config, load_config, set_config, setup_logging  # noqa: E402
+
+
+def _check_startup_budget(command: str) -> float:
+    """Registra el tiempo de arranque hasta estar listo para trabajar y avisa si supera
+    STARTUP_BUDGET_SECONDS. Retorna los segundos transcurridos."""
+    elapsed = time.perf_counter() - _STARTED
+    budget = get_config().startup_budget_seconds
+    if elapsed > budget:
+        logging.warning(f"🐢 Arranque de '{command}' en {elapsed:.3f}s, por encima del presupuesto de {budget:g}s")
+    else:
+        logging.info(f"⏱️ Arranque de '{command}' en {elapsed:.3f}s (presupuesto {budget:g}s)")
+    return elapsed
+
+
+def _watch(args):
+    """Modo por defecto: organización inicial y vigilancia continua de WATCH_DIR."""
+    from src.scanner import iter_classified
+    from src.organizer import organize_items, set_link_manager, set_inode_index
+    from src.inode_index import InodeIndex
+    from src.metrics import start_metrics_server
+    from src.tracing import collect, export_trace, profiled, span
+    from src.reconcile import reconcile, relink_unlinked
+    from src.fs_walk import DirSnapshot
+    from src.link_manager import create_link_manager
     from src.watcher import start_watching
 
+    config = get_config()
     logging.info("=" * 50)
-    logging.info(f"📁 Watch dir : {WATCH_DIR}")
-    logging.info(f"📺 Series dir: {SERIES_DIR}")
-    logging.info(f"🎬 Movies dir: {MOVIES_DIR}")
-    logging.info(f"🔑 TMDB API  : {'Activa' if TMDB_API_KEY else 'INACTIVA'}")
+    logging.info(f"📁 Watch dir : {config.watch_dir}")
+    logging.info(f"📺 Series dir: {config.series_dir}")
+    logging.info(f"🎬 Movies dir: {config.movies_dir}")
+    logging.info(f"🔑 TMDB API  : {'Activa' if config.tmdb_api_key else 'INACTIVA'}")
     logging.info("=" * 50)
+    _check_startup_budget('watch')
+
+    # Endpoint de métricas opcional (se activa antes del escaneo inicial para medirlo)
+    if config.metrics_port:
+        start_metrics_server(config.metrics_port, config.metrics_host)
 
     # Inicializar LinkManager
-    link_manager = LinkManager()
+    link_manager = create_link_manager()
     set_link_manager(link_manager)
 
     logging.info("🚀 Media Sorter iniciado (modo vigilancia)")
 
-    # Limpieza inicial de links rotos
-    logging.info("🧹 Limpiando enlaces rotos...")
-    link_manager.cleanup_broken_links()
+    # Limpieza inicial de links rotos (opcionalmente en segundo plano)
+    if config.cleanup_in_background:
+        def _cleanup():
+            link_manager.cleanup_broken_links()
+            # Las fuentes que la limpieza deja sin links se reconcilian cuando termina
+            if config.startup_reconcile:
+                relink_unlinked(link_manager)
+
+        logging.info("🧹 Limpiando enlaces rotos en segundo plano...")
+        threading.Thread(target=_cleanup, name='cleanup', daemon=True).start()
+    else:
+        logging.info("🧹 Limpiando enlaces rotos...")
+        link_manager.cleanup_broken_links()
+
+    # Índice de inodos de lo ya enlazado, para no repetir enlaces tras reinicios o renombrados
+    set_inode_index(InodeIndex.build([config.series_dir, config.movies_dir]))
 
     # Mostrar estadísticas
     stats = link_manager.get_stats()
@@ -35,12 +81,26 @@ if __name__ == "__main__":
 
     # Procesamiento inicial de archivos existentes
     logging.info("🔍 Escaneando archivos existentes...")
-    classified_items = scan_and_classify()
+    # Con la instantánea de directorios solo se listan los modificados desde el último arranque
+    snapshot = DirSnapshot(config.dir_snapshot_path) if config.scan_snapshot else None
+
+    with profiled('startup'), collect() as trace, span('startup_scan'):
+        if config.startup_reconcile:
+            # Solo se procesan las diferencias entre WATCH_DIR y el mapa de links
+            organized = reconcile(link_manager, snapshot, include_unlinked=not config.cleanup_in_background)
+        else:
+            # Los items se organizan según se clasifican, sin esperar al final del escaneo
+            organized = organize_items(iter_classified(snapshot=snapshot))
 
-    if classified_items:
-        logging.info(f"📦 Organizando {len(classified_items)} item(s) existente(s)...")
-        organize_items(classified_items)
-        logging.info("✅ Organización inicial completada")
+    # Guardar la instantánea solo tras completar la organización
+    if snapshot is not None:
+        snapshot.prune(config.watch_dir)
+        snapshot.save()
+
+    export_trace('startup', trace)
+
+    if organized.items:
+        logging.info(f"✅ Organización inicial completada: {organized.summary()}")
     else:
         logging.info("ℹ️ No se encontraron items nuevos para organizar")
 
@@ -49,3 +109,96 @@ if __name__ == "__main__":
     # Iniciar vigilancia continua
     start_watching(link_manager)
 
+
+def _plan(args):
+    """Clasifica (con cachés) y escribe el plan de enlaces como líneas JSON, sin tocar los destinos."""
+    from src.scanner import iter_classified
+    from src.plan import write_plan
+    from src.tracing import collect, export_trace, profiled
+    _check_startup_budget('plan')
+
+    items = iter_classified(args.paths or None)
+    with profiled('plan'), collect() as trace:
+        if args.output == '-':
+            result = write_plan(items, sys.stdout)
+        else:
+            with open(args.output, 'w', encoding='utf-8') as out:
+                result = write_plan(items, out)
+    export_trace('plan', trace)
+    logging.info(f"📝 Plan generado: {result.planned} enlace(s) de {result.items} item(s)")
+
+
+def _apply(args):
+    """Ejecuta un plan guardado sin volver a clasificar."""
+    from src.organizer import set_link_manager
+    from src.link_manager import create_link_manager
+    from src.plan import read_plan, apply_plan
+    from src.tracing import collect, export_trace, profiled
+    _check_startup_budget('apply')
+
+    link_manager = create_link_manager()
+    set_link_manager(link_manager)
+
+    with profiled('apply'), collect() as trace:
+        if args.plan == '-':
+            result = apply_plan(read_plan(sys.stdin))
+        else:
+            with open(args.plan, 'r', encoding='utf-8') as f:
+                result = apply_plan(read_plan(f))
+        link_manager.save()
+    export_trace('apply', trace)
+    logging.info(f"✅ Plan aplicado: {result.summary()}")
+
+
+def _health(args):
+    """Comprobación de salud: configuración y rutas sin efectos secundarios, e importación
+    de los módulos de trabajo dentro del presupuesto de arranque. Sale con código 1 si falla."""
+    try:
+        get_config().validate_paths(create=False)
+    except ConfigError as e:
+        logging.error(f"❌ {e}")
+        sys.exit(1)
+    import src.scanner  # noqa: F401
+    import src.organizer  # noqa: F401
+    import src.watcher  # noqa: F401
+    elapsed = _check_startup_budget('health')
+    if args.strict and elapsed > get_config().startup_budget_seconds:
+        sys.exit(1)
+    logging.info("✅ Media Sorter operativo")
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Organiza WATCH_DIR en SERIES_DIR y MOVIES_DIR con hard links.")
+    parser.set_defaults(func=_watch)
+    commands = parser.add_subparsers(title="comandos")
+
+    watch = commands.add_parser('watch', help="organización inicial y vigilancia continua (por defecto)")
+    watch.set_defaults(func=_watch)
+
+    plan = commands.add_parser('plan', help="escribe el plan de enlaces como JSON lines sin tocar los destinos")
+    plan.add_argument('paths', nargs='*', help="rutas a planificar (por defecto, todo WATCH_DIR)")
+    plan.add_argument('-o', '--output', default='-', help="archivo de salida ('-' para stdout)")
+    plan.set_defaults(func=_plan)
+
+    apply = commands.add_parser('apply', help="ejecuta un plan guardado sin volver a clasificar")
+    apply.add_argument('plan', help="archivo de plan ('-' para stdin)")
+    apply.set_defaults(func=_apply)
+
+    health = commands.add_parser('health', help="comprueba configuración, rutas y tiempo de arranque sin modificar nada")
+    health.add_argument('--strict', action='store_true', help="falla también si se supera STARTUP_BUDGET_SECONDS")
+    health.set_defaults(func=_health)
+
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = _parse_args(sys.argv[1:])
+    setup_logging()
+    try:
+        set_config(load_config())
+        if args.func is not _health:
+            get_config().validate_paths()
+    except ConfigError as e:
+        logging.error(f"❌ {e}")
+        sys.exit(1)
+    args.func(args)
@@ -0,0 +1,91 @@
+import os
+import time
+import threading
+from typing import Dict, List, Tuple
+
+
+class CompletionTracker:
+    """Detecta cuándo un archivo ha terminado de copiarse.
+
+    Si el observador nativo entrega eventos de cierre tras escritura (inotify CLOSE_WRITE),
+    el archivo se da por completo en ese momento. Si no, se comprueba con sondeos de
+    tamaño y mtime: dos sondeos iguales seguidos lo dan por estable. Mientras el archivo
+    siga creciendo el intervalo entre sondeos se duplica hasta `max_interval`, de modo que
+    una copia larga por SMB no se sondea cada segundo y un archivo pequeño no espera de más."""
+
+    def __init__(self, min_interval: float, max_interval: float):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self._files: Dict[str, dict] = {}  # {path: {'state', 'interval', 'next', 'closed', 'since'}}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._files)
+
+    def paths(self) -> List[str]:
+        """Rutas que siguen pendientes de completarse."""
+        with self._lock:
+            return list(self._files)
+
+    def track(self, path: str):
+        """Registra actividad en un archivo: aplaza su siguiente sondeo."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is None:
+                self._files[path] = {'state': None, 'interval': self.min_interval,
+                                     'next': now + self.min_interval, 'closed': False, 'since': now}
+            elif not entry['closed']:
+                entry['next'] = now + entry['interval']
+
+    def mark_complete(self, path: str):
+        """Marca un archivo como completo (cerrado tras escribir o movido de forma atómica)."""
+        with self._lock:
+            previous = self._files.get(path)
+            since = previous['since'] if previous else time.monotonic()
+            self._files[path] = {'state': None, 'interval': self.min_interval, 'next': 0.0, 'closed': True,
+                                 'since': since}
+
+    def discard(self, path: str):
+        """Deja de seguir un archivo, o todos los de un directorio."""
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock:
+            self._files.pop(path, None)
+            for tracked in [p for p in self._files if p.startswith(prefix)]:
+                del self._files[tracked]
+
+    @staticmethod
+    def _probe(path: str):
+        """Tamaño y mtime actuales del archivo, o None si ya no existe."""
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return None
+        return stat_result.st_size, stat_result.st_mtime_ns
+
+    def pop_ready(self) -> List[Tuple[str, float]]:
+        """Retorna (y deja de seguir) los archivos que ya están completos, con el instante
+        (time.monotonic) en que se detectaron por primera vez."""
+        now = time.monotonic()
+        with self._lock:
+            due = [(path, entry) for path, entry in self._files.items() if entry['next'] <= now]
+
+        ready = []
+        for path, entry in due:
+            state = None if entry['closed'] else self._probe(path)
+            with self._lock:
+                if self._files.get(path) is not entry:
+                    continue  # Descartado o reemplazado mientras se sondeaba
+                if not entry['closed'] and state is None:
+                    del self._files[path]  # Ya no existe
+                elif entry['closed'] or entry['state'] == state:
+                    del self._files[path]
+                    ready.append((path, entry['since']))
+                else:
+                    # Primer sondeo: misma espera; cambió desde el anterior: backoff exponencial
+                    if entry['state'] is not None:
+                        entry['interval'] = min(entry['interval'] * 2, self.max_interval)
+                    entry['state'] = state
+                    entry['next'] = now + entry['interval']
+        return ready
@@ -1,12 +1,10 @@
 import os
 import logging
 import sys
+import threading
+from dataclasses import dataclass, fields
 from pathlib import Path
-
-# Configurar logger raíz de forma sencilla si no hay handlers
-_root_logger = logging.getLogger()
-if not _root_logger.handlers:
-    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format='%(levelname)s: %(message)s')
+from typing import Mapping, Optional
 
 # Extensiones de video soportadas
 VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.iso', '.webm', '.ts', '.m2ts', '.wmv')
@@ -20,69 +18,296 @@ REQUIRED_ENV_VARS = [
     "CONFIG_DIR",
 ]
 
+# Procesos de guessit por defecto (SCAN_WORKERS): uno por CPU
+DEFAULT_SCAN_WORKERS = os.cpu_count() or 1
+
+
+class ConfigError(ValueError):
+    """Configuración de entorno ausente o inválida."""
+
+
+def setup_logging():
+    """Configura el logger raíz de forma sencilla si no hay handlers."""
+    if not logging.getLogger().handlers:
+        logging.basicConfig(stream=sys.stderr, level=logging.INFO, format='%(levelname)s: %(message)s')
+
+
 # Helper: leer variable de entorno y tratar cadenas vacías como no definidas
-def _get_env(var_name: str):
-    val = os.environ.get(var_name)
+def _get_env(environ: Mapping[str, str], var_name: str):
+    val = environ.get(var_name)
     if val is None:
         return None
     val = val.strip()
     return val if val else None
 
-# Construir dict de configuración y detectar ausentes
-CONFIG = {}
-missing = []
-for v in REQUIRED_ENV_VARS:
-    val = _get_env(v)
+# Helper: leer variable de entorno numérica opcional con valor por defecto
+def _get_env_float(environ: Mapping[str, str], var_name: str, default: float) -> float:
+    val = _get_env(environ, var_name)
     if val is None:
-        missing.append(v)
-    else:
-        CONFIG[v] = val
-
-if missing:
-    logging.error("❌ Variables de entorno obligatorias no definidas: %s", ", ".join(missing))
-    sys.exit(1)
-
-# Extraer variables (guardadas como cadenas para compatibilidad)
-WATCH_DIR = CONFIG["WATCH_DIR"]
-SERIES_DIR = CONFIG["SERIES_DIR"]
-MOVIES_DIR = CONFIG["MOVIES_DIR"]
-CONFIG_DIR = CONFIG["CONFIG_DIR"]
-TMDB_API_KEY = CONFIG['TMDB_API_KEY']
-
-# Construir ruta Path para el archivo de hardlinks usando el objeto Path de pathlib
-HARDLINKS_DB_PATH = Path(CONFIG_DIR) / 'hardlinks_map.json'
-
-# Validar TMDB API key (no vacía)
-if not isinstance(TMDB_API_KEY, str) or not TMDB_API_KEY.strip():
-    logging.error("❌ TMDB_API_KEY inválida o vacía.")
-    sys.exit(1)
-
-# Comprobar existencia de las rutas de directorio requeridas
-for _var_name, _path_str in (('WATCH_DIR', WATCH_DIR), ('SERIES_DIR', SERIES_DIR), ('MOVIES_DIR', MOVIES_DIR)):
-    _p = Path(_path_str)
-    if not _p.exists() or not _p.is_dir():
-        logging.error("❌ %s no existe o no es un directorio: %s", _var_name, _path_str)
-        sys.exit(1)
-
-# Asegurar que el directorio CONFIG_DIR existe
-_config_dir_path = Path(CONFIG_DIR)
-if not _config_dir_path.exists():
-    logging.info("📁 Creando directorio de configuración: %s", CONFIG_DIR)
-    _config_dir_path.mkdir(parents=True, exist_ok=True)
-elif not _config_dir_path.is_dir():
-    logging.error("❌ CONFIG_DIR existe pero no es un directorio: %s", CONFIG_DIR)
-    sys.exit(1)
-
-# Crear archivo de hardlinks si no existe
-_hardlinks_path = HARDLINKS_DB_PATH
-if not _hardlinks_path.exists():
-    logging.info("📝 Creando archivo de hardlinks: %s", _hardlinks_path)
-    _hardlinks_path.write_text('{}', encoding='utf-8')
-elif not _hardlinks_path.is_file():
-    logging.error("❌ La ruta de hardlinks existe pero no es un archivo: %s", _hardlinks_path)
-    sys.exit(1)
-
-logging.info("ℹ️ Config rutas: WATCH_DIR=%s, SERIES_DIR=%s, MOVIES_DIR=%s, CONFIG_DIR=%s",
-             WATCH_DIR, SERIES_DIR, MOVIES_DIR, CONFIG_DIR)
-
-logging.info("✅ Configuración de entorno validada correctamente.")
+        return default
+    try:
+        return float(val)
+    except ValueError:
+        raise ConfigError(f"Valor numérico inválido para {var_name}: {val}")
+
+# Helper: leer variable de entorno entera opcional con valor por defecto
+def _get_env_int(environ: Mapping[str, str], var_name: str, default: int) -> int:
+    val = _get_env(environ, var_name)
+    if val is None:
+        return default
+    try:
+        return int(val)
+    except ValueError:
+        raise ConfigError(f"Valor entero inválido para {var_name}: {val}")
+
+
+@dataclass(frozen=True)
+class Config:
+    """Configuración del servicio leída del entorno.
+
+    Crearla no toca el sistema de archivos: las rutas se comprueban (y CONFIG_DIR se crea)
+    solo al llamar a validate_paths(), que hacen los comandos que las necesitan."""
+
+    watch_dir: str
+    series_dir: str
+    movies_dir: str
+    config_dir: str
+    tmdb_api_key: str
+
+    # Backend del mapa de hard links: 'json' (instantánea + journal) o 'sqlite' (indexado, sin cargar en memoria)
+    links_backend: str = 'json'
+
+    # Limpieza de enlaces rotos al arrancar: hilos de comprobación y ejecución en segundo plano
+    cleanup_workers: int = 16
+    cleanup_in_background: bool = False
+
+    # Operaciones acumuladas en el journal de hard links antes de compactar la instantánea
+    # (como mínimo; el umbral real crece con el tamaño del mapa para amortizar la reescritura)
+    links_compact_threshold: int = 1000
+
+    # Tiempos de vida de la caché persistente de búsquedas en TMDb
+    tmdb_cache_ttl_seconds: float = 30 * 86400
+    tmdb_cache_negative_ttl_seconds: float = 24 * 3600
+
+    # Caché de resultados de guessit: entradas en memoria (LRU) y persistencia opcional en SQLite
+    parse_cache_size: int = 50000
+    parse_cache_persist: bool = True
+
+    # Escaneo: procesos para guessit, archivos por bloque de la tubería y mínimo de archivos
+    # sin caché a partir del cual compensa arrancar el pool de procesos
+    scan_workers: int = DEFAULT_SCAN_WORKERS
+    scan_chunk_size: int = 1000
+    scan_parallel_min: int = 200
+
+    # Instantánea de mtimes de directorios de WATCH_DIR: al reiniciar solo se listan los modificados
+    scan_snapshot: bool = True
+
+    # Índice de la biblioteca: los episodios de series que ya tienen carpeta en SERIES_DIR van a
+    # ella sin consultar la caché ni TMDb
+    library_index: bool = True
+
+    # Arranque por reconciliación (diferencia entre WATCH_DIR y el mapa de links) en lugar de
+    # reprocesar todo; por encima de esta fracción de fuentes desaparecidas no se borran sus links
+    startup_reconcile: bool = True
+    reconcile_max_orphan_ratio: float = 0.5
+
+    # Vigilante: hilos que procesan lotes, polling en lugar de observador nativo, sondeos de
+    # tamaño/mtime para detectar copias terminadas (intervalo inicial y máximo) y segundos
+    # máximos que se retiene un grupo listo (misma serie o carpeta) esperando al resto
+    watcher_workers: int = 2
+    watcher_polling: bool = False
+    watcher_stable_min_seconds: float = 1.0
+    watcher_stable_max_seconds: float = 30.0
+    watcher_coalesce_seconds: float = 10.0
+
+    # Sondeo (WATCHER_POLLING=1): segundos entre pasadas y tope de stats/listados por segundo
+    watcher_poll_interval: float = 10.0
+    watcher_poll_max_stats: float = 500.0
+
+    # Métricas en formato Prometheus: puerto del endpoint /metrics (0 = desactivadas) e interfaz
+    metrics_port: int = 0
+    metrics_host: str = '127.0.0.1'
+
+    # Diagnóstico: TRACING=1 exporta trazas Chrome/Perfetto y PROFILE_BATCHES=1 un .pstats por lote
+    tracing: bool = False
+    profile_batches: bool = False
+
+    # Segundos en los que el proceso debe estar listo para trabajar (se mide y se avisa si se supera)
+    startup_budget_seconds: float = 1.0
+
+    # Cliente TMDb: URL base (sustituible por un servidor local de pruebas), concurrencia,
+    # límite de peticiones por segundo (TMDb admite ~50/s por IP), reintentos y timeout
+    tmdb_api_url: str = 'https://api.themoviedb.org/3'
+    tmdb_workers: int = 8
+    tmdb_rate_limit: float = 40.0
+    tmdb_max_retries: int = 5
+    tmdb_timeout: float = 10.0
+
+    # Exportaciones diarias de IDs de TMDb (movie_ids_*.json.gz, tv_series_ids_*.json.gz): con
+    # TMDB_EXPORT_DIR los títulos se resuelven en un índice local y la red solo se usa para los
+    # fallos y el título en es-ES; con TMDB_OFFLINE=1 no se usa la red en absoluto
+    tmdb_export_dir: Optional[str] = None
+    tmdb_offline: bool = False
+
+    @property
+    def hardlinks_db_path(self) -> Path:
+        return Path(self.config_dir) / 'hardlinks_map.json'
+
+    @property
+    def hardlinks_sqlite_path(self) -> Path:
+        return Path(self.config_dir) / 'hardlinks_map.sqlite3'
+
+    @property
+    def tmdb_cache_path(self) -> Path:
+        return Path(self.config_dir) / 'tmdb_cache.sqlite3'
+
+    @property
+    def tmdb_export_index_path(self) -> Path:
+        return Path(self.config_dir) / 'tmdb_export.sqlite3'
+
+    @property
+    def parse_cache_path(self) -> Path:
+        return Path(self.config_dir) / 'parse_cache.sqlite3'
+
+    @property
+    def dir_snapshot_path(self) -> Path:
+        return Path(self.config_dir) / 'dir_snapshot.json'
+
+    @property
+    def library_index_path(self) -> Path:
+        return Path(self.config_dir) / 'library_index.json'
+
+    @property
+    def poll_snapshot_path(self) -> Path:
+        return Path(self.config_dir) / 'poll_snapshot.json'
+
+    @property
+    def trace_dir(self) -> Path:
+        return Path(self.config_dir) / 'traces'
+
+    @property
+    def profile_dir(self) -> Path:
+        return Path(self.config_dir) / 'profiles'
+
+    def validate_paths(self, create: bool = True):
+        """Comprueba las rutas de directorio requeridas y, con `create`, crea CONFIG_DIR y el
+        archivo de hardlinks si no existen. Lanza ConfigError si alguna no es válida."""
+        for var_name, path_str in (('WATCH_DIR', self.watch_dir), ('SERIES_DIR', self.series_dir),
+                                   ('MOVIES_DIR', self.movies_dir)):
+            if not Path(path_str).is_dir():
+                raise ConfigError(f"{var_name} no existe o no es un directorio: {path_str}")
+
+        # Asegurar que el directorio CONFIG_DIR existe
+        config_dir_path = Path(self.config_dir)
+        if not config_dir_path.exists():
+            if not create:
+                raise ConfigError(f"CONFIG_DIR no existe: {self.config_dir}")
+            logging.info("📁 Creando directorio de configuración: %s", self.config_dir)
+            config_dir_path.mkdir(parents=True, exist_ok=True)
+        elif not config_dir_path.is_dir():
+            raise ConfigError(f"CONFIG_DIR existe pero no es un directorio: {self.config_dir}")
+
+        # Crear archivo de hardlinks si no existe
+        hardlinks_path = self.hardlinks_db_path
+        if not hardlinks_path.exists():
+            if create:
+                logging.info("📝 Creando archivo de hardlinks: %s", hardlinks_path)
+                hardlinks_path.write_text('{}', encoding='utf-8')
+        elif not hardlinks_path.is_file():
+            raise ConfigError(f"La ruta de hardlinks existe pero no es un archivo: {hardlinks_path}")
+
+        logging.info("ℹ️ Config rutas: WATCH_DIR=%s, SERIES_DIR=%s, MOVIES_DIR=%s, CONFIG_DIR=%s",
+                     self.watch_dir, self.series_dir, self.movies_dir, self.config_dir)
+        logging.info("✅ Configuración de entorno validada correctamente.")
+
+
+def load_config(environ: Optional[Mapping[str, str]] = None) -> Config:
+    """Lee y valida la configuración del entorno sin efectos secundarios.
+
+    Lanza ConfigError si falta una variable obligatoria o un valor no es válido."""
+    env = os.environ if environ is None else environ
+
+    # Construir dict de configuración y detectar ausentes
+    values = {}
+    missing = []
+    for v in REQUIRED_ENV_VARS:
+        val = _get_env(env, v)
+        if val is None:
+            missing.append(v)
+        else:
+            values[v.lower()] = val
+    if missing:
+        raise ConfigError(f"Variables de entorno obligatorias no definidas: {', '.join(missing)}")
+
+    links_backend = (_get_env(env, 'LINKS_BACKEND') or 'json').lower()
+    if links_backend not in ('json', 'sqlite'):
+        raise ConfigError(f"LINKS_BACKEND debe ser 'json' o 'sqlite': {links_backend}")
+
+    return Config(
+        **values,
+        links_backend=links_backend,
+        cleanup_workers=max(1, _get_env_int(env, 'CLEANUP_WORKERS', 16)),
+        cleanup_in_background=_get_env(env, 'CLEANUP_IN_BACKGROUND') == '1',
+        links_compact_threshold=max(1, _get_env_int(env, 'LINKS_COMPACT_THRESHOLD', 1000)),
+        tmdb_cache_ttl_seconds=_get_env_float(env, 'TMDB_CACHE_TTL_DAYS', 30) * 86400,
+        tmdb_cache_negative_ttl_seconds=_get_env_float(env, 'TMDB_CACHE_NEGATIVE_TTL_HOURS', 24) * 3600,
+        parse_cache_size=max(1, _get_env_int(env, 'PARSE_CACHE_SIZE', 50000)),
+        parse_cache_persist=_get_env(env, 'PARSE_CACHE_PERSIST') != '0',
+        scan_workers=max(1, _get_env_int(env, 'SCAN_WORKERS', DEFAULT_SCAN_WORKERS)),
+        scan_chunk_size=max(1, _get_env_int(env, 'SCAN_CHUNK_SIZE', 1000)),
+        scan_parallel_min=max(1, _get_env_int(env, 'SCAN_PARALLEL_MIN', 200)),
+        scan_snapshot=_get_env(env, 'SCAN_SNAPSHOT') != '0',
+        library_index=_get_env(env, 'LIBRARY_INDEX') != '0',
+        startup_reconcile=_get_env(env, 'STARTUP_RECONCILE') != '0',
+        reconcile_max_orphan_ratio=_get_env_float(env, 'RECONCILE_MAX_ORPHAN_RATIO', 0.5),
+        watcher_workers=max(1, _get_env_int(env, 'WATCHER_WORKERS', 2)),
+        watcher_polling=_get_env(env, 'WATCHER_POLLING') == '1',
+        watcher_stable_min_seconds=_get_env_float(env, 'WATCHER_STABLE_MIN_SECONDS', 1.0),
+        watcher_stable_max_seconds=_get_env_float(env, 'WATCHER_STABLE_MAX_SECONDS', 30.0),
+        watcher_coalesce_seconds=_get_env_float(env, 'WATCHER_COALESCE_SECONDS', 10),
+        watcher_poll_interval=max(1.0, _get_env_float(env, 'WATCHER_POLL_INTERVAL', 10)),
+        watcher_poll_max_stats=max(1.0, _get_env_float(env, 'WATCHER_POLL_MAX_STATS', 500)),
+        metrics_port=_get_env_int(env, 'METRICS_PORT', 0),
+        metrics_host=_get_env(env, 'METRICS_HOST') or '127.0.0.1',
+        tracing=_get_env(env, 'TRACING') == '1',
+        profile_batches=_get_env(env, 'PROFILE_BATCHES') == '1',
+        startup_budget_seconds=_get_env_float(env, 'STARTUP_BUDGET_SECONDS', 1.0),
+        tmdb_api_url=(_get_env(env, 'TMDB_API_URL') or 'https://api.themoviedb.org/3').rstrip('/'),
+        tmdb_workers=max(1, _get_env_int(env, 'TMDB_WORKERS', 8)),
+        tmdb_rate_limit=max(0.1, _get_env_float(env, 'TMDB_RATE_LIMIT', 40)),
+        tmdb_max_retries=max(0, _get_env_int(env, 'TMDB_MAX_RETRIES', 5)),
+        tmdb_timeout=_get_env_float(env, 'TMDB_TIMEOUT', 10),
+        tmdb_export_dir=_get_env(env, 'TMDB_EXPORT_DIR'),
+        tmdb_offline=_get_env(env, 'TMDB_OFFLINE') == '1',
+    )
+
+
+_config: Optional[Config] = None
+_config_lock = threading.Lock()
+
+
+def get_config() -> Config:
+    """Obtiene la configuración global, leyéndola del entorno en el primer uso."""
+    global _config
+    with _config_lock:
+        if _config is None:
+            _config = load_config()
+        return _config
+
+
+def set_config(config: Optional[Config]):
+    """Establece la configuración global (o la descarta para volver a leer el entorno)."""
+    global _config
+    with _config_lock:
+        _config = config
+
+
+_FIELD_NAMES = frozenset(f.name for f in fields(Config)) | frozenset(
+    name for name, value in vars(Config).items() if isinstance(value, property))
+
+
+def __getattr__(name: str):
+    """Compatibilidad con `from src.config import WATCH_DIR`: se resuelve contra get_config()."""
+    if name.isupper() and name.lower() in _FIELD_NAMES:
+        return getattr(get_config(), name.lower())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
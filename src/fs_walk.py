@@ -0,0 +1,163 @@
+import os
+import json
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from src.config import VIDEO_EXTENSIONS
+
+
+def load_snapshot(path: str, kind: str) -> Optional[Dict[str, dict]]:
+    """Carga una instantánea {directorio: entrada} desde disco.
+    Retorna None si no existe o está corrupta."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            dirs = json.load(f)
+    except Exception as e:
+        logging.warning(f"⚠️ Instantánea de {kind} ignorada ({path}): {e}")
+        return None
+    logging.info(f"📸 Instantánea de {kind} cargada: {len(dirs)} directorios")
+    return dirs
+
+
+def save_snapshot(path: str, dirs: Dict[str, dict], kind: str) -> bool:
+    """Guarda una instantánea de forma atómica. Retorna False si no se pudo escribir."""
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(dirs, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logging.error(f"❌ Error al guardar la instantánea de {kind} en {path}: {e}")
+        return False
+    logging.debug(f"📸 Instantánea de {kind} guardada: {len(dirs)} directorios")
+    return True
+
+
+class DirSnapshot:
+    """Instantánea persistente de directorios: mtime, subdirectorios y videos de cada uno.
+
+    Si el mtime de un directorio no ha cambiado, su lista de entradas tampoco, así que un
+    recorrido puede saltarse sus archivos y bajar directamente a los subdirectorios conocidos."""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.dirs: Dict[str, dict] = {}  # {dir: {'mtime': ns, 'dirs': [...], 'files': [...]}}
+        self._seen: Set[str] = set()
+        self.changed: Set[str] = set()  # Directorios listados (nuevos o modificados) en el recorrido actual
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Carga la instantánea desde disco (vacía si no existe o está corrupta)."""
+        self.dirs = load_snapshot(self.path, 'directorios') or {}
+
+    def save(self):
+        """Guarda la instantánea de forma atómica."""
+        with self._lock:
+            save_snapshot(self.path, self.dirs, 'directorios')
+
+    def unchanged(self, dir_path: str, mtime_ns: int) -> Optional[dict]:
+        """Devuelve la entrada guardada si el directorio no ha cambiado desde la última vez."""
+        with self._lock:
+            self._seen.add(dir_path)
+            entry = self.dirs.get(dir_path)
+        if entry is not None and entry['mtime'] == mtime_ns:
+            return entry
+        return None
+
+    def update(self, dir_path: str, mtime_ns: int, dirs: List[str], files: List[str]) -> Optional[dict]:
+        """Registra el nuevo estado de un directorio y devuelve el anterior (si lo había)."""
+        with self._lock:
+            self._seen.add(dir_path)
+            previous = self.dirs.get(dir_path)
+            self.changed.add(dir_path)
+            self.dirs[dir_path] = {'mtime': mtime_ns, 'dirs': sorted(dirs), 'files': sorted(files)}
+        return previous
+
+    def seen(self, dir_path: str) -> bool:
+        """Indica si el directorio existía en el recorrido actual (listado o sin cambios)."""
+        with self._lock:
+            return dir_path in self._seen
+
+    def prune(self, root: str) -> List[str]:
+        """Elimina los directorios bajo `root` que no se vieron en el último recorrido y los devuelve."""
+        root = os.path.abspath(root)
+        prefix = root + os.sep
+        with self._lock:
+            removed = [d for d in self.dirs
+                       if (d == root or d.startswith(prefix)) and d not in self._seen]
+            for dir_path in removed:
+                del self.dirs[dir_path]
+            self._seen.clear()
+            self.changed.clear()
+        return removed
+
+
+def _is_video(name: str) -> bool:
+    return name.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def iter_video_files(root: str, snapshot: Optional[DirSnapshot] = None,
+                     skip_hidden_top_level: bool = False) -> Iterator[Tuple[str, Optional[os.DirEntry]]]:
+    """Produce (ruta, DirEntry) de cada video bajo `root` usando os.scandir, que ya conoce el
+    tipo de cada entrada sin hacer stat. Si `root` es un archivo de video se produce (root, None).
+
+    Con `snapshot`, los directorios cuyo mtime no ha cambiado no se listan: solo se baja a sus
+    subdirectorios conocidos (un stat por directorio en lugar de un listado)."""
+    root = os.path.abspath(root)
+    stack = [(root, 0)]
+
+    while stack:
+        dir_path, depth = stack.pop()
+        mtime_ns = None
+        if snapshot is not None:
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            except NotADirectoryError:
+                pass
+            else:
+                entry = snapshot.unchanged(dir_path, mtime_ns)
+                if entry is not None:
+                    stack.extend((os.path.join(dir_path, name), depth + 1) for name in reversed(entry['dirs']))
+                    continue
+
+        try:
+            scanner = os.scandir(dir_path)
+        except NotADirectoryError:
+            # La raíz es un archivo
+            if _is_video(dir_path):
+                yield dir_path, None
+            continue
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logging.warning(f"⚠️ No se pudo listar {dir_path}: {e}")
+            continue
+
+        subdirs, videos = [], []
+        with scanner:
+            for entry in scanner:
+                if depth == 0 and skip_hidden_top_level and entry.name.startswith('.'):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                if is_dir:
+                    # Igual que os.walk: los enlaces simbólicos a directorios no se recorren
+                    if not entry.is_symlink():
+                        subdirs.append(entry.name)
+                elif _is_video(entry.name):
+                    videos.append(entry)
+
+        videos.sort(key=lambda e: e.name)
+        subdirs.sort()
+        if snapshot is not None and mtime_ns is not None:
+            snapshot.update(dir_path, mtime_ns, subdirs, [e.name for e in videos])
+        for entry in videos:
+            yield entry.path, entry
+        stack.extend((os.path.join(dir_path, name), depth + 1) for name in reversed(subdirs))
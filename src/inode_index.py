@@ -0,0 +1,78 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+from src.config import VIDEO_EXTENSIONS
+
+
+InodeKey = Tuple[int, int]  # (st_dev, st_ino)
+
+
+class InodeIndex:
+    """Índice (st_dev, st_ino) -> ruta destino de los archivos ya materializados.
+
+    Un hard link comparte inodo con su fuente, así que basta un stat de la fuente para
+    saber en O(1) si ya está enlazada, aunque haya cambiado su nombre o el del destino."""
+
+    def __init__(self):
+        self._by_inode: Dict[InodeKey, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._by_inode)
+
+    def add(self, stat_result: os.stat_result, dest_path: str):
+        """Registra un destino a partir del stat de su fuente o del propio destino."""
+        with self._lock:
+            self._by_inode[(stat_result.st_dev, stat_result.st_ino)] = dest_path
+
+    def lookup(self, stat_result: os.stat_result) -> Optional[str]:
+        """Devuelve el destino que comparte inodo con el archivo, si sigue existiendo."""
+        key = (stat_result.st_dev, stat_result.st_ino)
+        with self._lock:
+            dest_path = self._by_inode.get(key)
+        if dest_path is None:
+            return None
+
+        # Verificar que la entrada no esté obsoleta (destino borrado o reemplazado)
+        try:
+            dest_stat = os.stat(dest_path)
+        except OSError:
+            dest_stat = None
+        if dest_stat is None or (dest_stat.st_dev, dest_stat.st_ino) != key:
+            with self._lock:
+                if self._by_inode.get(key) == dest_path:
+                    del self._by_inode[key]
+            return None
+        return dest_path
+
+    def _index_tree(self, root: str) -> int:
+        """Indexa los videos de un árbol destino: un stat por directorio (st_dev) e
+        inodos de las entradas de os.scandir, que no requieren stat adicional en POSIX."""
+        indexed = 0
+        pending = [root]
+        while pending:
+            dir_path = pending.pop()
+            try:
+                st_dev = os.stat(dir_path).st_dev
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.name.lower().endswith(VIDEO_EXTENSIONS):
+                            self._by_inode[(st_dev, entry.inode())] = entry.path
+                            indexed += 1
+            except OSError as e:
+                logging.debug(f"⚠️ No se pudo indexar {dir_path}: {e}")
+        return indexed
+
+    @classmethod
+    def build(cls, roots: Iterable[str]) -> 'InodeIndex':
+        """Construye el índice recorriendo las carpetas destino (SERIES_DIR, MOVIES_DIR)."""
+        index = cls()
+        started = time.monotonic()
+        for root in roots:
+            index._index_tree(os.path.abspath(root))
+        logging.info(f"🧬 Índice de inodos construido: {len(index)} archivos en {time.monotonic() - started:.1f}s")
+        return index
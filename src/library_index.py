@@ -0,0 +1,125 @@
+import os
+import json
+import logging
+import threading
+from typing import Dict, Optional
+
+
+def _key(title_key: str, year: Optional[str]) -> str:
+    return f"{title_key}|{year}" if year else title_key
+
+
+class LibraryIndex:
+    """Índice de las series ya organizadas: título normalizado de guessit (y año) -> carpeta de SERIES_DIR.
+
+    Solo contiene asociaciones aprendidas al organizar con un título confirmado por TMDb, que se
+    guardan en CONFIG_DIR; el nombre de una carpeta por sí solo no basta, porque puede venir de un
+    título de guessit sin confirmar. Así los episodios nuevos de una serie conocida van a su
+    carpeta sin consultar TMDb."""
+
+    def __init__(self, series_dir: str, path):
+        self.series_dir = os.path.abspath(series_dir)
+        self.path = os.path.abspath(path)
+        self.learned: Dict[str, str] = {}  # {título normalizado[|año]: carpeta}
+        self._folders = set()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Carga las asociaciones aprendidas y lista las carpetas de SERIES_DIR."""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.learned = json.load(f)
+            except Exception as e:
+                logging.warning(f"⚠️ Índice de la biblioteca ignorado ({self.path}): {e}")
+                self.learned = {}
+
+        try:
+            with os.scandir(self.series_dir) as entries:
+                self._folders = {entry.name for entry in entries if entry.is_dir() and not entry.name.startswith('.')}
+        except OSError as e:
+            logging.warning(f"⚠️ No se pudo listar SERIES_DIR {self.series_dir}: {e}")
+        logging.info(f"📂 Índice de la biblioteca: {len(self._folders)} series, {len(self.learned)} títulos aprendidos")
+
+    def save(self):
+        """Guarda las asociaciones aprendidas de forma atómica, si han cambiado."""
+        tmp_path = self.path + '.tmp'
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.learned, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except Exception as e:
+                logging.error(f"❌ Error al guardar el índice de la biblioteca en {self.path}: {e}")
+
+    def _exists(self, folder: str) -> bool:
+        if os.path.isdir(os.path.join(self.series_dir, folder)):
+            self._folders.add(folder)
+            return True
+        self._folders.discard(folder)
+        return False
+
+    def lookup(self, title_key: str, year: Optional[str] = None) -> Optional[str]:
+        """Carpeta de la serie con ese título normalizado (y año de guessit), o None."""
+        if not title_key:
+            return None
+        key = _key(title_key, year)
+        with self._lock:
+            folder = self.learned.get(key)
+            if folder is not None and not self._exists(folder):
+                # La carpeta se borró o renombró: olvidar la asociación
+                if self.learned.pop(key, None) is not None:
+                    self._dirty = True
+                folder = None
+            if folder is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return folder
+
+    def learn(self, title_key: str, year: Optional[str], folder: str):
+        """Asocia un título a la carpeta donde se acaba de organizar, si la carpeta existe."""
+        if not title_key or not folder:
+            return
+        key = _key(title_key, year)
+        with self._lock:
+            if self.learned.get(key) == folder or not self._exists(folder):
+                return
+            self.learned[key] = folder
+            self._dirty = True
+
+    def get_stats(self) -> Dict[str, int]:
+        """Obtiene los contadores de aciertos y fallos y el tamaño del índice."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "series": len(self._folders),
+                "learned": len(self.learned),
+            }
+
+
+_library_index: Optional[LibraryIndex] = None
+_library_index_loaded = False
+_library_index_lock = threading.Lock()
+
+
+def get_library_index() -> Optional[LibraryIndex]:
+    """Obtiene el índice de la biblioteca global, creándolo en el primer uso.
+    Retorna None si está desactivado (LIBRARY_INDEX=0)."""
+    global _library_index, _library_index_loaded
+    with _library_index_lock:
+        if not _library_index_loaded:
+            from src.config import get_config
+            config = get_config()
+            if config.library_index:
+                _library_index = LibraryIndex(config.series_dir, config.library_index_path)
+            _library_index_loaded = True
+        return _library_index
@@ -1,24 +1,165 @@
 import os
 import json
+import time
 import logging
-from typing import Dict, List, Set
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set
+from src import metrics
+from src.tracing import traced
+
+MAP_SAVE_SECONDS = metrics.histogram('media_sorter_map_save_seconds',
+                                     "Duración de la compactación completa del mapa de hard links")
+MAP_COMMIT_SECONDS = metrics.histogram('media_sorter_map_commit_seconds',
+                                       "Duración de la confirmación de un lote en el mapa de hard links")
+
+# Fuentes comprobadas por bloque en la limpieza y cada cuántos segundos se informa del progreso
+CLEANUP_CHUNK_SIZE = 5000
+_PROGRESS_INTERVAL = 5.0
+
+
+class CleanupProgress:
+    """Informa periódicamente del avance de la limpieza de enlaces."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self._last_report = time.monotonic()
+        self._lock = threading.Lock()
+
+    def advance(self, count: int = 1):
+        with self._lock:
+            self.done += count
+            now = time.monotonic()
+            if now - self._last_report >= _PROGRESS_INTERVAL:
+                self._last_report = now
+                logging.info(f"🧹 Limpieza: {self.done}/{self.total} fuentes comprobadas")
+
+
+def entry_paths(chunk) -> List[str]:
+    """Todas las rutas (fuentes y destinos) de un bloque de entradas del mapa."""
+    paths = []
+    for source_path, dest_paths in chunk:
+        paths.append(source_path)
+        paths.extend(dest_paths)
+    return paths
+
+
+def find_existing_paths(paths: Iterable[str], workers: int) -> Set[str]:
+    """Devuelve las rutas que existen, agrupándolas por directorio padre para hacer un
+    solo os.scandir por directorio, con varios directorios en paralelo.
+
+    En montajes de red esto sustituye miles de stats individuales por un listado por carpeta."""
+    by_dir: Dict[str, Set[str]] = defaultdict(set)
+    for path in paths:
+        by_dir[os.path.dirname(path)].add(os.path.basename(path))
+
+    def _existing_in(dir_path: str) -> List[str]:
+        wanted = by_dir[dir_path]
+        try:
+            with os.scandir(dir_path) as entries:
+                present = {entry.name for entry in entries if entry.name in wanted}
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+        except OSError:
+            # Sin permiso de listado: recurrir a comprobar cada ruta
+            present = {name for name in wanted if os.path.exists(os.path.join(dir_path, name))}
+        return [os.path.join(dir_path, name) for name in present]
+
+    existing: Set[str] = set()
+    if not by_dir:
+        return existing
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(by_dir))), thread_name_prefix='cleanup') as executor:
+        for found in executor.map(_existing_in, list(by_dir)):
+            existing.update(found)
+    return existing
+
+
+class _PathTrie:
+    """Índice de rutas por componentes: enumerar o podar un subárbol cuesta lo que mide el subárbol."""
+
+    _END = None  # Marca de ruta registrada (ningún componente de ruta es None)
+
+    def __init__(self):
+        self._root: dict = {}
+
+    def add(self, path: str):
+        node = self._root
+        for part in path.split(os.sep):
+            node = node.setdefault(part, {})
+        node[self._END] = True
+
+    def discard(self, path: str):
+        node = self._root
+        stack = []
+        for part in path.split(os.sep):
+            child = node.get(part)
+            if child is None:
+                return
+            stack.append((node, part))
+            node = child
+        node.pop(self._END, None)
+        # Podar nodos que se han quedado vacíos
+        while stack and not node:
+            parent, part = stack.pop()
+            del parent[part]
+            node = parent
+
+    def under(self, dir_path: str) -> List[str]:
+        """Rutas registradas dentro de dir_path (sin incluir el propio directorio)."""
+        node = self._root
+        parts = dir_path.split(os.sep)
+        for part in parts:
+            node = node.get(part)
+            if node is None:
+                return []
+
+        result = []
+        stack = [(node, parts)]
+        while stack:
+            node, prefix = stack.pop()
+            for part, child in node.items():
+                if part is self._END:
+                    continue
+                child_parts = prefix + [part]
+                if self._END in child:
+                    result.append(os.sep.join(child_parts))
+                if len(child) > (1 if self._END in child else 0):
+                    stack.append((child, child_parts))
+        return result
 
 
 class LinkManager:
-    """Gestiona el mapa de hard links entre archivos fuente y destino."""
+    """Gestiona el mapa de hard links entre archivos fuente y destino.
+
+    El estado se persiste como una instantánea JSON más un journal de solo-anexado:
+    cada alta o baja escribe una línea en el journal (O(1) de E/S) y la instantánea
+    se reescribe de forma atómica solo al compactar."""
 
     def __init__(self):
         """Inicializa el LinkManager."""
-        from src.config import HARDLINKS_DB_PATH
-        db_path = HARDLINKS_DB_PATH
+        from src.config import get_config
+        config = get_config()
+        db_path = config.hardlinks_db_path
 
         # Normalizar a ruta absoluta
         self.db_path = os.path.abspath(db_path)
+        self.journal_path = os.path.splitext(self.db_path)[0] + '.journal'
+        self.compact_threshold = config.links_compact_threshold
         self.links: Dict[str, List[str]] = {}  # {source_path: [dest_path1, dest_path2, ...]}
+        self._dest_index: Dict[str, str] = {}  # {dest_path: source_path}
+        self._source_trie = _PathTrie()
+        self._lock = threading.RLock()
+        self._journal = None
+        self._journal_ops = 0
+        self._batch = threading.local()  # Profundidad del lote abierto de cada hilo
+        self._pending: List[str] = []  # Líneas aún sin escribir, en el orden en que se aplicaron
         self.load()
 
     def load(self):
-        """Carga el mapa de hard links desde el archivo JSON."""
+        """Carga la instantánea JSON y aplica encima las operaciones del journal."""
         if os.path.exists(self.db_path):
             try:
                 with open(self.db_path, 'r', encoding='utf-8') as f:
@@ -31,27 +172,160 @@ class LinkManager:
             logging.info("📝 Creando nuevo mapa de hard links")
             self.links = {}
 
-    def save(self):
-        """Guarda el mapa de hard links en el archivo JSON."""
+        self._dest_index = {dest: source for source, dests in self.links.items() for dest in dests}
+        self._source_trie = _PathTrie()
+        for source in self.links:
+            self._source_trie.add(source)
+        replayed, truncated = self._replay_journal()
+        self._journal_ops = replayed
+        if replayed:
+            logging.info(f"📜 Journal aplicado: {replayed} operaciones")
+        if truncated:
+            # Compactar para no seguir anexando tras una línea corrupta
+            self.save()
+
+    def _replay_journal(self):
+        """Aplica las operaciones del journal. Una última línea truncada (caída a mitad de escritura) se ignora.
+
+        Devuelve (operaciones aplicadas, si se encontró una línea truncada)."""
+        if not os.path.exists(self.journal_path):
+            return 0, False
+
+        replayed = 0
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    logging.warning(f"⚠️ Línea de journal incompleta ignorada en {self.journal_path}")
+                    return replayed, True
+                self._apply(op)
+                replayed += 1
+        return replayed, False
+
+    def _apply(self, op: list):
+        """Aplica una operación del journal sobre el mapa en memoria y sus índices (idempotente)."""
+        kind, source_path = op[0], op[1]
+        if kind == 'add':
+            if source_path not in self.links:
+                self._source_trie.add(source_path)
+            dests = self.links.setdefault(source_path, [])
+            if op[2] not in dests:
+                dests.append(op[2])
+                self._dest_index[op[2]] = source_path
+        elif kind == 'remove':
+            self._source_trie.discard(source_path)
+            for dest in self.links.pop(source_path, []):
+                self._dest_index.pop(dest, None)
+        elif kind == 'remove_tree':
+            for source in self._source_trie.under(source_path):
+                self._apply(['remove', source])
+        elif kind == 'set':
+            if source_path not in self.links:
+                self._source_trie.add(source_path)
+            for dest in self.links.get(source_path, []):
+                self._dest_index.pop(dest, None)
+            self.links[source_path] = list(op[2])
+            for dest in op[2]:
+                self._dest_index[dest] = source_path
+
+    def _commit_op(self, op: list):
+        """Aplica una operación en memoria y la encola para el journal en el mismo orden.
+
+        Las líneas pendientes son comunes a todos los hilos: el journal conserva el orden en que
+        se aplicaron aunque los lotes de varios hilos se solapen. Fuera de un lote se escriben ya."""
+        line = json.dumps(op, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._apply(op)
+            self._pending.append(line)
+            if not self._batch_depth():
+                self._flush_pending()
+
+    def _batch_depth(self) -> int:
+        """Profundidad del lote abierto por el hilo actual (0 si no tiene ninguno)."""
+        return getattr(self._batch, 'depth', 0)
+
+    def _flush_pending(self, sync: bool = False):
+        """Escribe en el journal las líneas pendientes de todos los hilos (con el lock tomado)."""
+        if not self._pending:
+            return
+        lines, self._pending = self._pending, []
+        self._write_journal(lines)
+        if sync and self._journal is not None:
+            os.fsync(self._journal.fileno())
+
+    def _write_journal(self, lines: List[str]):
+        """Escribe líneas en el journal y compacta si ha crecido demasiado."""
         try:
-            with open(self.db_path, 'w', encoding='utf-8') as f:
-                json.dump(self.links, f, indent=2, ensure_ascii=False)
-            logging.debug(f"💾 Mapa de hard links guardado: {len(self.links)} entradas")
+            if self._journal is None:
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal.write(''.join(lines))
+            self._journal.flush()
+            self._journal_ops += len(lines)
         except Exception as e:
-            logging.error(f"❌ Error al guardar el mapa de hard links en {self.db_path}: {e}", exc_info=True)
+            logging.error(f"❌ Error al escribir el journal de hard links en {self.journal_path}: {e}", exc_info=True)
+            return
+
+        if self._journal_ops >= max(self.compact_threshold, len(self.links)):
+            self.save()
+
+    @contextmanager
+    def batch(self):
+        """Agrupa las altas y bajas del hilo actual para escribirlas al journal de una sola vez
+        al cerrar el lote (con las pendientes de otros hilos, que las precedían o intercalaban)."""
+        self._batch.depth = self._batch_depth() + 1
+        try:
+            yield self
+        finally:
+            self._batch.depth -= 1
+            if self._batch.depth == 0:
+                with self._lock:
+                    if self._pending:
+                        with MAP_COMMIT_SECONDS.time(backend='json'):
+                            self._flush_pending(sync=True)
+
+    @traced()
+    def save(self):
+        """Compacta: escribe una instantánea atómica del mapa y vacía el journal."""
+        with self._lock, MAP_SAVE_SECONDS.time(backend='json'):
+            tmp_path = self.db_path + '.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.links, f, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.db_path)
+                self._fsync_dir()
+
+                # Las operaciones ya están en la instantánea (también las pendientes): se puede truncar el journal
+                self._pending = []
+                if self._journal is not None:
+                    self._journal.close()
+                self._journal = open(self.journal_path, 'w', encoding='utf-8')
+                self._journal_ops = 0
+                logging.debug(f"💾 Mapa de hard links guardado: {len(self.links)} entradas")
+            except Exception as e:
+                logging.error(f"❌ Error al guardar el mapa de hard links en {self.db_path}: {e}", exc_info=True)
+
+    def _fsync_dir(self):
+        """Sincroniza el directorio para que el renombrado atómico sobreviva a una caída."""
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        fd = os.open(os.path.dirname(self.db_path), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
 
     def add_link(self, source_path: str, dest_path: str):
         """Registra un nuevo hard link."""
         source_path = os.path.abspath(os.path.normpath(source_path))
         dest_path = os.path.abspath(os.path.normpath(dest_path))
 
-        if source_path not in self.links:
-            self.links[source_path] = []
-
-        if dest_path not in self.links[source_path]:
-            self.links[source_path].append(dest_path)
-            self.save()
-            logging.info(f"🔗 Link registrado: {source_path} -> {dest_path}")
+        with self._lock:
+            if dest_path not in self.links.get(source_path, []):
+                self._commit_op(['add', source_path, dest_path])
+                logging.info(f"🔗 Link registrado: {source_path} -> {dest_path}")
 
     def get_links(self, source_path: str) -> List[str]:
         """Obtiene todos los hard links asociados a un archivo fuente."""
@@ -61,49 +335,108 @@ class LinkManager:
     def remove_source(self, source_path: str) -> List[str]:
         """Elimina un archivo fuente y retorna sus hard links."""
         source_path = os.path.abspath(os.path.normpath(source_path))
-        links = self.links.pop(source_path, [])
-        if links:
-            self.save()
-            logging.debug(f"🗑️ Fuente eliminada del mapa: {source_path}")
+        with self._lock:
+            if source_path not in self.links:
+                return []
+            links = self.links[source_path]
+            self._commit_op(['remove', source_path])
+            if links:
+                logging.debug(f"🗑️ Fuente eliminada del mapa: {source_path}")
         return links
 
-    def cleanup_broken_links(self):
-        """Limpia el mapa eliminando entradas donde ni la fuente ni los destinos existen."""
+    def source_for(self, dest_path: str) -> Optional[str]:
+        """Obtiene el archivo fuente de un hard link destino (índice inverso)."""
+        dest_path = os.path.abspath(os.path.normpath(dest_path))
+        return self._dest_index.get(dest_path)
+
+    def sources_under(self, dir_path: str) -> List[str]:
+        """Obtiene las fuentes registradas dentro de un directorio (recursivamente)."""
+        with self._lock:
+            return self._source_trie.under(os.path.abspath(os.path.normpath(dir_path)))
+
+    def remove_subtree(self, dir_path: str) -> Dict[str, List[str]]:
+        """Elimina todas las fuentes de un directorio con una sola operación en el journal.
+
+        Retorna {fuente: hard links} de las fuentes eliminadas."""
+        dir_path = os.path.abspath(os.path.normpath(dir_path))
+        with self._lock:
+            removed = {source: self.links[source] for source in self._source_trie.under(dir_path)}
+            if removed:
+                self._commit_op(['remove_tree', dir_path])
+                logging.debug(f"🗑️ {len(removed)} fuente(s) eliminadas del mapa bajo: {dir_path}")
+        return removed
+
+    def cleanup_broken_links(self, workers: Optional[int] = None):
+        """Limpia el mapa eliminando entradas donde ni la fuente ni los destinos existen.
+
+        Las comprobaciones de existencia se hacen por bloques, en paralelo (CLEANUP_WORKERS
+        hilos) y con un listado por directorio. Puede ejecutarse en segundo plano mientras se
+        vigila: solo se corrigen las entradas que no hayan cambiado durante la comprobación."""
+        from src.config import get_config
+        workers = workers or get_config().cleanup_workers
+        with self._lock:
+            snapshot = list(self.links.items())
+        progress = CleanupProgress(len(snapshot))
         cleaned = 0
-        sources_to_remove = []
 
-        for source_path, dest_paths in list(self.links.items()):
-            # Filtrar destinos que aún existen
-            existing_dests = [d for d in dest_paths if os.path.exists(d)]
+        for start in range(0, len(snapshot), CLEANUP_CHUNK_SIZE):
+            chunk = [(source, list(dests)) for source, dests in snapshot[start:start + CLEANUP_CHUNK_SIZE]]
+            existing = find_existing_paths(entry_paths(chunk), workers)
 
-            # Si la fuente no existe y no quedan destinos, marcar para eliminar
-            if not os.path.exists(source_path) and not existing_dests:
-                sources_to_remove.append(source_path)
-                cleaned += 1
-            elif existing_dests != dest_paths:
-                # Actualizar solo los destinos que existen
-                self.links[source_path] = existing_dests
-                cleaned += 1
+            with self._lock, self.batch():
+                for source_path, dest_paths in chunk:
+                    if self.links.get(source_path) != dest_paths:
+                        continue  # Modificada mientras se comprobaba
 
-        # Eliminar fuentes marcadas
-        for source in sources_to_remove:
-            del self.links[source]
+                    # Filtrar destinos que aún existen
+                    existing_dests = [d for d in dest_paths if d in existing]
+
+                    # Si la fuente no existe y no quedan destinos, eliminarla
+                    if source_path not in existing and not existing_dests:
+                        self._commit_op(['remove', source_path])
+                        cleaned += 1
+                    elif existing_dests != dest_paths:
+                        # Actualizar solo los destinos que existen
+                        self._commit_op(['set', source_path, existing_dests])
+                        cleaned += 1
+            progress.advance(len(chunk))
 
         if cleaned > 0:
-            self.save()
             logging.info(f"🧹 Limpieza completada: {cleaned} entradas corregidas")
 
         return cleaned
 
+    def get_unlinked_sources(self) -> List[str]:
+        """Obtiene las fuentes registradas que se han quedado sin ningún hard link."""
+        with self._lock:
+            return [source for source, dests in self.links.items() if not dests]
+
     def get_all_sources(self) -> Set[str]:
         """Obtiene el conjunto de todos los archivos fuente registrados."""
-        return set(self.links.keys())
+        with self._lock:
+            return set(self.links.keys())
 
     def get_stats(self) -> Dict[str, int]:
-        """Obtiene estadísticas del mapa de links."""
-        total_sources = len(self.links)
-        total_links = sum(len(dests) for dests in self.links.values())
+        """Obtiene estadísticas del mapa de links (también desde el hilo de /metrics)."""
+        with self._lock:
+            total_sources = len(self.links)
+            total_links = sum(len(dests) for dests in self.links.values())
         return {
             "total_sources": total_sources,
             "total_links": total_links
         }
+
+
+def create_link_manager():
+    """Crea el LinkManager del backend configurado en LINKS_BACKEND ('json' o 'sqlite')."""
+    from src.config import get_config
+    if get_config().links_backend == 'sqlite':
+        from src.sqlite_link_manager import SqliteLinkManager
+        link_manager = SqliteLinkManager()
+    else:
+        link_manager = LinkManager()
+    metrics.gauge('media_sorter_map_sources', "Fuentes registradas en el mapa de hard links").set_function(
+        lambda: link_manager.get_stats()['total_sources'])
+    metrics.gauge('media_sorter_map_links', "Hard links registrados en el mapa").set_function(
+        lambda: link_manager.get_stats()['total_links'])
+    return link_manager
@@ -0,0 +1,195 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+# Límites (segundos) de los histogramas de latencia: de un os.link a una importación completa
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Mientras no se arranque el servidor las métricas no registran nada (coste de una comprobación)
+_enabled = False
+_registry: Dict[str, '_Metric'] = {}
+_registry_lock = threading.Lock()
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    type_ = 'untyped'
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value, ()) for key, value in sorted(self._values.items())]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_}"]
+        lines.extend(f"{name}{_format_labels(key, extra)} {_format_value(value)}"
+                     for name, key, value, extra in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Contador monótono, opcionalmente con etiquetas."""
+    type_ = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        if not _enabled or not amount:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Valor instantáneo: se fija con set() o se calcula al exportar con set_function()."""
+    type_ = 'gauge'
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        if not _enabled:
+            return
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            try:
+                return [(self.name, (), self._function(), ())]
+            except Exception as e:
+                logging.debug(f"⚠️ Métrica {self.name} no disponible: {e}")
+                return []
+        return super().samples()
+
+
+class Histogram(_Metric):
+    """Histograma de latencias con límites acumulativos al estilo Prometheus."""
+    type_ = 'histogram'
+
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, list] = {}  # {etiquetas: [cuentas por límite..., suma, total]}
+
+    def observe(self, seconds: float, **labels):
+        if not _enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Mide la duración del bloque."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    samples.append((f"{self.name}_bucket", key, count, (('le', _format_value(bound)),)))
+                samples.append((f"{self.name}_bucket", key, series[-1], (('le', '+Inf'),)))
+                samples.append((f"{self.name}_sum", key, series[-2], ()))
+                samples.append((f"{self.name}_count", key, series[-1], ()))
+        return samples
+
+
+def _register(cls, name: str, help_text: str, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help_text, **kwargs)
+        return metric
+
+
+def counter(name: str, help_text: str) -> Counter:
+    return _register(Counter, name, help_text)
+
+
+def gauge(name: str, help_text: str) -> Gauge:
+    return _register(Gauge, name, help_text)
+
+
+def histogram(name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram, name, help_text, buckets=buckets)
+
+
+def render() -> str:
+    """Todas las métricas en formato de exposición de texto de Prometheus."""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+def _serve_metrics(handler):
+    if handler.path.split('?')[0] not in ('/metrics', '/'):
+        handler.send_error(404)
+        return
+    body = render().encode('utf-8')
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+    handler.send_header('Content-Length', str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1'):
+    """Activa el registro de métricas y las sirve en http://host:port/metrics.
+
+    http.server se importa aquí: sin METRICS_PORT el arranque no lo carga."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            _serve_metrics(self)
+
+    global _enabled
+    _enabled = True
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logging.info(f"📈 Métricas disponibles en http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -1,10 +1,20 @@
 import os
+import time
 import platform
 import logging
+import itertools
 import unicodedata
+from contextlib import nullcontext
+from dataclasses import dataclass, fields
 from typing import Optional
-from src.config import SERIES_DIR, MOVIES_DIR, VIDEO_EXTENSIONS
+from src.config import get_config
 from src.link_manager import LinkManager
+from src.inode_index import InodeIndex
+from src.fs_walk import iter_video_files
+from src.library_index import get_library_index
+from src.tmdb_cache import title_lookup_key
+from src import metrics
+from src.tracing import traced
 
 
 _INVALID_CHARS = '<>:"/\\|?*'  # Caracteres no permitidos en Windows (más restrictivo)
@@ -15,7 +25,13 @@ _RESERVED_NAMES_WINDOWS = frozenset({
 })
 _IS_WINDOWS = platform.system().lower() == 'windows'
 
+_LINK_SECONDS = metrics.histogram('media_sorter_link_seconds', "Duración de cada os.link")
+_LINKS = metrics.counter('media_sorter_links_total', "Archivos procesados por el organizador según resultado")
+_ORGANIZE_STAGE_SECONDS = metrics.histogram('media_sorter_organize_stage_seconds',
+                                            "Duración de cada fase del organizador por bloque (plan, mkdir, link)")
+
 _link_manager: Optional['LinkManager'] = None
+_inode_index: Optional['InodeIndex'] = None
 
 
 def set_link_manager(link_manager):
@@ -24,6 +40,22 @@ def set_link_manager(link_manager):
     _link_manager = link_manager
 
 
+def set_inode_index(inode_index):
+    """Establece el índice de inodos global para detectar archivos ya enlazados."""
+    global _inode_index
+    _inode_index = inode_index
+
+
+def get_link_manager() -> Optional['LinkManager']:
+    """Obtiene el LinkManager global (None si no se ha establecido)."""
+    return _link_manager
+
+
+def get_inode_index() -> Optional['InodeIndex']:
+    """Obtiene el índice de inodos global (None si no se ha establecido)."""
+    return _inode_index
+
+
 def _normalize_string(text):
     """Normaliza un string: convierte a NFD, elimina diacríticos."""
     if not isinstance(text, str):
@@ -59,88 +91,235 @@ def _sanitize_name(name):
     return sanitized if sanitized else 'Unknown'
 
 
-def _try_link(src, dst):
-    """Intenta crear hardlink y lo registra en el LinkManager."""
-    try:
-        os.link(src, dst)
-        if _link_manager:
-            _link_manager.add_link(src, dst)
-        return True
-    except Exception as e:
-        logging.error("❌ Error creando hardlink '%s' -> '%s': %s", src, dst, e)
-        return False
+@dataclass
+class OrganizeResult:
+    """Resultado de organizar un conjunto de items."""
+    items: int = 0
+    linked: int = 0
+    skipped: int = 0
+    failed: int = 0
+    plan_seconds: float = 0.0
+    mkdir_seconds: float = 0.0
+    link_seconds: float = 0.0
+
+    def merge(self, other: 'OrganizeResult'):
+        for f in fields(self):
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+
+    def summary(self) -> str:
+        return (f"{self.items} item(s): {self.linked} enlazado(s), {self.skipped} omitido(s), "
+                f"{self.failed} fallido(s) [plan {self.plan_seconds:.2f}s, "
+                f"carpetas {self.mkdir_seconds:.2f}s, enlaces {self.link_seconds:.2f}s]")
+
+
+# Carpetas destino ya creadas en esta ejecución: cada una se crea una sola vez
+_created_dirs = set()
 
 
 def _ensure_dir(path):
-    """Asegura que la ruta exista."""
+    """Asegura que la ruta exista (una sola llamada a makedirs por carpeta)."""
     path_str = os.fspath(path)
-    os.makedirs(path_str, exist_ok=True)
+    if path_str not in _created_dirs:
+        os.makedirs(path_str, exist_ok=True)
+        _created_dirs.add(path_str)
     return path_str
 
 
-def _is_video_file(filename):
-    """Verifica si el archivo es un video."""
-    return filename.lower().endswith(VIDEO_EXTENSIONS)
+def _try_link(src, dst, src_stat=None):
+    """Intenta crear hardlink y lo registra en el LinkManager.
 
+    Retorna True si se creó, None si el destino ya existía y False si falló."""
+    try:
+        try:
+            with _LINK_SECONDS.time():
+                os.link(src, dst)
+        except FileNotFoundError:
+            # La carpeta destino pudo borrarse desde que se creó: recrearla y reintentar
+            if not os.path.exists(src):
+                raise
+            _created_dirs.discard(os.path.dirname(dst))
+            _ensure_dir(os.path.dirname(dst))
+            os.link(src, dst)
+    except FileExistsError:
+        return None
+    except Exception as e:
+        logging.error("❌ Error creando hardlink '%s' -> '%s': %s", src, dst, e)
+        return False
+
+    if _link_manager:
+        _link_manager.add_link(src, dst)
+    if _inode_index and src_stat:
+        _inode_index.add(src_stat, dst)
+    return True
 
-def _process_single_file(src_path, dest_dir):
-    """Procesa un archivo individual creando un hardlink sanitizado."""
-    original_filename = os.path.basename(src_path)
-    sanitized_filename = _sanitize_name(original_filename)
-    dest_path = os.path.join(dest_dir, sanitized_filename)
 
-    if os.path.exists(dest_path):
+def _register_existing_link(src_path, existing_dest):
+    """Actualiza solo el mapa cuando la fuente ya está materializada (mismo inodo) en otro destino.
+
+    Si la fuente registrada para ese destino ya no existe, se trata de un renombrado en WATCH_DIR."""
+    if not _link_manager or existing_dest in _link_manager.get_links(src_path):
+        return
+    previous_source = _link_manager.source_for(existing_dest)
+    if previous_source and previous_source != os.path.abspath(src_path) and not os.path.exists(previous_source):
+        _link_manager.remove_source(previous_source)
+        logging.info("📝 Fuente renombrada: '%s' -> '%s'", previous_source, src_path)
+    _link_manager.add_link(src_path, existing_dest)
+
+
+@traced()
+def _process_single_file(src_path, dest_path, src_stat, result):
+    """Enlaza un archivo ya planificado; el destino existente se detecta por el propio os.link."""
+    # Comprobar por inodo si la fuente ya está enlazada, aunque el nombre haya cambiado
+    if _inode_index and src_stat:
+        existing_dest = _inode_index.lookup(src_stat)
+        if existing_dest:
+            _register_existing_link(src_path, existing_dest)
+            logging.debug("🧬 Ya enlazado (mismo inodo): '%s' -> '%s'", src_path, existing_dest)
+            result.skipped += 1
+            return
+
+    original_filename = os.path.basename(src_path)
+    sanitized_filename = os.path.basename(dest_path)
+    linked = _try_link(src_path, dest_path, src_stat)
+    if linked is None:
         if original_filename != sanitized_filename:
             logging.debug("📝 Archivo ya existe (sanitizado): '%s' -> '%s'",
                          original_filename, sanitized_filename)
-        return
-
-    if _try_link(src_path, dest_path):
+        result.skipped += 1
+    elif linked:
         if original_filename != sanitized_filename:
             logging.info("📝 Archivo sanitizado y enlazado: '%s' -> '%s'",
                         original_filename, sanitized_filename)
-
-
-def _process_video_files(src_path, dest_dir):
-    """Procesa archivo(s) de video: individual o dentro de una carpeta."""
-    if os.path.isfile(src_path):
-        if _is_video_file(src_path):
-            _process_single_file(src_path, dest_dir)
-    elif os.path.isdir(src_path):
-        # Procesar recursivamente todos los videos en la carpeta
-        for root, _, files in os.walk(src_path):
-            for filename in files:
-                if _is_video_file(filename):
-                    src_file = os.path.join(root, filename)
-                    _process_single_file(src_file, dest_dir)
-
-
-def organize_items(classified_items):
-    """Organiza los items clasificados en las carpetas destino."""
+        result.linked += 1
+    else:
+        result.failed += 1
+
+
+def organize_items(classified_items) -> OrganizeResult:
+    """Organiza los items clasificados en las carpetas destino.
+
+    Acepta cualquier iterable (p. ej. scanner.iter_classified()) y lo consume por bloques:
+    los enlaces aparecen según se resuelven y los registros en el LinkManager se confirman
+    en una sola transacción por bloque."""
+    items = iter(classified_items)
+    result = OrganizeResult()
+    chunk_size = get_config().scan_chunk_size
+    while True:
+        chunk = list(itertools.islice(items, chunk_size))
+        if not chunk:
+            return result
+        with _link_manager.batch() if _link_manager else nullcontext():
+            chunk_result = _organize_items(chunk)
+        _record_metrics(chunk_result)
+        result.merge(chunk_result)
+
+
+def _record_metrics(result: OrganizeResult):
+    for outcome in ('linked', 'skipped', 'failed'):
+        _LINKS.inc(getattr(result, outcome), result=outcome)
+    for stage in ('plan', 'mkdir', 'link'):
+        _ORGANIZE_STAGE_SECONDS.observe(getattr(result, f'{stage}_seconds'), stage=stage)
+
+
+@traced()
+def plan_items(classified_items, result: Optional[OrganizeResult] = None):
+    """Calcula (fuente, carpeta destino, ruta destino, stat) de cada video sin tocar los destinos."""
+    result = result if result is not None else OrganizeResult()
+    config = get_config()
+    plan = []
     for item_path, type_, canonical_name, data in classified_items:
         try:
             if type_ == 'movie':
                 # Películas van directamente a MOVIES_DIR
-                dest_dir = _ensure_dir(MOVIES_DIR)
-                _process_video_files(item_path, dest_dir)
+                dest_dir = os.fspath(config.movies_dir)
 
             elif type_ == 'episode':
                 # Series van a SERIES_DIR/SeriesName/Season XX/
-                series_name = canonical_name.split(' - ')[0] if ' - ' in canonical_name else canonical_name
-                series_name = _sanitize_name(series_name)
+                series_name = _series_folder(canonical_name)
 
                 season_num = data.get('season')
                 if season_num is None:
                     logging.warning("📺 Episodio sin número de temporada: %s", item_path)
+                    result.skipped += 1
                     continue
 
-                dest_series_dir = _ensure_dir(os.path.join(SERIES_DIR, series_name))
-                dest_season_dir = _ensure_dir(os.path.join(dest_series_dir, f"Season {int(season_num):02d}"))
-                _process_video_files(item_path, dest_season_dir)
+                dest_dir = os.path.join(config.series_dir, series_name, f"Season {int(season_num):02d}")
 
             else:
                 logging.warning("❓ Tipo desconocido para item: %s", item_path)
+                result.skipped += 1
+                continue
+
+            # Archivo individual o, recursivamente, los videos de una carpeta
+            for src_file, entry in iter_video_files(item_path):
+                src_stat = None
+                if _inode_index:
+                    src_stat = entry.stat() if entry else os.stat(src_file)
+                plan.append((src_file, dest_dir, os.path.join(dest_dir, _sanitize_name(os.path.basename(src_file))), src_stat))
 
         except Exception as e:
             logging.error("❌ Error organizando '%s': %s", item_path, e)
             logging.warning("⚠️ No se pudo organizar '%s' (hardlinks no soportados o error)", item_path)
+            result.failed += 1
+    return plan
+
+
+@traced()
+def execute_plan(plan, result: OrganizeResult) -> OrganizeResult:
+    """Ejecuta un plan: crea cada carpeta destino distinta una sola vez y después enlaza."""
+    started = time.perf_counter()
+    failed_dirs = set()
+    for dest_dir in dict.fromkeys(dest_dir for _, dest_dir, _, _ in plan):
+        try:
+            _ensure_dir(dest_dir)
+        except OSError as e:
+            logging.error("❌ Error creando carpeta '%s': %s", dest_dir, e)
+            failed_dirs.add(dest_dir)
+    result.mkdir_seconds += time.perf_counter() - started
+
+    started = time.perf_counter()
+    for src_file, dest_dir, dest_path, src_stat in plan:
+        if dest_dir in failed_dirs:
+            result.failed += 1
+            continue
+        try:
+            _process_single_file(src_file, dest_path, src_stat, result)
+        except Exception as e:
+            logging.error("❌ Error organizando '%s': %s", src_file, e)
+            result.failed += 1
+    result.link_seconds += time.perf_counter() - started
+    return result
+
+
+def _series_folder(canonical_name):
+    """Carpeta de la serie en SERIES_DIR a partir del nombre canónico de un episodio."""
+    series_name = canonical_name.split(' - ')[0] if ' - ' in canonical_name else canonical_name
+    return _sanitize_name(series_name)
+
+
+def _learn_series_folders(classified_items):
+    """Registra en el índice de la biblioteca la carpeta de cada serie organizada."""
+    library = get_library_index()
+    if library is None:
+        return
+    for _, type_, canonical_name, data in classified_items:
+        # Solo con un título confirmado por TMDb (no el de guessit ni el de la exportación sin red)
+        if type_ != 'episode' or not data.get('tmdb_confirmed'):
+            continue
+        _, title_key, year = title_lookup_key(type_, data)
+        library.learn(title_key, year, _series_folder(canonical_name))
+    library.save()
+
+
+def _organize_items(classified_items) -> OrganizeResult:
+    """Crea los hardlinks de un bloque: planifica todos los destinos, ejecuta el plan y
+    aprende las carpetas de las series en el índice de la biblioteca."""
+    result = OrganizeResult(items=len(classified_items))
+
+    started = time.perf_counter()
+    plan = plan_items(classified_items, result)
+    result.plan_seconds = time.perf_counter() - started
+
+    execute_plan(plan, result)
+    _learn_series_folders(classified_items)
+    return result
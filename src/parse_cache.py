@@ -0,0 +1,117 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+ParseKey = Tuple[str, int, int]  # (nombre de archivo, tamaño, mtime en ns)
+
+
+def to_plain(value: Any) -> Any:
+    """Convierte un valor de guessit (Language, Size, fechas...) a tipos serializables en JSON."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [to_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): to_plain(v) for k, v in value.items()}
+    return str(value)
+
+
+class ParseCache:
+    """Caché de resultados de guessit: LRU en memoria y, opcionalmente, SQLite en CONFIG_DIR.
+
+    La clave incluye tamaño y mtime, así que un archivo modificado se vuelve a analizar."""
+
+    def __init__(self, max_entries: int, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[ParseKey, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if db_path:
+            self._conn = sqlite3.connect(os.path.abspath(db_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS parses ("
+                " name TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " data TEXT NOT NULL,"
+                " PRIMARY KEY (name, size, mtime_ns)) WITHOUT ROWID"
+            )
+            self._conn.commit()
+
+    def get(self, key: ParseKey) -> Optional[Dict]:
+        """Obtiene el resultado cacheado (una copia) o None."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            elif self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT data FROM parses WHERE name = ? AND size = ? AND mtime_ns = ?", key
+                ).fetchone()
+                if row:
+                    data = json.loads(row[0])
+                    self._remember(key, data)
+
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(data)
+
+    def set(self, key: ParseKey, data: Dict):
+        """Guarda el resultado ya post-procesado de guessit."""
+        with self._lock:
+            self._remember(key, dict(data))
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO parses (name, size, mtime_ns, data) VALUES (?, ?, ?, ?)",
+                    key + (json.dumps(data, ensure_ascii=False),)
+                )
+
+    def flush(self):
+        """Confirma en disco los resultados nuevos (se llama una vez por lote)."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+
+    def _remember(self, key: ParseKey, data: Dict):
+        """Inserta en la LRU en memoria expulsando las entradas más antiguas."""
+        self._entries[key] = data
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Obtiene los contadores de aciertos y fallos."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries)
+        }
+
+
+_parse_cache: Optional[ParseCache] = None
+_parse_cache_lock = threading.Lock()
+
+
+def get_parse_cache() -> ParseCache:
+    """Obtiene la caché de análisis global, creándola en el primer uso."""
+    global _parse_cache
+    with _parse_cache_lock:
+        if _parse_cache is None:
+            from src.config import get_config
+            config = get_config()
+            _parse_cache = ParseCache(config.parse_cache_size,
+                                      config.parse_cache_path if config.parse_cache_persist else None)
+            logging.debug(f"🧠 Caché de guessit: {config.parse_cache_size} entradas en memoria, "
+                          f"persistente={config.parse_cache_persist}")
+        return _parse_cache
@@ -0,0 +1,98 @@
+import os
+import json
+import logging
+import itertools
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import IO, Iterable, Iterator
+from src.config import get_config
+from src.organizer import OrganizeResult, execute_plan, get_inode_index, get_link_manager, plan_items
+
+
+@dataclass
+class PlanResult(OrganizeResult):
+    """Resultado de escribir un plan: `planned` cuenta las operaciones escritas (nada se enlaza)."""
+    planned: int = 0
+
+
+def write_plan(classified_items: Iterable, out: IO[str]) -> PlanResult:
+    """Escribe el plan de enlaces como líneas JSON sin tocar los destinos.
+
+    Cada línea es {"op": "link", "source", "dest", "type", "title"}. Se escribe por bloques
+    según se clasifica, así que un plan grande no se acumula en memoria."""
+    items = iter(classified_items)
+    result = PlanResult()
+    chunk_size = get_config().scan_chunk_size
+    while True:
+        chunk = list(itertools.islice(items, chunk_size))
+        if not chunk:
+            return result
+        result.items += len(chunk)
+        by_path = {item_path: (type_, canonical_name) for item_path, type_, canonical_name, _ in chunk}
+
+        for src_file, _, dest_path, _ in plan_items(chunk, result):
+            type_, title = _item_for(src_file, by_path)
+            out.write(json.dumps({"op": "link", "source": src_file, "dest": dest_path,
+                                  "type": type_, "title": title}, ensure_ascii=False) + '\n')
+            result.planned += 1
+        out.flush()
+
+
+def _item_for(src_file: str, by_path: dict):
+    """Item clasificado al que pertenece un video (él mismo o una carpeta que lo contiene)."""
+    path = src_file
+    while path not in by_path:
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None, None
+        path = parent
+    return by_path[path]
+
+
+def read_plan(lines: Iterable[str]) -> Iterator[dict]:
+    """Lee un plan guardado, ignorando líneas vacías y operaciones desconocidas."""
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            operation = json.loads(line)
+        except ValueError as e:
+            logging.error(f"❌ Línea {number} del plan inválida: {e}")
+            continue
+        if operation.get("op") != "link" or not operation.get("source") or not operation.get("dest"):
+            logging.warning(f"⚠️ Operación ignorada en la línea {number}: {line[:200]}")
+            continue
+        yield operation
+
+
+def apply_plan(operations: Iterable[dict]) -> OrganizeResult:
+    """Ejecuta un plan guardado sin volver a clasificar: por bloques, con cada carpeta creada
+    una vez y los registros del LinkManager confirmados en una transacción por bloque."""
+    operations = iter(operations)
+    result = OrganizeResult()
+    chunk_size = get_config().scan_chunk_size
+    inode_index = get_inode_index()
+    link_manager = get_link_manager()
+    while True:
+        chunk = list(itertools.islice(operations, chunk_size))
+        if not chunk:
+            return result
+        result.items += len(chunk)
+
+        plan = []
+        for operation in chunk:
+            src_file = os.path.abspath(operation["source"])
+            dest_path = os.path.abspath(operation["dest"])
+            src_stat = None
+            if inode_index:
+                try:
+                    src_stat = os.stat(src_file)
+                except OSError as e:
+                    logging.error(f"❌ Fuente no disponible '{src_file}': {e}")
+                    result.failed += 1
+                    continue
+            plan.append((src_file, os.path.dirname(dest_path), dest_path, src_stat))
+
+        with link_manager.batch() if link_manager else nullcontext():
+            execute_plan(plan, result)
@@ -0,0 +1,185 @@
+import os
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from watchdog.events import (FileSystemEventHandler, FileCreatedEvent, FileDeletedEvent, FileMovedEvent,
+                             DirDeletedEvent, DirMovedEvent)
+from src.config import VIDEO_EXTENSIONS
+from src.fs_walk import load_snapshot, save_snapshot
+from src.tmdb_utils import TokenBucket
+
+
+class PollSnapshot:
+    """Instantánea persistente para el sondeo: mtime de cada directorio y, por nombre, el
+    inodo de sus subdirectorios y videos. El inodo permite reconocer renombrados."""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.dirs: Dict[str, dict] = {}  # {dir: {'mtime': ns, 'dirs': {name: ino}, 'files': {name: ino}}}
+        self.loaded = False
+        self.dirty = False
+
+    def load(self):
+        """Carga la instantánea desde disco (vacía si no existe o está corrupta)."""
+        dirs = load_snapshot(self.path, 'sondeo')
+        if dirs is not None:
+            self.dirs = dirs
+            self.loaded = True
+
+    def save(self):
+        """Guarda la instantánea de forma atómica si cambió."""
+        if self.dirty and save_snapshot(self.path, self.dirs, 'sondeo'):
+            self.dirty = False
+
+    def subtree(self, dir_path: str) -> List[str]:
+        """Directorios de la instantánea que cuelgan de `dir_path` (incluido)."""
+        prefix = dir_path + os.sep
+        return [d for d in self.dirs if d == dir_path or d.startswith(prefix)]
+
+    def drop(self, dir_path: str):
+        for d in self.subtree(dir_path):
+            del self.dirs[d]
+        self.dirty = True
+
+    def rekey(self, old_path: str, new_path: str):
+        """Traslada las entradas de un directorio renombrado sin volver a listarlo."""
+        for d in self.subtree(old_path):
+            self.dirs[new_path + d[len(old_path):]] = self.dirs.pop(d)
+        self.dirty = True
+
+
+class SnapshotObserver(threading.Thread):
+    """Observador por sondeo para montajes en red (NFS, SMB) sin eventos nativos.
+
+    En cada pasada solo hace stat de los directorios y vuelve a listar aquellos cuyo mtime
+    cambió; los stats y listados se limitan a `max_stats` por segundo para no saturar el
+    montaje. Las diferencias se entregan al manejador como eventos de watchdog. La instantánea
+    se persiste, así que un reinicio no produce una avalancha de eventos 'created'."""
+
+    def __init__(self, snapshot_path: str, interval: float, max_stats: float):
+        super().__init__(name='snapshot-observer', daemon=True)
+        self.snapshot = PollSnapshot(snapshot_path)
+        self.interval = interval
+        self._bucket = TokenBucket(max_stats, max_stats)
+        self._handler: Optional[FileSystemEventHandler] = None
+        self._root: Optional[str] = None
+        self._stopped = threading.Event()
+
+    def schedule(self, event_handler: FileSystemEventHandler, path: str, recursive: bool = True):
+        """Misma firma que los observadores de watchdog (siempre recursivo)."""
+        self._handler = event_handler
+        self._root = os.path.abspath(path)
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        self.snapshot.load()
+        # Sin instantánea previa, la primera pasada solo establece la línea base
+        emit = self.snapshot.loaded
+        while not self._stopped.is_set():
+            try:
+                self.poll(emit)
+            except Exception as e:
+                logging.error(f"❌ Error en el sondeo de {self._root}: {e}", exc_info=True)
+            emit = True
+            self._stopped.wait(self.interval)
+        self.snapshot.save()
+
+    def _list(self, dir_path: str) -> Optional[Tuple[Dict[str, int], Dict[str, int]]]:
+        """Lista subdirectorios y videos de un directorio con su inodo."""
+        self._bucket.acquire()
+        dirs, files = {}, {}
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs[entry.name] = entry.inode()
+                        elif entry.name.lower().endswith(VIDEO_EXTENSIONS):
+                            files[entry.name] = entry.inode()
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        return dirs, files
+
+    def _walk(self, stack: List[str], created: Dict[int, str], deleted: Dict[int, str],
+              new_dirs: Dict[int, str], gone_dirs: Dict[int, str]):
+        """Recorre los directorios cambiados y acumula las diferencias por inodo."""
+        while stack:
+            dir_path = stack.pop()
+            self._bucket.acquire()
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                continue
+
+            previous = self.snapshot.dirs.get(dir_path)
+            if previous is not None and previous['mtime'] == mtime_ns:
+                stack.extend(os.path.join(dir_path, name) for name in previous['dirs'])
+                continue
+
+            listing = self._list(dir_path)
+            if listing is None:
+                continue
+            dirs, files = listing
+            old_dirs = previous['dirs'] if previous else {}
+            old_files = previous['files'] if previous else {}
+            self.snapshot.dirs[dir_path] = {'mtime': mtime_ns, 'dirs': dirs, 'files': files}
+            self.snapshot.dirty = True
+
+            for name, ino in files.items():
+                if old_files.get(name) != ino:
+                    created[ino] = os.path.join(dir_path, name)
+            for name, ino in old_files.items():
+                if files.get(name) != ino:
+                    deleted[ino] = os.path.join(dir_path, name)
+            for name, ino in dirs.items():
+                if old_dirs.get(name) == ino:
+                    stack.append(os.path.join(dir_path, name))
+                else:
+                    new_dirs[ino] = os.path.join(dir_path, name)
+            for name, ino in old_dirs.items():
+                if dirs.get(name) != ino:
+                    gone_dirs[ino] = os.path.join(dir_path, name)
+
+    def poll(self, emit: bool = True):
+        """Una pasada completa: detecta altas, bajas y renombrados y los entrega al manejador."""
+        events = []
+        created: Dict[int, str] = {}
+        deleted: Dict[int, str] = {}
+        gone_dirs: Dict[int, str] = {}
+        stack = [self._root]
+
+        while stack:
+            new_dirs: Dict[int, str] = {}
+            self._walk(stack, created, deleted, new_dirs, gone_dirs)
+            for ino, new_path in new_dirs.items():
+                old_path = gone_dirs.pop(ino, None)
+                if old_path is not None:
+                    # Directorio renombrado: se conservan sus entradas y solo se revisa su mtime
+                    self.snapshot.rekey(old_path, new_path)
+                    events.append(DirMovedEvent(old_path, new_path))
+                stack.append(new_path)
+
+        file_events = []
+        for ino, new_path in created.items():
+            old_path = deleted.pop(ino, None)
+            if old_path is not None:
+                file_events.append(FileMovedEvent(old_path, new_path))
+            else:
+                file_events.append(FileCreatedEvent(new_path))
+
+        # Las bajas van antes que las altas: un archivo sustituido en su sitio (mismo nombre,
+        # otro inodo) se borra y luego se crea, en lugar de descartarse tras detectarse
+        for old_path in gone_dirs.values():
+            self.snapshot.drop(old_path)
+            events.append(DirDeletedEvent(old_path))
+        events.extend(FileDeletedEvent(path) for path in deleted.values())
+        events.extend(file_events)
+
+        if emit and self._handler is not None:
+            for event in events:
+                self._handler.dispatch(event)
+        self.snapshot.save()
@@ -0,0 +1,96 @@
+import os
+import logging
+from typing import Dict, List, Optional
+from src.config import get_config
+from src.fs_walk import DirSnapshot, iter_video_files
+from src.scanner import iter_classified
+from src.organizer import OrganizeResult, organize_items
+
+
+def _unlinked_sources(link_manager, watch_dir: str, orphaned=frozenset()) -> List[str]:
+    """Fuentes de WATCH_DIR registradas pero sin ningún link, que siguen existiendo."""
+    return sorted(source for source in link_manager.get_unlinked_sources()
+                  if source.startswith(watch_dir + os.sep) and source not in orphaned and os.path.exists(source))
+
+
+def diff_watch_dir(link_manager, snapshot: Optional[DirSnapshot] = None,
+                   include_unlinked: bool = True) -> Dict[str, List[str]]:
+    """Compara los videos de WATCH_DIR con las fuentes del mapa de links.
+
+    Devuelve las rutas nuevas (sin registrar), cambiadas (registradas pero sin ningún link) y
+    huérfanas (registradas pero ya no presentes). Con `snapshot` solo se listan los directorios
+    modificados: en los demás el contenido no ha cambiado y sus fuentes siguen presentes, pero
+    las de directorios que no aparecieron en el recorrido (borrados) son huérfanas. Con
+    `include_unlinked=False` no se buscan las cambiadas (p. ej. si la limpieza de enlaces rotos
+    aún está en marcha y las irá dejando sin links)."""
+    watch_dir = os.path.abspath(get_config().watch_dir)
+    current = {path for path, _ in iter_video_files(watch_dir, snapshot, skip_hidden_top_level=True)}
+    known = {source for source in link_manager.get_all_sources() if source.startswith(watch_dir + os.sep)}
+
+    if snapshot is None:
+        orphaned = known - current
+    else:
+        orphaned = set()
+        for source in known - current:
+            parent = os.path.dirname(source)
+            # Directorio desaparecido, o modificado y ya sin este archivo
+            if not snapshot.seen(parent) or parent in snapshot.changed:
+                orphaned.add(source)
+
+    # Con instantánea `current` solo tiene los videos de directorios modificados
+    changed = _unlinked_sources(link_manager, watch_dir, orphaned) if include_unlinked else []
+    return {
+        "new": sorted(current - known),
+        "changed": changed,
+        "orphaned": sorted(orphaned),
+    }
+
+
+def _remove_orphans(link_manager, orphaned: List[str], total_known: int) -> int:
+    """Elimina los hard links de fuentes que desaparecieron mientras el servicio estaba parado,
+    igual que haría el vigilante. Se omite si parece que WATCH_DIR no está montado."""
+    if not orphaned:
+        return 0
+    if total_known and len(orphaned) / total_known > get_config().reconcile_max_orphan_ratio:
+        logging.warning(f"⚠️ {len(orphaned)} de {total_known} fuentes han desaparecido; "
+                        f"¿WATCH_DIR sin montar? No se eliminan sus hard links")
+        return 0
+
+    with link_manager.batch():
+        for source_path in orphaned:
+            for link_path in link_manager.remove_source(source_path):
+                try:
+                    if os.path.exists(link_path):
+                        os.remove(link_path)
+                        logging.debug(f"  ✅ Eliminado: {link_path}")
+                except Exception as e:
+                    logging.error(f"  ❌ Error al eliminar {link_path}: {e}")
+    logging.info(f"🗑️ {len(orphaned)} fuente(s) huérfana(s) eliminadas del mapa")
+    return len(orphaned)
+
+
+def reconcile(link_manager, snapshot: Optional[DirSnapshot] = None,
+              include_unlinked: bool = True) -> OrganizeResult:
+    """Fase de arranque: solo se clasifican y enlazan los archivos nuevos o sin links, y se
+    limpian los huérfanos, en lugar de reprocesar todo WATCH_DIR. Con `include_unlinked=False`
+    las fuentes sin links se dejan para `relink_unlinked`. Retorna el resultado de la organización."""
+    diff = diff_watch_dir(link_manager, snapshot, include_unlinked)
+    logging.info(f"🔁 Reconciliación: {len(diff['new'])} nuevo(s), {len(diff['changed'])} sin links, "
+                 f"{len(diff['orphaned'])} huérfano(s)")
+
+    _remove_orphans(link_manager, diff['orphaned'], link_manager.get_stats()['total_sources'])
+
+    pending = diff['new'] + diff['changed']
+    if not pending:
+        return OrganizeResult()
+    return organize_items(iter_classified(pending))
+
+
+def relink_unlinked(link_manager) -> OrganizeResult:
+    """Clasifica y enlaza de nuevo las fuentes de WATCH_DIR que se han quedado sin links. Se usa
+    tras la limpieza de enlaces rotos en segundo plano, que es la que las deja sin links."""
+    pending = _unlinked_sources(link_manager, os.path.abspath(get_config().watch_dir))
+    logging.info(f"🔁 Reconciliación tras la limpieza: {len(pending)} fuente(s) sin links")
+    if not pending:
+        return OrganizeResult()
+    return organize_items(iter_classified(pending))
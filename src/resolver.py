@@ -0,0 +1,125 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Hashable, Tuple
+from src.config import get_config
+from src.tmdb_utils import get_localized_title, get_official_movie_title, get_official_series_title
+from src.tmdb_cache import get_tmdb_cache
+from src.tmdb_export import get_export_index
+from src.library_index import get_library_index
+from src.tracing import propagate, traced
+
+# Tipo del índice de exportaciones de TMDb según el tipo de guessit
+_EXPORT_KINDS = {'movie': 'movie', 'episode': 'tv'}
+
+
+def _empty_result(type_):
+    """Resultado equivalente a "no encontrado" según el tipo."""
+    return (None, None) if type_ == 'movie' else None
+
+
+def _confirm(type_, data, value):
+    """Marca en los datos de guessit que el título oficial está confirmado por TMDb."""
+    if value and (value[0] if type_ == 'movie' else value):
+        data['tmdb_confirmed'] = True
+
+
+def _offline_result(type_, match):
+    """Resultado sin red: el título original de la exportación de TMDb, si lo hay."""
+    if match is None:
+        return _empty_result(type_)
+    return (match.title, None) if type_ == 'movie' else match.title
+
+
+def _fetch_title(type_, title_key, year, data, match=None):
+    """Consulta TMDb para un título y guarda el resultado en la caché persistente.
+
+    Con `match` (coincidencia del índice de exportaciones) se omite la búsqueda: solo se piden
+    los detalles en es-ES por ID. Si esa petición falla (p. ej. un ID retirado de TMDb), se
+    busca el título como si no hubiera coincidencia y un resultado vacío se cachea como negativo."""
+    if match is not None:
+        try:
+            title, release_year = get_localized_title(_EXPORT_KINDS[type_], match.tmdb_id)
+        except Exception as e:
+            logging.warning(f"⚠️ Detalles de TMDb {match.tmdb_id} ('{match.title}') no disponibles: {e}; "
+                            f"se busca por título")
+        else:
+            title = title or match.title
+            value = (title, release_year) if type_ == 'movie' else title
+            get_tmdb_cache().set(type_, title_key, year, value, found=True)
+            return value
+
+    try:
+        if type_ == 'movie':
+            value = get_official_movie_title(data, raise_errors=True)
+            found = bool(value[0])
+        else:
+            value = get_official_series_title(data, raise_errors=True)
+            found = bool(value)
+        get_tmdb_cache().set(type_, title_key, year, value, found=found)
+        return value
+    except Exception as e:
+        # Los errores de red no se cachean para reintentar en el siguiente lote
+        logging.error(f"❌ Error TMDb para '{data.get('title')}': {e}")
+        return _empty_result(type_)
+
+
+@traced()
+def resolve_titles(lookups: Dict[Hashable, Tuple[str, str, str, Any]]) -> Dict[Hashable, Any]:
+    """Resuelve títulos oficiales deduplicados: primero en la caché persistente y el resto
+    en paralelo contra TMDb con como máximo TMDB_WORKERS peticiones en vuelo. Antes que nada,
+    los episodios de series que ya tienen carpeta en SERIES_DIR toman el nombre de esa carpeta.
+
+    Con el índice de exportaciones (TMDB_EXPORT_DIR) los títulos que encuentra solo necesitan
+    la petición de detalles en es-ES; con TMDB_OFFLINE=1 no se hace ninguna petición y se usa el
+    título original de la exportación, sin guardarlo en la caché.
+
+    Los títulos que vienen de TMDb (o de una carpeta aprendida con uno) marcan sus datos de
+    guessit con `tmdb_confirmed`; los de TMDB_OFFLINE no están confirmados.
+
+    `lookups` mapea cada clave única a (tipo, título normalizado, año, datos guessit)."""
+    cache = get_tmdb_cache()
+    offline = get_config().tmdb_offline
+    index = get_export_index()
+    library = get_library_index()
+    results = {}
+    pending = []
+
+    for key, (type_, title_key, year, data) in lookups.items():
+        if type_ == 'episode' and library:
+            folder = library.lookup(title_key, year)
+            if folder:
+                results[key] = folder
+                _confirm(type_, data, folder)
+                continue
+
+        cached, value = cache.get(type_, title_key, year)
+        if cached:
+            if type_ == 'movie':
+                value = tuple(value) if value else (None, None)
+            results[key] = value
+            _confirm(type_, data, value)
+        else:
+            match = index.lookup(_EXPORT_KINDS[type_], title_key) if index else None
+            if offline:
+                results[key] = _offline_result(type_, match)
+            else:
+                pending.append((key, type_, title_key, year, data, match))
+
+    if library:
+        stats = library.get_stats()
+        logging.info(f"📂 Biblioteca: {stats['hits']} aciertos, {stats['misses']} fallos, {stats['series']} series")
+    if index:
+        stats = index.get_stats()
+        logging.info(f"📚 Índice TMDb local: {stats['hits']} exactos, {stats['fuzzy_hits']} aproximados, "
+                     f"{stats['misses']} fallos")
+
+    if pending:
+        logging.info(f"🌐 Resolviendo {len(pending)} título(s) en TMDb...")
+        workers = min(get_config().tmdb_workers, len(pending))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tmdb') as executor:
+            values = executor.map(propagate(lambda p: _fetch_title(*p[1:])), pending)
+            for (key, type_, _, _, data, _), value in zip(pending, values):
+                results[key] = value
+                _confirm(type_, data, value)
+
+    return results
@@ -1,72 +1,248 @@
 import os
+import time
 import logging
 import re
-import unicodedata
-from guessit import guessit
-from src.config import WATCH_DIR, VIDEO_EXTENSIONS
-from src.tmdb_utils import get_official_movie_title, get_official_series_title
-
-
-def _normalize_title_for_cache(title):
-    """Normaliza un título para usarlo como clave en caché, ignorando diacríticos y espacios extras."""
-    if not title:
-        return None
-    title = title.lower()
-    title = ' '.join(title.split())
-    nfd = unicodedata.normalize('NFD', title) # Eliminar diacríticos (NFD)
-    title_no_accents = ''.join(c for c in nfd if unicodedata.category(c) != 'Mn')
-    return title_no_accents
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from src.config import get_config
+from src.resolver import resolve_titles
+from src.tmdb_cache import get_tmdb_cache, title_lookup_key
+from src.parse_cache import get_parse_cache, to_plain
+from src.fs_walk import iter_video_files
+from src import metrics
+from src.tracing import traced
 
+_STAGE_SECONDS = metrics.histogram('media_sorter_scan_stage_seconds',
+                                   "Duración de cada etapa del escaneo por bloque (guessit, tmdb)")
+_PARSED_FILES = metrics.counter('media_sorter_parsed_files_total',
+                                "Archivos analizados por guessit o servidos por su caché")
+
+
+def _guess(file_name):
+    """Ejecuta guessit y aplica las correcciones propias sobre su resultado.
+
+    guessit se importa en el primer uso: cargar sus reglas es lo más caro del arranque y
+    los comandos que no analizan nombres (o lo sirven todo desde caché) no lo necesitan."""
+    from guessit import guessit
+    data = to_plain(dict(guessit(file_name) or {}))
+
+    # Guessit interpreta 'T01' (temporada en castellano) como título alternativo de película
+    alternative_title = data.get('alternative_title')
+    if data.get('type') == 'movie' and isinstance(alternative_title, str):
+        match = re.match(r'^T(\d+)$', alternative_title)
+        if match:
+            data['season'] = int(match.group(1))
+            data['type'] = 'episode'
+            del data['alternative_title']
+    return data
+
+
+def _guess_safe(file_name):
+    """Como _guess, pero un fallo de guessit en un archivo no aborta el lote."""
+    try:
+        return _guess(file_name)
+    except Exception as e:
+        logging.error('Error de guessit en %s: %s', file_name, e)
+        return {}
+
+
+def _chunks(iterable, size):
+    """Agrupa un iterable en listas de como máximo `size` elementos."""
+    chunk = []
+    for element in iterable:
+        chunk.append(element)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _ParseStage:
+    """Etapa de análisis con guessit: los aciertos de caché se resuelven en línea y los
+    fallos, si son suficientes, en un pool de procesos (SCAN_WORKERS) creado bajo demanda.
+
+    El orden de salida coincide con el de entrada, sea cual sea el número de procesos."""
+
+    def __init__(self):
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            workers = get_config().scan_workers
+            # 'spawn' evita heredar locks de los hilos del vigilante o del resolver
+            self._executor = ProcessPoolExecutor(max_workers=workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            logging.info(f"⚙️ Analizando con guessit en {workers} procesos...")
+        return self._executor
+
+    @traced('guessit_parse')
+    def parse(self, files):
+        """Devuelve (ruta, datos) de los archivos clasificables como episodio o película."""
+        cache = get_parse_cache()
+        keys = [(os.path.basename(path), st.st_size, st.st_mtime_ns) for path, st in files]
+        results = [cache.get(key) for key in keys]
+        misses = [i for i, data in enumerate(results) if data is None]
+        _PARSED_FILES.inc(len(keys) - len(misses), source='cache')
+        _PARSED_FILES.inc(len(misses), source='guessit')
+
+        if misses:
+            started = time.perf_counter()
+            names = [keys[i][0] for i in misses]
+            config = get_config()
+            if config.scan_workers > 1 and len(misses) >= config.scan_parallel_min:
+                chunksize = max(1, len(names) // (config.scan_workers * 4))
+                guessed = self._pool().map(_guess_safe, names, chunksize=chunksize)
+            else:
+                guessed = map(_guess_safe, names)
+            for i, data in zip(misses, guessed):
+                cache.set(keys[i], data)
+                results[i] = data
+            cache.flush()
+            _STAGE_SECONDS.observe(time.perf_counter() - started, stage='guessit')
+
+        return [(path, data) for (path, _), data in zip(files, results)
+                if data.get('type') in ['episode', 'movie']]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def _is_hidden_in_watch_dir(path, watch_dir):
+    """Indica si la ruta cuelga de una entrada oculta de primer nivel de WATCH_DIR
+    (comparando componentes: WATCH_DIR y las rutas de fuera no lo están)."""
+    if not path.startswith(watch_dir + os.sep):
+        return False
+    return path[len(watch_dir) + 1:].split(os.sep)[0].startswith('.')
+
+
+def _scan_roots(paths, watch_dir):
+    """Raíces a recorrer para `paths`: absolutas, sin repetidas ni ocultas, y sin las que
+    quedan fuera de WATCH_DIR (se avisa). WATCH_DIR entre ellas equivale a recorrerlo entero."""
+    roots = []
+    for path in _dedupe_paths(os.path.abspath(p) for p in paths):
+        if path != watch_dir and not path.startswith(watch_dir + os.sep):
+            logging.warning(f"⚠️ Ruta fuera de WATCH_DIR ignorada: {path}")
+        elif not _is_hidden_in_watch_dir(path, watch_dir):
+            roots.append(path)
+    return roots
+
+
+def _dedupe_paths(paths):
+    """Normaliza y elimina rutas repetidas o contenidas en otra carpeta del mismo lote."""
+    normalized = {os.path.normpath(p) for p in paths}
+    result = []
+    for path in sorted(normalized):
+        parent = os.path.dirname(path)
+        covered = False
+        # Recorrer ancestros con búsquedas en el set (O(profundidad) por ruta)
+        while parent and parent != os.path.dirname(parent):
+            if parent in normalized:
+                covered = True
+                break
+            parent = os.path.dirname(parent)
+        if not covered:
+            result.append(path)
+    return result
+
+
+def _stat_files(roots, watch_dir, snapshot=None):
+    """Genera (ruta, stat) de los videos de `roots`. Los que no se pueden consultar (symlink
+    roto, borrados durante el escaneo) se omiten sin interrumpir el resto del escaneo."""
+    for root in roots:
+        # Ignorar entradas ocultas de primer nivel de WATCH_DIR
+        for path, entry in iter_video_files(root, snapshot, skip_hidden_top_level=root == watch_dir):
+            try:
+                yield path, entry.stat() if entry else os.stat(path)
+            except OSError as e:
+                logging.warning(f"⚠️ No se puede leer {path}, se omite: {e}")
+
+
+def iter_classified(paths=None, snapshot=None):
+    """Generador de items clasificados: recorre, analiza y resuelve por bloques y va
+    produciendo cada bloque en cuanto está resuelto, con memoria acotada por SCAN_CHUNK_SIZE.
+
+    Sin `paths` recorre todo WATCH_DIR; con `paths` solo esas rutas (archivos o carpetas).
+    Con `snapshot` (DirSnapshot) solo se listan los directorios modificados desde la última vez."""
+    config = get_config()
+    watch_dir = os.path.abspath(config.watch_dir)
+    roots = [watch_dir] if paths is None else _scan_roots(paths, watch_dir)
+
+    stage = _ParseStage()
+    try:
+        for chunk in _chunks(_stat_files(roots, watch_dir, snapshot), config.scan_chunk_size):
+            yield from _classify_items(stage.parse(chunk))
+    finally:
+        stage.close()
+
+
+@traced()
 def scan_and_classify():
     """Escanea el directorio, clasifica contenido y obtiene títulos oficiales."""
-    items = []
-    title_cache = {}
-
-    for item_name in os.listdir(WATCH_DIR):
-        if item_name.startswith('.'): # Ignorar archivos ocultos
-            continue
-
-        item_path = os.path.join(WATCH_DIR, item_name)
-        if os.path.isdir(item_path):
-            # Si es carpeta, buscar archivos de video dentro
-            for root, dirs, files in os.walk(item_path):
-                for file in files:
-                    if file.lower().endswith(VIDEO_EXTENSIONS):
-                        full_path = os.path.join(root, file)
-                        data = guessit(file)
-                        if data and data.get('type') in ['episode', 'movie']:
-                            items.append((full_path, data))
-        else:
-            if item_name.lower().endswith(VIDEO_EXTENSIONS):
-                data = guessit(item_name)
-                if data and data.get('type') in ['episode', 'movie']:
-                    items.append((item_path, data))
+    return list(iter_classified())
 
-    classified_items = []
+
+def classify_paths(paths):
+    """Clasifica solo las rutas indicadas (archivos o carpetas) sin recorrer todo WATCH_DIR.
+
+    El coste depende del tamaño del lote y no del tamaño de la biblioteca."""
+    return list(iter_classified(paths))
+
+
+@traced()
+def _classify_items(items):
+    """Obtiene los títulos oficiales y construye los items clasificados.
+
+    Primero se deduplican los títulos del lote y se resuelven todos juntos
+    (caché persistente y TMDb en paralelo); después se construyen los nombres canónicos."""
+    prepared = []
+    lookups = {}
 
     for item_path, data in items:
         try:
             item_name = os.path.basename(item_path)
-            if data and data.get('type') == 'movie' and 'alternative_title' in data:
-                match = re.match(r'^T(\d+)$', data['alternative_title'])
-                if match:
-                    data['season'] = int(match.group(1))
-                    data['type'] = 'episode'
-                    del data['alternative_title']
-
             if not data or data.get('type') not in ['episode', 'movie']:
                 logging.warning(f"❓ NO CLASIFICADO (Guessit): {item_name}")
                 continue
 
+            if data.get('type') == "episode" and ("title" not in data or "season" not in data):
+                logging.warning(f"📺 SERIE (Incompleto): '{item_name}' -> Faltan Título/Temporada en Guessit.")
+                continue
+
+            lookup_key = title_lookup_key(data.get('type'), data)
+            lookups.setdefault(lookup_key, lookup_key + (data,))
+            prepared.append((item_path, data, lookup_key))
+
+        except Exception as e:
+            logging.error('Error al procesar item %s: %s', item_path, e)
+
+    parse_stats = get_parse_cache().get_stats()
+    logging.info(f"🧠 Caché guessit: {parse_stats['hits']} aciertos, {parse_stats['misses']} análisis")
+
+    if not prepared:
+        return []
+
+    with _STAGE_SECONDS.time(stage='tmdb'):
+        titles = resolve_titles(lookups)
+    stats = get_tmdb_cache().get_stats()
+    logging.info(f"🗃️ Caché TMDb: {stats['hits']} aciertos, {stats['misses']} fallos, {stats['entries']} entradas")
+
+    classified_items = []
+
+    for item_path, data, lookup_key in prepared:
+        try:
+            # Los items con el mismo título comparten la confirmación de TMDb de su consulta
+            if lookups[lookup_key][3].get('tmdb_confirmed'):
+                data['tmdb_confirmed'] = True
+            item_name = os.path.basename(item_path)
             type_ = data.get("type")
             title_detected = data.get('title', 'N/A')
             canonical_name = None
 
             if type_ == "movie":
-                title_key = _normalize_title_for_cache(title_detected)
-                if title_key not in title_cache:
-                    title_cache[title_key] = get_official_movie_title(data)
-                official_title, official_year = title_cache[title_key]
+                official_title, official_year = titles[lookup_key]
                 if official_title:
                     canonical_name = f"{official_title} ({official_year})" if official_year else official_title
                 else:
@@ -74,13 +250,7 @@ def scan_and_classify():
                     canonical_name = title_detected
 
             elif type_ == "episode":
-                if "title" not in data or "season" not in data:
-                    logging.warning(f"📺 SERIE (Incompleto): '{item_name}' -> Faltan Título/Temporada en Guessit.")
-                    continue
-                title_key = _normalize_title_for_cache(title_detected)
-                if title_key not in title_cache:
-                    title_cache[title_key] = get_official_series_title(data)
-                official_title = title_cache[title_key]
+                official_title = titles[lookup_key]
                 if official_title:
                     season_num = data['season']
                     episode_num = data.get('episode')
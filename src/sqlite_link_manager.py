@@ -0,0 +1,255 @@
+import os
+import sqlite3
+import itertools
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from src.link_manager import (CLEANUP_CHUNK_SIZE, MAP_COMMIT_SECONDS, CleanupProgress, LinkManager, entry_paths,
+                              find_existing_paths)
+from src.tracing import traced
+
+# Segundos que un hilo espera el bloqueo de escritura mientras otro confirma su lote
+BUSY_TIMEOUT_SECONDS = 60
+
+
+class SqliteLinkManager:
+    """Mapa de hard links persistido en SQLite con índices por fuente y por destino.
+
+    Mantiene la misma API que LinkManager sin cargar el mapa en memoria: cada consulta
+    usa un índice. La clave primaria (source, dest) sirve también como índice de prefijo
+    de directorio, ya que las fuentes de un subárbol forman un rango contiguo.
+
+    Cada hilo usa su propia conexión y su propia transacción: con WAL las lecturas de otros
+    hilos no esperan a que termine un lote, y las escrituras se serializan en SQLite."""
+
+    def __init__(self):
+        """Abre (o crea) la base de datos e importa el mapa JSON existente la primera vez."""
+        from src.config import get_config
+        config = get_config()
+        self.db_path = os.path.abspath(config.hardlinks_sqlite_path)
+        self.json_path = os.path.abspath(config.hardlinks_db_path)
+        self._local = threading.local()
+
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY) WITHOUT ROWID")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS links ("
+            " source TEXT NOT NULL,"
+            " dest TEXT NOT NULL,"
+            " PRIMARY KEY (source, dest)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_links_dest ON links (dest)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+        self.load()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """Conexión del hilo actual, creada en su primer uso."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit: las transacciones se abren explícitamente en batch(). Un escritor
+            # espera (timeout) a que otro hilo confirme su lote en lugar de fallar
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.batch_depth = 0
+        return conn
+
+    def load(self):
+        """Importa hardlinks_map.json (y su journal) la primera vez que se abre la base de datos.
+
+        La importación queda registrada en la tabla meta: si el mapa se vacía después, las
+        entradas antiguas del JSON no vuelven en el siguiente arranque."""
+        if self._conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+            logging.info(f"✅ Mapa de hard links (SQLite) abierto: {self.get_stats()['total_sources']} entradas")
+            return
+
+        with self.batch():
+            # Una base de datos anterior a la tabla meta con fuentes ya hizo su importación
+            if not self._conn.execute("SELECT 1 FROM sources LIMIT 1").fetchone():
+                self._import_json()
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', '1')")
+
+    def _import_json(self):
+        """Copia el mapa JSON (instantánea y journal) a las tablas, dentro del lote abierto."""
+        # Un mapa JSON sin compactar puede existir solo como journal
+        journal_path = os.path.splitext(self.json_path)[0] + '.journal'
+        if not (os.path.exists(self.json_path) or os.path.exists(journal_path)):
+            return
+
+        json_manager = LinkManager()
+        for source_path, dest_paths in json_manager.links.items():
+            self._conn.execute("INSERT OR IGNORE INTO sources (path) VALUES (?)", (source_path,))
+            self._conn.executemany("INSERT OR IGNORE INTO links (source, dest) VALUES (?, ?)",
+                                   [(source_path, d) for d in dest_paths])
+        if json_manager.links:
+            logging.info(f"📥 Mapa JSON importado a SQLite: {len(json_manager.links)} entradas")
+
+    @contextmanager
+    def batch(self):
+        """Agrupa las altas y bajas del hilo actual en una sola transacción.
+
+        BEGIN IMMEDIATE toma el bloqueo de escritura al empezar: dos lotes de hilos distintos
+        se ordenan en lugar de fallar al promocionar una lectura a escritura."""
+        conn = self._conn
+        local = self._local
+        if local.batch_depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        local.batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            local.batch_depth -= 1
+            if local.batch_depth == 0:
+                conn.execute("ROLLBACK")
+            raise
+        local.batch_depth -= 1
+        if local.batch_depth == 0:
+            with MAP_COMMIT_SECONDS.time(backend='sqlite'):
+                conn.execute("COMMIT")
+
+    @traced()
+    def save(self):
+        """Confirma los cambios pendientes (cada operación ya es persistente fuera de un lote)."""
+        conn = self._conn
+        if conn.in_transaction and self._local.batch_depth == 0:
+            conn.execute("COMMIT")
+
+    def add_link(self, source_path: str, dest_path: str):
+        """Registra un nuevo hard link."""
+        source_path = os.path.abspath(os.path.normpath(source_path))
+        dest_path = os.path.abspath(os.path.normpath(dest_path))
+
+        with self.batch():
+            self._conn.execute("INSERT OR IGNORE INTO sources (path) VALUES (?)", (source_path,))
+            inserted = self._conn.execute("INSERT OR IGNORE INTO links (source, dest) VALUES (?, ?)",
+                                          (source_path, dest_path)).rowcount
+        if inserted:
+            logging.info(f"🔗 Link registrado: {source_path} -> {dest_path}")
+
+    def get_links(self, source_path: str) -> List[str]:
+        """Obtiene todos los hard links asociados a un archivo fuente."""
+        source_path = os.path.abspath(os.path.normpath(source_path))
+        rows = self._conn.execute("SELECT dest FROM links WHERE source = ?", (source_path,)).fetchall()
+        return [row[0] for row in rows]
+
+    def remove_source(self, source_path: str) -> List[str]:
+        """Elimina un archivo fuente y retorna sus hard links."""
+        source_path = os.path.abspath(os.path.normpath(source_path))
+        with self.batch():
+            links = self.get_links(source_path)
+            self._conn.execute("DELETE FROM links WHERE source = ?", (source_path,))
+            self._conn.execute("DELETE FROM sources WHERE path = ?", (source_path,))
+        if links:
+            logging.debug(f"🗑️ Fuente eliminada del mapa: {source_path}")
+        return links
+
+    def source_for(self, dest_path: str) -> Optional[str]:
+        """Obtiene el archivo fuente de un hard link destino (índice por destino)."""
+        dest_path = os.path.abspath(os.path.normpath(dest_path))
+        row = self._conn.execute("SELECT source FROM links WHERE dest = ? LIMIT 1", (dest_path,)).fetchone()
+        return row[0] if row else None
+
+    def sources_under(self, dir_path: str) -> List[str]:
+        """Obtiene las fuentes registradas dentro de un directorio mediante un rango sobre el índice."""
+        low, high = _prefix_range(dir_path)
+        rows = self._conn.execute("SELECT path FROM sources WHERE path >= ? AND path < ?", (low, high)).fetchall()
+        return [row[0] for row in rows]
+
+    def remove_subtree(self, dir_path: str) -> Dict[str, List[str]]:
+        """Elimina todas las fuentes de un directorio en una sola transacción.
+
+        Retorna {fuente: hard links} de las fuentes eliminadas."""
+        low, high = _prefix_range(dir_path)
+        with self.batch():
+            removed: Dict[str, List[str]] = {source: [] for source in self.sources_under(dir_path)}
+            for source_path, dest_path in self._conn.execute(
+                    "SELECT source, dest FROM links WHERE source >= ? AND source < ?", (low, high)):
+                removed.setdefault(source_path, []).append(dest_path)
+            self._conn.execute("DELETE FROM links WHERE source >= ? AND source < ?", (low, high))
+            self._conn.execute("DELETE FROM sources WHERE path >= ? AND path < ?", (low, high))
+        if removed:
+            logging.debug(f"🗑️ {len(removed)} fuente(s) eliminadas del mapa bajo: {dir_path}")
+        return removed
+
+    def _iter_links(self, page_size: int = 1000) -> Iterator[Tuple[str, List[str]]]:
+        """Recorre (fuente, destinos) en orden de fuente, por páginas, sin cargar todo el mapa."""
+        last = ''
+        while True:
+            sources = [row[0] for row in self._conn.execute(
+                "SELECT path FROM sources WHERE path > ? ORDER BY path LIMIT ?", (last, page_size))]
+            if not sources:
+                return
+            rows = self._conn.execute(
+                "SELECT source, dest FROM links WHERE source >= ? AND source <= ?", (sources[0], sources[-1])
+            ).fetchall()
+            dests: Dict[str, List[str]] = {}
+            for source_path, dest_path in rows:
+                dests.setdefault(source_path, []).append(dest_path)
+            for source_path in sources:
+                yield source_path, dests.get(source_path, [])
+            last = sources[-1]
+
+    def cleanup_broken_links(self, workers: Optional[int] = None):
+        """Limpia el mapa eliminando entradas donde ni la fuente ni los destinos existen.
+
+        Recorre el mapa por páginas y comprueba cada página en paralelo con un listado por directorio."""
+        from src.config import get_config
+        workers = workers or get_config().cleanup_workers
+        progress = CleanupProgress(self.get_stats()['total_sources'])
+        cleaned = 0
+        links = self._iter_links(page_size=CLEANUP_CHUNK_SIZE)
+
+        while True:
+            chunk = list(itertools.islice(links, CLEANUP_CHUNK_SIZE))
+            if not chunk:
+                break
+            existing = find_existing_paths(entry_paths(chunk), workers)
+
+            with self.batch():
+                for source_path, dest_paths in chunk:
+                    # Filtrar destinos que aún existen
+                    existing_dests = [d for d in dest_paths if d in existing]
+
+                    # Si la fuente no existe y no quedan destinos, eliminarla
+                    if source_path not in existing and not existing_dests:
+                        self.remove_source(source_path)
+                        cleaned += 1
+                    elif existing_dests != dest_paths:
+                        # Eliminar solo los destinos que ya no existen
+                        self._conn.executemany("DELETE FROM links WHERE source = ? AND dest = ?",
+                                               [(source_path, d) for d in dest_paths if d not in existing])
+                        cleaned += 1
+            progress.advance(len(chunk))
+
+        if cleaned > 0:
+            logging.info(f"🧹 Limpieza completada: {cleaned} entradas corregidas")
+
+        return cleaned
+
+    def get_unlinked_sources(self) -> List[str]:
+        """Obtiene las fuentes registradas que se han quedado sin ningún hard link."""
+        rows = self._conn.execute(
+            "SELECT path FROM sources WHERE NOT EXISTS (SELECT 1 FROM links WHERE links.source = sources.path)"
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_all_sources(self) -> Set[str]:
+        """Obtiene el conjunto de todos los archivos fuente registrados."""
+        return {row[0] for row in self._conn.execute("SELECT path FROM sources")}
+
+    def get_stats(self) -> Dict[str, int]:
+        """Obtiene estadísticas del mapa de links."""
+        total_sources = self._conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0]
+        total_links = self._conn.execute("SELECT COUNT(*) FROM links").fetchone()[0]
+        return {
+            "total_sources": total_sources,
+            "total_links": total_links
+        }
+
+
+def _prefix_range(dir_path: str) -> Tuple[str, str]:
+    """Rango [low, high) de rutas que cuelgan de un directorio: todas empiezan por 'dir/'."""
+    prefix = os.path.abspath(os.path.normpath(dir_path)) + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+import unicodedata
+from typing import Any, Dict, Optional, Tuple
+
+
+def normalize_title_for_cache(title):
+    """Normaliza un título para usarlo como clave en caché, ignorando diacríticos y espacios extras."""
+    if not title:
+        return None
+    title = title.lower()
+    title = ' '.join(title.split())
+    nfd = unicodedata.normalize('NFD', title) # Eliminar diacríticos (NFD)
+    title_no_accents = ''.join(c for c in nfd if unicodedata.category(c) != 'Mn')
+    return title_no_accents
+
+
+def title_lookup_key(type_, data):
+    """Clave de búsqueda de un título: tipo, título normalizado y año usado en la búsqueda
+    (las películas se buscan sin año, las series con él)."""
+    title_key = normalize_title_for_cache(data.get('title', 'N/A'))
+    year = str(data['year']) if type_ == 'episode' and data.get('year') else None
+    return type_, title_key, year
+
+
+class TmdbCache:
+    """Caché persistente (SQLite) de búsquedas en TMDb con TTL y caché negativa."""
+
+    def __init__(self, db_path, ttl_seconds: float, negative_ttl_seconds: float):
+        """Abre (o crea) la base de datos de caché."""
+        self.db_path = os.path.abspath(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS titles ("
+            " kind TEXT NOT NULL,"
+            " title_key TEXT NOT NULL,"
+            " year TEXT NOT NULL,"
+            " value TEXT,"
+            " found INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (kind, title_key, year))"
+        )
+        # Purgar entradas caducadas al arrancar
+        purged = self._conn.execute("DELETE FROM titles WHERE expires_at < ?", (time.time(),)).rowcount
+        self._conn.commit()
+        if purged:
+            logging.debug(f"🗃️ Caché TMDb: {purged} entradas caducadas eliminadas")
+
+    def get(self, kind: str, title_key: str, year: Optional[str] = None) -> Tuple[bool, Any]:
+        """Busca una entrada vigente. Devuelve (True, valor) si existe o (False, None) si no.
+
+        Un resultado negativo cacheado ("no encontrado") devuelve (True, None)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, found FROM titles WHERE kind = ? AND title_key = ? AND year = ? AND expires_at >= ?",
+                (kind, title_key or '', year or '', time.time())
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+        value, found = row
+        return True, json.loads(value) if found else None
+
+    def set(self, kind: str, title_key: str, year: Optional[str], value: Any, found: bool):
+        """Guarda el resultado de una búsqueda; si found es False se guarda como negativo con su propio TTL."""
+        ttl = self.ttl_seconds if found else self.negative_ttl_seconds
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO titles (kind, title_key, year, value, found, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, title_key or '', year or '', json.dumps(value, ensure_ascii=False) if found else None,
+                 1 if found else 0, time.time() + ttl)
+            )
+            self._conn.commit()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Obtiene los contadores de aciertos y fallos y el número de entradas."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM titles").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries
+        }
+
+    def close(self):
+        """Cierra la conexión con la base de datos."""
+        with self._lock:
+            self._conn.close()
+
+
+_tmdb_cache: Optional[TmdbCache] = None
+_tmdb_cache_lock = threading.Lock()
+
+
+def get_tmdb_cache() -> TmdbCache:
+    """Obtiene la caché TMDb global, creándola en CONFIG_DIR en el primer uso."""
+    global _tmdb_cache
+    with _tmdb_cache_lock:
+        if _tmdb_cache is None:
+            from src.config import get_config
+            config = get_config()
+            _tmdb_cache = TmdbCache(config.tmdb_cache_path, config.tmdb_cache_ttl_seconds,
+                                    config.tmdb_cache_negative_ttl_seconds)
+        return _tmdb_cache
@@ -0,0 +1,279 @@
+import os
+import re
+import gzip
+import json
+import time
+import itertools
+import sqlite3
+import logging
+import threading
+import unicodedata
+from typing import Dict, NamedTuple, Optional
+
+# Tipos del índice y prefijos de los archivos de exportación diaria de TMDb
+# (movie_ids_MM_DD_YYYY.json.gz, tv_series_ids_MM_DD_YYYY.json.gz)
+EXPORT_PREFIXES = {'movie': 'movie_ids_', 'tv': 'tv_series_ids_'}
+
+# Similitud mínima (Jaccard de trigramas) para aceptar una coincidencia aproximada
+MIN_SIMILARITY = 0.6
+
+# Candidatos aproximados (los de más trigramas raros en común) que se puntúan por consulta
+MAX_CANDIDATES = 200
+
+_BATCH_SIZE = 10000
+
+
+class ExportMatch(NamedTuple):
+    tmdb_id: int
+    title: str
+    popularity: float
+
+
+def normalize_title(title: str) -> str:
+    """Normaliza un título para el índice: minúsculas, sin diacríticos ni puntuación.
+
+    Apóstrofos y puntos se eliminan sin separar ("Marvel's" -> "marvels", "S.H.I.E.L.D." -> "shield")."""
+    if not title:
+        return ''
+    nfkd = unicodedata.normalize('NFKD', title.lower())
+    text = ''.join(c for c in nfkd if not unicodedata.combining(c))
+    text = re.sub(r"['’.]", '', text)
+    return ' '.join(re.sub(r'[\W_]+', ' ', text).split())
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def find_exports(export_dir: str) -> Dict[str, str]:
+    """Archivo de exportación más reciente de cada tipo en `export_dir` ({tipo: ruta})."""
+    latest = {}
+    try:
+        entries = list(os.scandir(export_dir))
+    except OSError as e:
+        logging.warning(f"⚠️ No se puede leer TMDB_EXPORT_DIR {export_dir}: {e}")
+        return {}
+    for entry in entries:
+        if not entry.is_file() or not entry.name.endswith(('.json.gz', '.json')):
+            continue
+        for kind, prefix in EXPORT_PREFIXES.items():
+            if entry.name.startswith(prefix):
+                mtime = entry.stat().st_mtime_ns
+                if kind not in latest or mtime > latest[kind][0]:
+                    latest[kind] = (mtime, entry.path)
+    return {kind: path for kind, (_, path) in latest.items()}
+
+
+def _source_signature(path: str):
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+def _iter_export(path: str):
+    """(id, título, popularidad) de cada línea de una exportación; ignora adultos y líneas inválidas."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('adult'):
+                continue
+            title = entry.get('original_title') or entry.get('original_name') or entry.get('title') or entry.get('name')
+            if not title or entry.get('id') is None:
+                continue
+            yield int(entry['id']), title, float(entry.get('popularity') or 0)
+
+
+def build_export_index(db_path, exports: Dict[str, str]) -> int:
+    """Construye el índice desde las exportaciones ({tipo: ruta}) en un archivo temporal y lo
+    sustituye de forma atómica: un fallo a mitad deja intacto el índice anterior.
+    Retorna el número de títulos indexados."""
+    db_path = os.path.abspath(db_path)
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(tmp_path)
+    total = 0
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute(
+            "CREATE TABLE titles ("
+            " id INTEGER PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " tmdb_id INTEGER NOT NULL,"
+            " title TEXT NOT NULL,"
+            " norm TEXT NOT NULL,"
+            " popularity REAL NOT NULL)"
+        )
+        conn.execute("CREATE TABLE sources (kind TEXT PRIMARY KEY, path TEXT, size INTEGER, mtime_ns INTEGER, entries INTEGER)")
+
+        for kind, path in sorted(exports.items()):
+            entries = 0
+            rows = ((kind, tmdb_id, title, normalize_title(title), popularity)
+                    for tmdb_id, title, popularity in _iter_export(path))
+            while True:
+                chunk = list(itertools.islice(rows, _BATCH_SIZE))
+                if not chunk:
+                    break
+                batch = [row for row in chunk if row[3]]
+                conn.executemany("INSERT INTO titles (kind, tmdb_id, title, norm, popularity) VALUES (?, ?, ?, ?, ?)", batch)
+                entries += len(batch)
+            conn.execute("INSERT INTO sources VALUES (?, ?, ?, ?, ?)", (kind, *_source_signature(path), entries))
+            total += entries
+
+        conn.execute("CREATE INDEX titles_norm ON titles (kind, norm, popularity DESC)")
+        try:
+            # Trigramas sin posiciones (detail=none) sobre el propio texto de titles: índice compacto
+            conn.execute("CREATE VIRTUAL TABLE title_grams USING fts5("
+                         "norm, content='titles', content_rowid='id', tokenize='trigram', detail='none')")
+            conn.execute("INSERT INTO title_grams (title_grams) VALUES ('rebuild')")
+        except sqlite3.OperationalError as e:
+            logging.warning(f"⚠️ SQLite sin FTS5/trigram ({e}); el índice TMDb solo admitirá coincidencias exactas")
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    logging.info(f"📚 Índice de exportaciones TMDb: {total} títulos en {time.perf_counter() - started:.1f}s")
+    return total
+
+
+class TmdbExportIndex:
+    """Índice local (SQLite) de las exportaciones diarias de IDs de TMDb.
+
+    Resuelve un título a su ID por coincidencia exacta del título normalizado y, si no la hay,
+    por similitud de trigramas; entre candidatas igual de parecidas gana la más popular."""
+
+    def __init__(self, db_path):
+        """Abre un índice ya construido con build_export_index()."""
+        self.db_path = os.path.abspath(db_path)
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._has_grams = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'title_grams'").fetchone() is not None
+        if self._has_grams:
+            # Número de títulos que contienen cada trigrama
+            self._conn.execute("CREATE VIRTUAL TABLE temp.title_gram_counts USING fts5vocab(main, title_grams, 'row')")
+
+    def sources(self) -> Dict[str, tuple]:
+        """Firma (ruta, tamaño, mtime) de la exportación indexada de cada tipo."""
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, path, size, mtime_ns FROM sources").fetchall()
+        return {kind: (path, size, mtime_ns) for kind, path, size, mtime_ns in rows}
+
+    def lookup(self, kind: str, title: str) -> Optional[ExportMatch]:
+        """Busca un título de `kind` ('movie' o 'tv'). Retorna la mejor coincidencia o None."""
+        norm = normalize_title(title)
+        if not norm:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tmdb_id, title, popularity FROM titles WHERE kind = ? AND norm = ?"
+                " ORDER BY popularity DESC LIMIT 1", (kind, norm)).fetchone()
+            if row is not None:
+                self.hits += 1
+                return ExportMatch(*row)
+
+            match = self._lookup_fuzzy(kind, norm) if self._has_grams and len(norm) >= 3 else None
+            if match is None:
+                self.misses += 1
+            else:
+                self.fuzzy_hits += 1
+            return match
+
+    def _lookup_fuzzy(self, kind: str, norm: str) -> Optional[ExportMatch]:
+        """Candidatas que comparten suficientes trigramas con el título, puntuadas por Jaccard.
+
+        Con similitud >= MIN_SIMILARITY a una candidata le faltan como mucho `missing` trigramas
+        del título (erratas, palabras de más o de menos), así que contiene alguno de cualesquiera
+        `missing + 1` de ellos: se buscan los más raros, que tienen las listas más cortas, y FTS5
+        ordena por bm25 las candidatas que comparten más."""
+        grams = _trigrams(norm)
+        ordered = sorted(grams)
+        counts = dict(self._conn.execute(
+            f"SELECT term, doc FROM title_gram_counts WHERE term IN ({', '.join('?' * len(ordered))})",
+            ordered).fetchall())
+        missing = len(grams) - int(MIN_SIMILARITY * len(grams))
+        rarest = sorted(ordered, key=lambda gram: counts.get(gram, 0))[:missing + 1]
+        query = ' OR '.join(f'"{gram}"' for gram in rarest)
+        rows = self._conn.execute(
+            "SELECT t.tmdb_id, t.title, t.norm, t.popularity FROM title_grams g JOIN titles t ON t.id = g.rowid"
+            " WHERE title_grams MATCH ? AND t.kind = ? ORDER BY g.rank LIMIT ?",
+            (query, kind, MAX_CANDIDATES)).fetchall()
+
+        best, best_key = None, None
+        for tmdb_id, title, candidate_norm, popularity in rows:
+            candidate_grams = _trigrams(candidate_norm)
+            similarity = len(grams & candidate_grams) / len(grams | candidate_grams)
+            if similarity >= MIN_SIMILARITY and (best_key is None or (similarity, popularity) > best_key):
+                best, best_key = ExportMatch(tmdb_id, title, popularity), (similarity, popularity)
+        return best
+
+    def get_stats(self) -> Dict[str, int]:
+        """Obtiene los contadores de aciertos (exactos y aproximados) y fallos."""
+        return {
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        """Cierra la conexión con la base de datos."""
+        with self._lock:
+            self._conn.close()
+
+
+_export_index: Optional[TmdbExportIndex] = None
+_export_index_loaded = False
+_export_index_lock = threading.Lock()
+
+
+def _open_export_index(config) -> Optional[TmdbExportIndex]:
+    exports = find_exports(config.tmdb_export_dir)
+    db_path = config.tmdb_export_index_path
+    if not exports:
+        if os.path.exists(db_path):
+            logging.info(f"📚 Sin exportaciones nuevas en {config.tmdb_export_dir}; se usa el índice existente")
+            return TmdbExportIndex(db_path)
+        logging.warning(f"⚠️ No hay exportaciones de TMDb en {config.tmdb_export_dir}")
+        return None
+
+    if os.path.exists(db_path):
+        index = TmdbExportIndex(db_path)
+        try:
+            current = index.sources()
+        except sqlite3.DatabaseError:
+            current = None
+        wanted = {kind: _source_signature(path) for kind, path in exports.items()}
+        if current == wanted:
+            return index
+        index.close()
+
+    logging.info(f"📚 Construyendo índice TMDb desde {', '.join(sorted(exports.values()))}...")
+    build_export_index(db_path, exports)
+    return TmdbExportIndex(db_path)
+
+
+def get_export_index() -> Optional[TmdbExportIndex]:
+    """Obtiene el índice de exportaciones global, (re)construyéndolo en el primer uso si hay
+    exportaciones nuevas en TMDB_EXPORT_DIR. Retorna None si no está configurado."""
+    global _export_index, _export_index_loaded
+    with _export_index_lock:
+        if not _export_index_loaded:
+            from src.config import get_config
+            config = get_config()
+            if config.tmdb_export_dir:
+                try:
+                    _export_index = _open_export_index(config)
+                except (OSError, sqlite3.Error) as e:
+                    logging.error(f"❌ Error al preparar el índice de exportaciones TMDb: {e}")
+            _export_index_loaded = True
+        return _export_index
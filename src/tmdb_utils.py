@@ -1,28 +1,144 @@
+import time
 import logging
-from src.config import TMDB_API_KEY
-import tmdbsimple as tmdb
+import threading
+from src import metrics
+from src.tracing import span, traced
+from src.config import get_config
 
-if TMDB_API_KEY:
-    tmdb.API_KEY = TMDB_API_KEY
+# Códigos HTTP que se reintentan con backoff (límite de peticiones y errores transitorios)
+_RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
 
-def get_official_movie_title(info):
+_REQUEST_SECONDS = metrics.histogram('media_sorter_tmdb_request_seconds', "Latencia de cada petición HTTP a TMDb")
+_REQUESTS = metrics.counter('media_sorter_tmdb_requests_total', "Peticiones HTTP a TMDb por código de respuesta")
+_RETRIES = metrics.counter('media_sorter_tmdb_retries_total', "Reintentos de peticiones a TMDb")
+
+
+class TokenBucket:
+    """Limitador token-bucket: `rate` peticiones por segundo con ráfagas de hasta `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloquea hasta que haya un token disponible y lo consume."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_rate_limiter = None
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    """Obtiene la sesión HTTP compartida con pool de conexiones keep-alive y su limitador.
+
+    requests se importa aquí: los arranques que no llegan a consultar TMDb no lo cargan."""
+    global _session, _rate_limiter
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            config = get_config()
+            _rate_limiter = TokenBucket(config.tmdb_rate_limit, max(1.0, config.tmdb_rate_limit / 2))
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, config.tmdb_workers))
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+            _session.headers.update({'Accept': 'application/json'})
+        return _session, _rate_limiter
+
+
+def _retry_delay(response, attempt):
+    """Calcula la espera antes de reintentar: Retry-After si TMDb lo envía o backoff exponencial."""
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    return min(30.0, 0.5 * (2 ** attempt))
+
+
+def _is_transient(error) -> bool:
+    """Indica si un error de TMDb es transitorio (red, 429 o 5xx): lo que se obtenga sin esa
+    respuesta no debe cachearse como definitivo."""
+    import requests
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(error, 'response', None)
+    return response is not None and response.status_code in _RETRY_STATUS
+
+
+def _tmdb_get(path, **params):
+    """GET a la API de TMDb respetando el limitador y reintentando ante 429 y errores transitorios."""
+    import requests
+    session, rate_limiter = _get_session()
+    config = get_config()
+    url = f"{config.tmdb_api_url}/{path}"
+    params['api_key'] = config.tmdb_api_key
+    # Etiqueta de baja cardinalidad: 'search/movie', 'movie', 'tv'...
+    endpoint = path if path.startswith('search/') else path.split('/')[0]
+
+    for attempt in range(config.tmdb_max_retries + 1):
+        rate_limiter.acquire()
+        if attempt:
+            _RETRIES.inc(endpoint=endpoint)
+        started = time.perf_counter()
+        try:
+            with span('tmdb_http', endpoint=endpoint, attempt=attempt):
+                response = session.get(url, params=params, timeout=config.tmdb_timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            _REQUESTS.inc(endpoint=endpoint, status='error')
+            if attempt >= config.tmdb_max_retries:
+                raise
+            time.sleep(_retry_delay(None, attempt))
+            continue
+        _REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        _REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+
+        if response.status_code in _RETRY_STATUS and attempt < config.tmdb_max_retries:
+            delay = _retry_delay(response, attempt)
+            logging.debug(f"⏳ TMDb respondió {response.status_code} para '{path}', reintento en {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        response.raise_for_status()
+        return response.json()
+
+
+@traced()
+def get_official_movie_title(info, raise_errors=False):
     """
     Consulta TMDb para películas. Busca solo por título (sin año) para obtener mejores resultados.
     Primero busca en inglés (en-US) para obtener el nombre oficial,
     luego busca en español (es-ES) para obtener el título localizado si está disponible.
+    Con raise_errors=True los errores de red se propagan en lugar de devolver (None, None),
+    para distinguir un fallo de un título no encontrado; también los transitorios de la petición
+    en español, para no cachear el título en inglés como definitivo.
     """
     title_search = info.get('title')
-    if not TMDB_API_KEY or not title_search:
+    if not get_config().tmdb_api_key or not title_search:
         return None, None
 
     # Buscar solo con el título, sin incluir el año
     query_text = title_search
 
     try:
-        search = tmdb.Search()
-        
         # Primero buscar en inglés para obtener el ID y el nombre oficial
-        results_en = search.movie(query=query_text, language='en-US')
+        results_en = _tmdb_get('search/movie', query=query_text, language='en-US')
 
         if not results_en or not results_en.get('results'):
             logging.warning(f"⚠️ TMDb: No se encontró película. Buscado: '{query_text}'.")
@@ -36,29 +152,36 @@ def get_official_movie_title(info):
         # Si tenemos el ID, intentar obtener el nombre en español
         if movie_id:
             try:
-                movie = tmdb.Movies(movie_id)
-                movie_details_es = movie.info(language='es-ES')
+                movie_details_es = _tmdb_get(f'movie/{movie_id}', language='es-ES')
                 title_es = movie_details_es.get('title')
                 if title_es and title_es != official_title_en:
                     # Devolver el título en español si es diferente
                     return title_es, year if year else None
             except Exception as e:
+                # Un fallo transitorio no debe fijar el título en inglés en la caché
+                if raise_errors and _is_transient(e):
+                    raise
                 logging.debug(f"⚠️ No se pudo obtener detalles en español para película ID {movie_id}: {e}")
         
         # Si no hay título en español o no se pudo obtener, usar el de inglés
         return official_title_en, year if year else None
 
     except Exception as e:
+        if raise_errors:
+            raise
         logging.error(f"❌ Error TMDb para '{query_text}': {e}")
         return None, None
 
-def get_official_series_title(info):
+@traced()
+def get_official_series_title(info, raise_errors=False):
     """
     Consulta TMDb para series. Primero busca en inglés (en-US) para obtener el nombre oficial,
     luego busca en español (es-ES) para obtener el título localizado si está disponible.
+    Con raise_errors=True los errores de red se propagan en lugar de devolver None; también los
+    transitorios de la petición en español, para no cachear el título en inglés como definitivo.
     """
     title_search = info.get('title')
-    if not TMDB_API_KEY or not title_search:
+    if not get_config().tmdb_api_key or not title_search:
         return None
 
     query_text = title_search
@@ -66,10 +189,8 @@ def get_official_series_title(info):
         query_text += f" {info['year']}"
 
     try:
-        search = tmdb.Search()
-        
         # Primero buscar en inglés para obtener el ID y el nombre oficial
-        results_en = search.tv(query=query_text, language='en-US')
+        results_en = _tmdb_get('search/tv', query=query_text, language='en-US')
         
         if not results_en or not results_en.get('results'):
             logging.warning(f"⚠️ TMDb: No se encontró serie. Buscado: '{query_text}'.")
@@ -82,18 +203,35 @@ def get_official_series_title(info):
         # Si tenemos el ID, intentar obtener el nombre en español
         if series_id:
             try:
-                tv_series = tmdb.TV(series_id)
-                tv_details_es = tv_series.info(language='es-ES')
+                tv_details_es = _tmdb_get(f'tv/{series_id}', language='es-ES')
                 title_es = tv_details_es.get('name')
                 if title_es and title_es != official_title_en:
                     # Devolver el título en español si es diferente
                     return title_es
             except Exception as e:
+                # Un fallo transitorio no debe fijar el título en inglés en la caché
+                if raise_errors and _is_transient(e):
+                    raise
                 logging.debug(f"⚠️ No se pudo obtener detalles en español para serie ID {series_id}: {e}")
         
         # Si no hay título en español o no se pudo obtener, usar el de inglés
         return official_title_en
 
     except Exception as e:
+        if raise_errors:
+            raise
         logging.error(f"❌ Error TMDb para '{query_text}': {e}")
         return None
+
+
+@traced()
+def get_localized_title(kind, tmdb_id):
+    """
+    Consulta los detalles en español (es-ES) de una película ('movie') o serie ('tv') por su ID,
+    sin búsqueda previa. Retorna (título, año), con None en lo que falte.
+    Los errores de red se propagan.
+    """
+    details = _tmdb_get(f'{kind}/{tmdb_id}', language='es-ES')
+    title = details.get('title' if kind == 'movie' else 'name')
+    date = details.get('release_date' if kind == 'movie' else 'first_air_date') or ''
+    return title or None, date[:4] or None
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import logging
+import cProfile
+import functools
+import itertools
+import threading
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import List, Optional
+
+# Tope de spans en memoria por traza (unos 200 bytes cada uno)
+MAX_EVENTS = 500000
+
+_settings = None
+_profile_lock = threading.Lock()
+_pid = os.getpid()
+_origin = time.perf_counter()
+_sequence = itertools.count(1)  # Número de cada traza, para no pisar archivos del mismo segundo
+
+
+class Trace:
+    """Búfer de spans de un arranque o de un lote. Cada lote del vigilante tiene el suyo, así
+    que los hilos que procesan lotes a la vez no mezclan sus spans al exportar."""
+
+    def __init__(self):
+        self.events: List[dict] = []
+        self.dropped = 0
+        self.number = next(_sequence)
+        self._lock = threading.Lock()
+
+    def add(self, event: dict):
+        with self._lock:
+            if len(self.events) < MAX_EVENTS:
+                self.events.append(event)
+            else:
+                self.dropped += 1
+
+
+# Traza del bloque en curso (None fuera de `collect`: los spans no se registran)
+_current: ContextVar[Optional[Trace]] = ContextVar('trace', default=None)
+
+
+def _get_settings():
+    """Lee la configuración en el primer uso para no exigir el entorno al importar."""
+    global _settings
+    if _settings is None:
+        from src.config import get_config
+        config = get_config()
+        _settings = (config.tracing, config.trace_dir, config.profile_batches, config.profile_dir)
+    return _settings
+
+
+def enabled() -> bool:
+    return _get_settings()[0]
+
+
+def _record(name: str, started: float, finished: float, args: dict):
+    trace = _current.get()
+    if trace is None:
+        return
+    event = {
+        "name": name, "cat": "media-sorter", "ph": "X", "pid": _pid, "tid": threading.get_ident(),
+        "ts": round((started - _origin) * 1e6, 1), "dur": round((finished - started) * 1e6, 1),
+    }
+    if args:
+        event["args"] = {k: v if isinstance(v, (int, float, bool)) else str(v) for k, v in args.items()}
+    trace.add(event)
+
+
+@contextmanager
+def _span(name: str, args: dict):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, started, time.perf_counter(), args)
+
+
+def span(name: str, **args):
+    """Span anidable alrededor de un bloque. Sin TRACING=1 no registra nada."""
+    if not enabled():
+        return nullcontext()
+    return _span(name, args)
+
+
+def traced(name: Optional[str] = None):
+    """Decorador que registra un span por llamada."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            with _span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def collect():
+    """Registra en una traza propia los spans del bloque y de las tareas lanzadas en otros
+    hilos con `propagate`. Sin TRACING=1 no registra nada."""
+    if not enabled():
+        yield None
+        return
+    trace = Trace()
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def propagate(func):
+    """Envuelve `func` para que los spans que registre en un hilo de un pool vayan a la traza
+    del bloque que la lanza (los hilos no heredan el contexto)."""
+    trace = _current.get()
+    if trace is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current.set(trace)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return wrapper
+
+
+def export_trace(label: str, trace: Optional[Trace]) -> Optional[str]:
+    """Escribe los spans de `trace` como JSON de Chrome trace (chrome://tracing, Perfetto)
+    en TRACE_DIR. Retorna la ruta o None si no había nada que exportar."""
+    _, trace_dir, _, _ = _get_settings()
+    if trace is None:
+        return None
+    with trace._lock:
+        events, dropped = list(trace.events), trace.dropped
+    if not events:
+        return None
+
+    os.makedirs(trace_dir, exist_ok=True)
+    path = os.path.join(trace_dir, f"trace-{label}-{time.strftime('%Y%m%d-%H%M%S')}-{_pid}-{trace.number}.json")
+    tids = {event["tid"] for event in events}
+    metadata = [{"name": "thread_name", "ph": "M", "pid": _pid, "tid": thread.ident, "args": {"name": thread.name}}
+                for thread in threading.enumerate() if thread.ident in tids]
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+    except OSError as e:
+        logging.error(f"❌ Error al exportar la traza a {path}: {e}")
+        return None
+    if dropped:
+        logging.warning(f"⚠️ Traza '{label}' incompleta: {dropped} span(s) descartados (máx. {MAX_EVENTS})")
+    logging.info(f"🧵 Traza exportada: {path} ({len(events)} spans)")
+    return path
+
+
+@contextmanager
+def profiled(label: str):
+    """Con PROFILE_BATCHES=1 perfila el bloque con cProfile y guarda un .pstats en PROFILE_DIR.
+
+    cProfile solo mide el hilo que ejecuta el bloque: las peticiones a TMDb en el pool de
+    hilos y guessit en el pool de procesos aparecen como espera del hilo principal."""
+    _, _, profile_batches, profile_dir = _get_settings()
+    if not profile_batches:
+        yield
+        return
+
+    # Solo puede haber un perfilador activo por proceso (en 3.12 el segundo lanza ValueError):
+    # un lote que coincide con otro perfilado se ejecuta sin perfilar
+    if not _profile_lock.acquire(blocking=False):
+        logging.debug(f"🔬 Perfil '{label}' omitido: ya hay otro bloque perfilándose")
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        _profile_lock.release()
+        logging.debug(f"🔬 Perfil '{label}' omitido: {e}")
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _profile_lock.release()
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"profile-{label}-{time.strftime('%Y%m%d-%H%M%S')}-{threading.get_ident()}.pstats")
+        try:
+            profiler.dump_stats(path)
+            logging.info(f"🔬 Perfil guardado: {path}")
+        except OSError as e:
+            logging.error(f"❌ Error al guardar el perfil en {path}: {e}")
@@ -1,43 +1,39 @@
 import os
+import re
 import time
+import queue
 import logging
-from watchdog.observers import Observer
-from watchdog.observers.polling import PollingObserver
-from watchdog.events import FileSystemEventHandler, FileSystemEvent
-from src.config import WATCH_DIR, VIDEO_EXTENSIONS
-from src.scanner import scan_and_classify
+import threading
+from typing import Optional
+from watchdog.events import FileSystemEventHandler, FileSystemEvent, DirDeletedEvent, FileDeletedEvent
+from src.config import VIDEO_EXTENSIONS, get_config
+from src.completion import CompletionTracker
+from src.fs_walk import iter_video_files
+from src.polling import SnapshotObserver
+from src.scanner import iter_classified
+from src.tmdb_cache import normalize_title_for_cache
 from src.organizer import organize_items
 from src.link_manager import LinkManager
+from src import metrics
+from src.tracing import collect, export_trace, profiled, span
+
+_EVENTS = metrics.counter('media_sorter_watcher_events_total', "Eventos del sistema de archivos recibidos por tipo")
+_INGEST_SECONDS = metrics.histogram('media_sorter_ingest_seconds',
+                                    "Latencia desde el primer evento de un archivo hasta su enlace")
+_BATCH_SECONDS = metrics.histogram('media_sorter_watcher_batch_seconds', "Duración del procesamiento de cada lote")
 
 
 def _process_new_files(files: list):
     """Procesa archivos nuevos: los clasifica y organiza."""
     try:
-        # Ejecutar scan_and_classify
+        # Clasificar solo las rutas del lote (no se recorre todo WATCH_DIR) y organizar en streaming
         logging.info("🔍 Escaneando y clasificando...")
-        classified_items = scan_and_classify()
-
-        # Filtrar solo los items que corresponden a los archivos nuevos
-        files_normalized = [os.path.normpath(f) for f in files]
-        new_classified = []
-
-        for item_path, type_, canonical_name, data in classified_items:
-            item_normalized = os.path.normpath(item_path)
-
-            # Verificar si el item es uno de los archivos nuevos o está dentro de un directorio nuevo
-            is_new = False
-            for new_file in files_normalized:
-                if item_normalized == new_file or item_normalized.startswith(new_file + os.sep):
-                    is_new = True
-                    break
-
-            if is_new:
-                new_classified.append((item_path, type_, canonical_name, data))
+        with profiled('batch'), collect() as trace, span('watcher_batch', files=len(files)):
+            organized = organize_items(iter_classified(files))
+        export_trace('batch', trace)
 
-        if new_classified:
-            logging.info(f"📦 Organizando {len(new_classified)} item(s)...")
-            organize_items(new_classified)
-            logging.info("✅ Procesamiento completado")
+        if organized.items:
+            logging.info(f"✅ Procesamiento completado: {organized.summary()}")
         else:
             logging.info("ℹ️ No se encontraron items clasificables en los archivos nuevos")
 
@@ -45,15 +41,116 @@ def _process_new_files(files: list):
         logging.error(f"❌ Error al procesar archivos nuevos: {e}", exc_info=True)
 
 
+# Primera marca de temporada/episodio o año en un nombre: lo anterior es el título
+_TITLE_END = re.compile(r'[ ._\-\[(]+(?:S\d{1,2}(?:E\d+)?|\d{1,2}x\d{2}|(?:19|20)\d{2})(?![0-9])', re.IGNORECASE)
+
+
+def _batch_key(path: str) -> str:
+    """Clave de agrupación: título aproximado de la entrada de primer nivel de WATCH_DIR.
+
+    Los episodios sueltos de una misma serie y la carpeta de la temporada comparten clave,
+    así que van en un mismo lote y se resuelven en TMDb una sola vez. Solo opera sobre la ruta
+    (sin stat): los pendientes son siempre archivos, así que la entrada de primer nivel es una
+    carpeta si y solo si la ruta tiene más componentes."""
+    parts = os.path.relpath(path, get_config().watch_dir).split(os.sep)
+    top = parts[0]
+    stem = top if len(parts) > 1 else os.path.splitext(top)[0]
+    match = _TITLE_END.search(stem)
+    if match and match.start() > 0:
+        stem = stem[:match.start()]
+    return normalize_title_for_cache(re.sub(r'[._]+', ' ', stem).strip()) or top
+
+
 class MediaWatcher(FileSystemEventHandler):
-    """Vigilante de cambios en el directorio WATCH."""
+    """Vigilante de cambios en el directorio WATCH.
+
+    Los eventos del observador solo actualizan estado protegido por un lock. Los lotes listos
+    se procesan en un pool de hilos (WATCHER_WORKERS) y los borrados y renombrados en un hilo
+    propio, de modo que una importación grande no retrasa la limpieza de links.
 
-    def __init__(self, link_manager: LinkManager, debounce_seconds: float = 2.0):
+    Los parámetros omitidos toman el valor de la configuración (WATCHER_*)."""
+
+    def __init__(self, link_manager: LinkManager, workers: Optional[int] = None,
+                 stable_seconds: Optional[float] = None,
+                 max_stable_seconds: Optional[float] = None,
+                 coalesce_seconds: Optional[float] = None):
         super().__init__()
+        config = get_config()
         self.link_manager = link_manager
-        self.debounce_seconds = debounce_seconds
-        self.pending_files = {}  # {path: timestamp}
-        self.processing = False
+        self.workers = workers if workers is not None else config.watcher_workers
+        self.coalesce_seconds = coalesce_seconds if coalesce_seconds is not None else config.watcher_coalesce_seconds
+        self.pending_files = CompletionTracker(
+            stable_seconds if stable_seconds is not None else config.watcher_stable_min_seconds,
+            max_stable_seconds if max_stable_seconds is not None else config.watcher_stable_max_seconds)
+        self._lock = threading.Lock()
+        self._held = {}  # {clave: [instante del primero listo, [(ruta, primer evento)]]} esperando al resto del grupo
+        self._in_flight = set()  # Claves con un lote en proceso
+        self._batches = queue.Queue()  # Lotes listos para clasificar y organizar
+        self._fs_events = queue.Queue()  # Borrados y renombrados, en orden de llegada
+        self._threads = []
+        self._wakeup = threading.Event()  # Un archivo se completó: despachar sin esperar al tick
+
+    def start(self):
+        """Arranca los hilos de procesamiento y el de borrados/renombrados."""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._process_worker, name=f'watcher-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._fs_events_worker, name='watcher-fs', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        """Detiene los hilos tras terminar el trabajo ya encolado."""
+        for _ in range(self.workers):
+            self._batches.put(None)
+        self._fs_events.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def queue_depth(self) -> int:
+        """Archivos pendientes de completarse o retenidos más lotes esperando un hilo libre."""
+        with self._lock:
+            held = sum(len(paths) for _, paths in self._held.values())
+        return len(self.pending_files) + held + self._batches.qsize()
+
+    def _process_worker(self):
+        """Hilo de procesamiento: clasifica y organiza lotes de la cola."""
+        while True:
+            batch = self._batches.get()
+            if batch is None:
+                return
+            key, files = batch
+            try:
+                with _BATCH_SECONDS.time():
+                    _process_new_files([path for path, _ in files])
+                done = time.monotonic()
+                for _, since in files:
+                    _INGEST_SECONDS.observe(done - since)
+            finally:
+                with self._lock:
+                    self._in_flight.discard(key)
+
+    def _fs_events_worker(self):
+        """Hilo de borrados y renombrados: aplica los cambios sobre los links en orden."""
+        while True:
+            item = self._fs_events.get()
+            if item is None:
+                return
+            handler, args = item
+            try:
+                handler(*args)
+            except Exception as e:
+                logging.error(f"❌ Error al procesar evento de {args[0]}: {e}", exc_info=True)
+
+    def _track_directory(self, dir_path: str, complete: bool = False):
+        """Sigue cada video de un directorio nuevo hasta que esté completo."""
+        for path, _ in iter_video_files(dir_path):
+            if complete:
+                self.pending_files.mark_complete(path)
+            else:
+                self.pending_files.track(path)
 
     def _is_video_file(self, path: str) -> bool:
         """Verifica si el archivo es un video."""
@@ -75,28 +172,79 @@ class MediaWatcher(FileSystemEventHandler):
 
     def on_created(self, event: FileSystemEvent):
         """Maneja la creación de archivos o directorios."""
+        _EVENTS.inc(type='created')
         if event.is_directory:
             logging.info(f"📁 Nuevo directorio detectado: {event.src_path}")
-        else:
-            if self._should_process(event.src_path):
-                logging.info(f"📄 Nuevo archivo detectado: {event.src_path}")
-
-        # Agregar a la cola con debounce
-        self.pending_files[event.src_path] = time.time()
+            # Listar el directorio fuera del hilo del observador
+            self._fs_events.put((self._track_directory, (event.src_path,)))
+        elif self._should_process(event.src_path):
+            logging.info(f"📄 Nuevo archivo detectado: {event.src_path}")
+            self.pending_files.track(event.src_path)
 
     def on_modified(self, event: FileSystemEvent):
-        """Maneja la modificación de archivos (como cuando termina de copiarse)."""
+        """Maneja la modificación de archivos: la copia sigue en curso."""
+        _EVENTS.inc(type='modified')
         if not event.is_directory and self._should_process(event.src_path):
-            # Actualizar timestamp para extender el debounce
-            self.pending_files[event.src_path] = time.time()
+            self.pending_files.track(event.src_path)
+
+    def on_closed(self, event: FileSystemEvent):
+        """Cierre tras escritura (inotify CLOSE_WRITE): el archivo está completo."""
+        _EVENTS.inc(type='closed')
+        if not event.is_directory and self._should_process(event.src_path):
+            self.pending_files.mark_complete(event.src_path)
+            self._wakeup.set()
+
+    def on_moved(self, event: FileSystemEvent):
+        """Maneja renombrados: dentro de WATCH_DIR solo se actualiza el mapa de links."""
+        _EVENTS.inc(type='moved')
+        src_path = os.path.abspath(event.src_path)
+        dest_path = os.path.abspath(event.dest_path)
+        watch_dir = os.path.abspath(get_config().watch_dir)
+
+        if not dest_path.startswith(watch_dir + os.sep):
+            # Movido fuera de WATCH_DIR: equivale a un borrado
+            deleted_event = DirDeletedEvent(src_path) if event.is_directory else FileDeletedEvent(src_path)
+            self.on_deleted(deleted_event)
+            return
+
+        self.pending_files.discard(src_path)
+        self._fs_events.put((self._handle_moved, (src_path, dest_path, event.is_directory)))
+
+    def _handle_moved(self, src_path: str, dest_path: str, is_directory: bool):
+        """Actualiza el mapa de links tras un renombrado dentro de WATCH_DIR."""
+        with self.link_manager.batch():
+            if is_directory:
+                moved = self.link_manager.remove_subtree(src_path)
+            else:
+                links = self.link_manager.remove_source(src_path)
+                moved = {src_path: links} if links else {}
+            for source_path, links in moved.items():
+                new_source = dest_path + source_path[len(src_path):]
+                for link_path in links:
+                    self.link_manager.add_link(new_source, link_path)
+
+        if moved:
+            logging.info(f"📝 Renombrado: {src_path} -> {dest_path} ({len(moved)} fuente(s) actualizadas)")
+
+        # Lo que aún no estaba enlazado (p. ej. un .part renombrado al terminar) se procesa como nuevo;
+        # en carpetas, los archivos ya enlazados se detectan por inodo sin volver a enlazarse
+        # Un renombrado es atómico: lo movido ya está completo
+        if is_directory:
+            self._track_directory(dest_path, complete=True)
+        elif not (moved or self.link_manager.get_links(dest_path)) and self._is_video_file(dest_path):
+            self.pending_files.mark_complete(dest_path)
 
     def on_deleted(self, event: FileSystemEvent):
         """Maneja la eliminación de archivos o directorios."""
+        _EVENTS.inc(type='deleted')
         path = os.path.normpath(event.src_path)
 
         # Eliminar de pendientes si estaba esperando
-        self.pending_files.pop(path, None)
+        self.pending_files.discard(path)
+        self._fs_events.put((self._handle_deleted, (path, event.is_directory)))
 
+    def _handle_deleted(self, path: str, is_directory: bool):
+        """Elimina los hard links asociados a un archivo o directorio borrado."""
         # Buscar y eliminar hard links asociados
         links = self.link_manager.get_links(path)
 
@@ -119,23 +267,17 @@ class MediaWatcher(FileSystemEventHandler):
             logging.info(f"✅ Hard links eliminados para: {path}")
 
         # Si es un directorio, buscar archivos dentro que puedan tener links
-        if event.is_directory:
+        if is_directory:
             self._cleanup_directory_links(path)
 
     def _cleanup_directory_links(self, dir_path: str):
         """Limpia los links de todos los archivos que estaban dentro de un directorio eliminado."""
-        dir_path_normalized = os.path.normpath(dir_path)
-        sources_to_remove = []
-
-        # Buscar todas las fuentes que empiezan con la ruta del directorio
-        for source_path in self.link_manager.get_all_sources():
-            if source_path.startswith(dir_path_normalized + os.sep):
-                sources_to_remove.append(source_path)
-
-        if sources_to_remove:
-            logging.info(f"🗂️ Limpiando {len(sources_to_remove)} archivo(s) del directorio eliminado...")
-            for source_path in sources_to_remove:
-                links = self.link_manager.remove_source(source_path)
+        # Quitar del mapa todas las fuentes del subárbol de una vez
+        removed = self.link_manager.remove_subtree(dir_path)
+
+        if removed:
+            logging.info(f"🗂️ Limpiando {len(removed)} archivo(s) del directorio eliminado...")
+            for links in removed.values():
                 for link_path in links:
                     try:
                         if os.path.exists(link_path):
@@ -144,52 +286,70 @@ class MediaWatcher(FileSystemEventHandler):
                     except Exception as e:
                         logging.error(f"  ❌ Error al eliminar {link_path}: {e}")
 
-    def process_pending_files(self):
-        """Procesa archivos pendientes que hayan superado el tiempo de debounce."""
-        if self.processing or not self.pending_files:
-            return
-
-        current_time = time.time()
-        ready_files = []
-
-        # Buscar archivos que estén listos (han pasado debounce_seconds sin modificaciones)
-        for path, timestamp in list(self.pending_files.items()):
-            if current_time - timestamp >= self.debounce_seconds:
-                ready_files.append(path)
-                del self.pending_files[path]
+    def wait(self, timeout: float):
+        """Espera hasta el siguiente tick o hasta que un archivo se cierre tras escribirse."""
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
 
-        if ready_files:
-            # Verificar que los archivos aún existan
-            existing_files = [f for f in ready_files if os.path.exists(f)]
-
-            if existing_files:
-                logging.info(f"🔄 Procesando {len(existing_files)} archivo(s) nuevo(s)...")
-                self.processing = True
-                try:
-                    _process_new_files(existing_files)
-                finally:
-                    self.processing = False
+    def process_pending_files(self):
+        """Encola los archivos pendientes que ya estén completos, agrupados por título.
+
+        Un grupo (p. ej. una temporada completa) se retiene mientras alguno de sus archivos siga
+        copiándose, hasta `coalesce_seconds`, para procesarlo en un solo lote. No se despacha un
+        grupo mientras otro lote suyo siga en proceso, para no enlazar dos veces el mismo archivo."""
+        now = time.monotonic()
+        groups = {}
+
+        with self._lock:
+            for path, since in self.pending_files.pop_ready():
+                self._held.setdefault(_batch_key(path), [now, []])[1].append((path, since))
+            if not self._held:
+                return
+
+            waiting = {_batch_key(path) for path in self.pending_files.paths()}
+            for key, (since, paths) in list(self._held.items()):
+                if key in self._in_flight:
+                    continue
+                if key in waiting and now - since < self.coalesce_seconds:
+                    continue
+                groups[key] = paths
+                del self._held[key]
+            self._in_flight.update(groups)
+
+        for key, ready_files in groups.items():
+            logging.info(f"🔄 Encolando {len(ready_files)} archivo(s) nuevo(s) de '{key}'...")
+            self._batches.put((key, ready_files))
 
 
 def start_watching(link_manager: LinkManager):
     """Inicia la vigilancia del directorio WATCH."""
+    config = get_config()
     # Decidir si usar polling observer: fuerza con WATCHER_POLLING=1
-    use_polling = os.environ.get('WATCHER_POLLING') == '1'
+    use_polling = config.watcher_polling
 
     if use_polling:
-        logging.info("ℹ️ WATCHER_POLLING activado por variable de entorno; usando PollingObserver")
-
-    observer = PollingObserver() if use_polling else Observer()
+        logging.info(f"ℹ️ WATCHER_POLLING activado por variable de entorno; sondeo cada {config.watcher_poll_interval:g}s "
+                     f"(máx. {config.watcher_poll_max_stats:g} stats/s)")
+        observer = SnapshotObserver(config.poll_snapshot_path, config.watcher_poll_interval,
+                                    config.watcher_poll_max_stats)
+    else:
+        from watchdog.observers import Observer
+        observer = Observer()
 
     event_handler = MediaWatcher(link_manager)
-    observer.schedule(event_handler, WATCH_DIR, recursive=True)
+    metrics.gauge('media_sorter_watcher_queue_depth',
+                  "Archivos pendientes de completarse o retenidos más lotes en cola").set_function(event_handler.queue_depth)
+    metrics.gauge('media_sorter_watcher_batches_in_flight',
+                  "Lotes que se están procesando").set_function(lambda: len(event_handler._in_flight))
+    event_handler.start()
+    observer.schedule(event_handler, config.watch_dir, recursive=True)
     observer.start()
 
-    logging.info(f"👀 Vigilando directorio: {WATCH_DIR} (polling={use_polling})")
+    logging.info(f"👀 Vigilando directorio: {config.watch_dir} (polling={use_polling})")
 
     try:
         while True:
-            time.sleep(1)
+            event_handler.wait(1)
             event_handler.process_pending_files()
 
     except KeyboardInterrupt:
@@ -197,4 +357,5 @@ def start_watching(link_manager: LinkManager):
         observer.stop()
 
     observer.join()
+    event_handler.stop()
     logging.info("✅ Vigilancia detenida")
@@ -0,0 +1,60 @@
+import pytest
+import src.library_index as library_index
+import src.organizer as organizer
+import src.parse_cache as parse_cache
+import src.tmdb_cache as tmdb_cache
+import src.tmdb_export as tmdb_export
+import src.tmdb_utils as tmdb_utils
+import src.tracing as tracing
+from bench.tmdb_stub import TmdbStub
+from src.link_manager import LinkManager
+from src.sqlite_link_manager import SqliteLinkManager
+from src.config import load_config, set_config
+
+
+@pytest.fixture
+def config_env():
+    """Variables de entorno adicionales para `config` (cada módulo puede redefinirlo)."""
+    return {}
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch, config_env):
+    """Configuración global con WATCH_DIR, SERIES_DIR, MOVIES_DIR y CONFIG_DIR temporales,
+    sin cachés ni índices globales de otras pruebas."""
+    env = {'TMDB_API_KEY': 'test', **config_env}
+    for name in ('WATCH_DIR', 'SERIES_DIR', 'MOVIES_DIR', 'CONFIG_DIR'):
+        path = tmp_path / name.split('_')[0].lower()
+        path.mkdir()
+        env[name] = str(path)
+    monkeypatch.setattr(library_index, '_library_index', None)
+    monkeypatch.setattr(library_index, '_library_index_loaded', False)
+    monkeypatch.setattr(organizer, '_link_manager', None)
+    monkeypatch.setattr(organizer, '_inode_index', None)
+    monkeypatch.setattr(organizer, '_created_dirs', set())
+    monkeypatch.setattr(parse_cache, '_parse_cache', None)
+    monkeypatch.setattr(tmdb_cache, '_tmdb_cache', None)
+    monkeypatch.setattr(tmdb_export, '_export_index', None)
+    monkeypatch.setattr(tmdb_export, '_export_index_loaded', False)
+    # Sesión HTTP y limitador se crean con la configuración del primer uso
+    monkeypatch.setattr(tmdb_utils, '_session', None)
+    monkeypatch.setattr(tmdb_utils, '_rate_limiter', None)
+    monkeypatch.setattr(tracing, '_settings', None)
+    config = load_config(env)
+    set_config(config)
+    yield config
+    set_config(None)
+
+
+@pytest.fixture
+def tmdb_stub():
+    """Stub local de TMDb sin latencia (bench/tmdb_stub.py)."""
+    stub = TmdbStub(latency=0).start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def link_manager_class(request, config):
+    """Clase de cada backend del mapa de hard links (LINKS_BACKEND)."""
+    return LinkManager if request.param == 'json' else SqliteLinkManager
@@ -0,0 +1,77 @@
+import os
+import pytest
+import src.completion as completion
+from src.completion import CompletionTracker
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(completion.time, 'monotonic', clock)
+    return clock
+
+
+def _write(path, data):
+    with open(path, 'a') as f:
+        f.write(data)
+
+
+def test_closed_file_is_ready_immediately(tmp_path, clock):
+    tracker = CompletionTracker(1, 30)
+    path = str(tmp_path / 'a.mkv')
+    tracker.track(path)
+    clock.now += 0.5
+    tracker.mark_complete(path)
+
+    assert tracker.pop_ready() == [(path, 1000.0)]
+    assert len(tracker) == 0
+
+
+def test_stable_file_needs_two_equal_probes(tmp_path, clock):
+    tracker = CompletionTracker(1, 30)
+    path = str(tmp_path / 'a.mkv')
+    _write(path, 'x')
+    tracker.track(path)
+
+    assert tracker.pop_ready() == []  # Aún no toca sondear
+    clock.now += 1
+    assert tracker.pop_ready() == []  # Primer sondeo
+    clock.now += 1
+    assert tracker.pop_ready() == [(path, 1000.0)]
+
+
+def test_growing_file_backs_off_up_to_max_interval(tmp_path, clock):
+    tracker = CompletionTracker(1, 4)
+    path = str(tmp_path / 'a.mkv')
+    tracker.track(path)
+    intervals = []
+    for step in range(5):
+        _write(path, 'x' * (step + 1))
+        clock.now = tracker._files[path]['next']
+        assert tracker.pop_ready() == []
+        intervals.append(tracker._files[path]['interval'])
+
+    assert intervals == [1, 2, 4, 4, 4]
+
+
+def test_vanished_and_discarded_files_are_dropped(tmp_path, clock):
+    tracker = CompletionTracker(1, 30)
+    gone = str(tmp_path / 'gone.mkv')
+    folder = str(tmp_path / 'show')
+    tracker.track(gone)
+    tracker.track(os.path.join(folder, 'e1.mkv'))
+    tracker.track(folder + ' 2.mkv')
+    tracker.discard(folder)
+
+    assert tracker.paths() == [gone, folder + ' 2.mkv']
+    clock.now += 1
+    assert tracker.pop_ready() == []
+    assert tracker.paths() == []
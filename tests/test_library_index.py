@@ -0,0 +1,74 @@
+import os
+import pytest
+from src.library_index import LibraryIndex, get_library_index
+from src.organizer import organize_items
+from src.resolver import resolve_titles
+from src.scanner import iter_classified
+
+
+@pytest.fixture
+def config_env(tmdb_stub):
+    return {'TMDB_API_URL': tmdb_stub.url, 'TMDB_RATE_LIMIT': '1000'}
+
+
+def _video(config, name):
+    path = os.path.join(config.watch_dir, name)
+    with open(path, 'w') as f:
+        f.write(name)
+    return path
+
+
+def test_learned_folders_are_saved_and_forgotten_when_removed(config, tmp_path):
+    path = str(tmp_path / 'library.json')
+    os.makedirs(os.path.join(config.series_dir, 'Dark'))
+    index = LibraryIndex(config.series_dir, path)
+    index.learn('dark', None, 'Dark')
+    index.learn('dark', '2017', 'Missing')  # La carpeta no existe: no se aprende
+    index.save()
+
+    reloaded = LibraryIndex(config.series_dir, path)
+    assert reloaded.lookup('dark') == 'Dark'
+    assert reloaded.lookup('dark', '2017') is None
+
+    os.rmdir(os.path.join(config.series_dir, 'Dark'))
+    assert reloaded.lookup('dark') is None
+    assert reloaded.get_stats()['learned'] == 0
+
+
+def test_resolver_marks_titles_confirmed_by_tmdb(config, tmdb_stub):
+    dark, unknown = {'title': 'Dark'}, {'title': 'Unknown Show'}
+    resolve_titles({'dark': ('episode', 'dark', None, dark), 'unknown': ('episode', 'unknown show', None, unknown)})
+    assert dark.get('tmdb_confirmed') and not unknown.get('tmdb_confirmed')
+
+    # También desde la caché
+    cached = {'title': 'Dark'}
+    resolve_titles({'dark': ('episode', 'dark', None, cached)})
+    assert cached.get('tmdb_confirmed')
+
+
+def test_episodes_sharing_a_title_are_all_confirmed(config, tmdb_stub):
+    _video(config, 'Dark.S01E01.mkv')
+    _video(config, 'Dark.S01E02.mkv')
+    _video(config, 'Unknown.Show.S01E01.mkv')
+    confirmed = {os.path.basename(path): data.get('tmdb_confirmed', False)
+                 for path, _, _, data in iter_classified()}
+    assert confirmed == {'Dark.S01E01.mkv': True, 'Dark.S01E02.mkv': True, 'Unknown.Show.S01E01.mkv': False}
+
+
+def _episode(config, name, title, confirmed):
+    data = {'type': 'episode', 'title': title, 'season': 1, 'episode': 1}
+    if confirmed:
+        data['tmdb_confirmed'] = True
+    return _video(config, name), 'episode', f'{title} - S01E01', data
+
+
+def test_only_confirmed_series_folders_are_learned(config):
+    # El título oficial puede coincidir con el de guessit: lo que cuenta es la confirmación
+    organize_items([_episode(config, 'Dark.S01E01.mkv', 'Dark', confirmed=True),
+                    _episode(config, 'Guessed.S01E01.mkv', 'Guessed', confirmed=False)])
+
+    library = get_library_index()
+    assert library.lookup('dark') == 'Dark'
+    assert library.lookup('guessed') is None
+    assert os.path.isdir(os.path.join(config.series_dir, 'Guessed'))
+    assert LibraryIndex(config.series_dir, config.library_index_path).learned == {'dark': 'Dark'}
@@ -0,0 +1,34 @@
+import os
+from src.reconcile import diff_watch_dir
+
+
+def _touch(config, name):
+    path = os.path.join(config.watch_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w'):
+        pass
+    return path
+
+
+def test_cleanup_keeps_existing_sources_without_links(config, link_manager_class):
+    manager = link_manager_class()
+    kept = _touch(config, 'kept.mkv')
+    gone = os.path.join(config.watch_dir, 'gone.mkv')
+    manager.add_link(kept, '/dest/missing.mkv')
+    manager.add_link(gone, '/dest/missing-too.mkv')
+
+    assert manager.cleanup_broken_links(workers=2) == 2
+    assert manager.get_all_sources() == {kept}
+    assert manager.get_unlinked_sources() == [kept]
+
+
+def test_diff_leaves_unlinked_sources_for_after_cleanup(config, link_manager_class):
+    manager = link_manager_class()
+    kept = _touch(config, 'show/kept.mkv')
+    new = _touch(config, 'show/new.mkv')
+    manager.add_link(kept, '/dest/missing.mkv')
+    manager.cleanup_broken_links(workers=2)
+
+    assert diff_watch_dir(manager)['changed'] == [kept]
+    diff = diff_watch_dir(manager, include_unlinked=False)
+    assert diff == {'new': [new], 'changed': [], 'orphaned': []}
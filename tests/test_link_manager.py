@@ -0,0 +1,138 @@
+import os
+import threading
+from src.link_manager import LinkManager
+
+
+def _paths(config, *names):
+    return [os.path.join(config.watch_dir, name) for name in names]
+
+
+def _in_open_batch(manager, operation):
+    """Ejecuta `operation` dentro de un lote de otro hilo y deja el lote abierto.
+    Retorna la función que lo cierra."""
+    entered, release = threading.Event(), threading.Event()
+
+    def worker():
+        with manager.batch():
+            operation()
+            entered.set()
+            release.wait()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    entered.wait()
+
+    def close():
+        release.set()
+        thread.join()
+    return close
+
+
+def test_batch_is_written_on_close(config):
+    first, second = _paths(config, 'a.mkv', 'b.mkv')
+    manager = LinkManager()
+    with manager.batch():
+        manager.add_link(first, '/dest/a.mkv')
+        with manager.batch():
+            manager.add_link(second, '/dest/b.mkv')
+        assert not os.path.exists(manager.journal_path)
+
+    reloaded = LinkManager()
+    assert reloaded.links == {first: ['/dest/a.mkv'], second: ['/dest/b.mkv']}
+    assert reloaded.source_for('/dest/b.mkv') == second
+
+
+def test_journal_replay(config):
+    first, second, tree_a, tree_b = _paths(config, 'a.mkv', 'b.mkv', 'dir/c.mkv', 'dir/d.mkv')
+    manager = LinkManager()
+    manager.add_link(first, '/dest/a.mkv')
+    manager.add_link(second, '/dest/b.mkv')
+    manager.add_link(tree_a, '/dest/c.mkv')
+    manager.add_link(tree_b, '/dest/d.mkv')
+    manager.remove_source(second)
+    manager.remove_subtree(os.path.join(config.watch_dir, 'dir'))
+
+    # Sin compactar: todo sale del journal
+    assert not os.path.exists(manager.db_path)
+    reloaded = LinkManager()
+    assert reloaded.links == {first: ['/dest/a.mkv']}
+    assert reloaded.source_for('/dest/a.mkv') == first
+
+
+def test_journal_ignores_truncated_last_line(config):
+    source, = _paths(config, 'a.mkv')
+    manager = LinkManager()
+    manager.add_link(source, '/dest/a.mkv')
+    with open(manager.journal_path, 'a', encoding='utf-8') as f:
+        f.write('["add", "/watch/trunc')
+
+    reloaded = LinkManager()
+    assert reloaded.links == {source: ['/dest/a.mkv']}
+    # Se compacta para no seguir anexando tras la línea corrupta
+    with open(reloaded.journal_path, encoding='utf-8') as f:
+        assert f.read() == ''
+
+
+def test_compaction_keeps_pending_batch_operations(config):
+    kept, batched = _paths(config, 'a.mkv', 'b.mkv')
+    manager = LinkManager()
+    manager.add_link(kept, '/dest/a.mkv')
+    with manager.batch():
+        manager.add_link(batched, '/dest/b.mkv')
+        manager.save()
+    assert LinkManager().links == manager.links
+
+
+def test_overlapping_batches_keep_the_applied_order(config):
+    inside, = _paths(config, 'D/x.mkv')
+    manager = LinkManager()
+
+    # Otro hilo añade D/x en un lote y, antes de que lo cierre, se borra D
+    close = _in_open_batch(manager, lambda: manager.add_link(inside, '/dest/x.mkv'))
+    manager.remove_subtree(os.path.join(config.watch_dir, 'D'))
+    close()
+
+    assert manager.links == {}
+    assert LinkManager().links == manager.links
+
+
+def test_overlapping_batch_does_not_drop_later_additions(config):
+    source, = _paths(config, 'a.mkv')
+    manager = LinkManager()
+    manager.add_link(source, '/dest/old.mkv')
+
+    # Un lote (p. ej. la limpieza) elimina la fuente y otro hilo la vuelve a enlazar antes del cierre
+    close = _in_open_batch(manager, lambda: manager.remove_source(source))
+    manager.add_link(source, '/dest/new.mkv')
+    close()
+
+    assert manager.links == {source: ['/dest/new.mkv']}
+    assert LinkManager().links == manager.links
+
+
+def test_stats_can_be_read_while_links_are_added(config):
+    manager = LinkManager()
+    errors = []
+    done = threading.Event()
+
+    def read_stats():
+        while not done.is_set():
+            try:
+                stats = manager.get_stats()
+                manager.get_all_sources()
+            except RuntimeError as e:  # "dictionary changed size during iteration"
+                errors.append(e)
+                return
+            assert stats['total_links'] >= stats['total_sources']
+
+    reader = threading.Thread(target=read_stats)
+    reader.start()
+    try:
+        with manager.batch():
+            for i in range(20000):
+                manager.add_link(os.path.join(config.watch_dir, f'{i}.mkv'), f'/dest/{i}.mkv')
+    finally:
+        done.set()
+        reader.join()
+    assert errors == []
+    assert manager.get_stats() == {'total_sources': 20000, 'total_links': 20000}
@@ -0,0 +1,62 @@
+import os
+from src.link_manager import _PathTrie
+
+
+def _paths(config, *names):
+    return [os.path.join(config.watch_dir, name) for name in names]
+
+
+def test_trie_lists_and_prunes_subtrees():
+    trie = _PathTrie()
+    for path in ('/w/show/e1.mkv', '/w/show/s1/e2.mkv', '/w/show 2/e1.mkv', '/w/show'):
+        trie.add(path)
+
+    assert sorted(trie.under('/w/show')) == ['/w/show/e1.mkv', '/w/show/s1/e2.mkv']
+    assert trie.under('/w/missing') == []
+
+    trie.discard('/w/show/s1/e2.mkv')
+    trie.discard('/w/show/e1.mkv')
+    assert trie.under('/w/show') == []
+    assert sorted(trie.under('/w')) == ['/w/show', '/w/show 2/e1.mkv']
+
+
+def test_sources_under_excludes_sibling_prefixes(config, link_manager_class):
+    manager = link_manager_class()
+    nested, nested_2, direct, sibling = _paths(config, 'show/s1/e1.mkv', 'show/s1/e2.mkv', 'show/e3.mkv',
+                                               'show 2/e1.mkv')
+    for source in (nested, nested_2, direct, sibling):
+        manager.add_link(source, '/dest/' + os.path.relpath(source, config.watch_dir))
+
+    show = os.path.join(config.watch_dir, 'show')
+    assert sorted(manager.sources_under(show)) == sorted([nested, nested_2, direct])
+    assert sorted(manager.sources_under(os.path.join(show, 's1'))) == sorted([nested, nested_2])
+    assert manager.sources_under(os.path.join(config.watch_dir, 'missing')) == []
+
+
+def test_remove_subtree_returns_links_and_keeps_siblings(config, link_manager_class):
+    manager = link_manager_class()
+    inside, nested, sibling = _paths(config, 'show/e1.mkv', 'show/s2/e2.mkv', 'show 2/e1.mkv')
+    manager.add_link(inside, '/dest/e1.mkv')
+    manager.add_link(inside, '/dest/copy/e1.mkv')
+    manager.add_link(nested, '/dest/e2.mkv')
+    manager.add_link(sibling, '/dest/other.mkv')
+
+    removed = manager.remove_subtree(os.path.join(config.watch_dir, 'show'))
+
+    assert {source: sorted(links) for source, links in removed.items()} == {
+        inside: ['/dest/copy/e1.mkv', '/dest/e1.mkv'],
+        nested: ['/dest/e2.mkv'],
+    }
+    assert manager.source_for('/dest/e1.mkv') is None
+    for reopened in (manager, link_manager_class()):
+        assert reopened.get_all_sources() == {sibling}
+        assert reopened.sources_under(os.path.join(config.watch_dir, 'show')) == []
+
+
+def test_remove_source_returns_its_links(config, link_manager_class):
+    manager = link_manager_class()
+    source, = _paths(config, 'a.mkv')
+    manager.add_link(source, '/dest/a.mkv')
+    assert manager.remove_source(source) == ['/dest/a.mkv']
+    assert manager.get_links(source) == []
+    assert manager.remove_source(source) == []
@@ -0,0 +1,73 @@
+import io
+import os
+import json
+from src.inode_index import InodeIndex
+from src.link_manager import LinkManager
+from src.organizer import set_inode_index, set_link_manager
+from src.plan import apply_plan, read_plan, write_plan
+
+
+def _video(config, name):
+    path = os.path.join(config.watch_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(name)
+    return path
+
+
+def _items(config):
+    """Una película suelta y una carpeta con un episodio y su versión extendida."""
+    movie = _video(config, 'Dune.2021.mkv')
+    episode = os.path.dirname(_video(config, 'Dark.S01E01/Dark.S01E01.mkv'))
+    _video(config, 'Dark.S01E01/Dark.S01E01.Extended.mkv')
+    return [(movie, 'movie', 'Dune (2021)', {'type': 'movie', 'title': 'Dune'}),
+            (episode, 'episode', 'Dark - S01E01', {'type': 'episode', 'title': 'Dark', 'season': 1, 'episode': 1})]
+
+
+def test_write_plan_lists_links_without_touching_destinations(config):
+    out = io.StringIO()
+    result = write_plan(iter(_items(config)), out)
+
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    season_dir = os.path.join(config.series_dir, 'Dark', 'Season 01')
+    assert sorted((line['dest'], line['type'], line['title']) for line in lines) == [
+        (os.path.join(config.movies_dir, 'Dune.2021.mkv'), 'movie', 'Dune (2021)'),
+        (os.path.join(season_dir, 'Dark.S01E01.Extended.mkv'), 'episode', 'Dark - S01E01'),
+        (os.path.join(season_dir, 'Dark.S01E01.mkv'), 'episode', 'Dark - S01E01'),
+    ]
+    assert (result.items, result.planned, result.linked) == (2, 3, 0)
+    assert os.listdir(config.series_dir) == [] and os.listdir(config.movies_dir) == []
+
+
+def test_read_plan_skips_invalid_lines():
+    lines = ['', '{"op": "link", "source": "/w/a.mkv", "dest": "/m/a.mkv"}', 'no es json',
+             '{"op": "delete", "source": "/w/b.mkv", "dest": "/m/b.mkv"}', '{"op": "link", "source": "/w/c.mkv"}']
+    assert list(read_plan(lines)) == [{"op": "link", "source": "/w/a.mkv", "dest": "/m/a.mkv"}]
+
+
+def test_apply_plan_links_and_registers_without_classifying(config):
+    out = io.StringIO()
+    write_plan(iter(_items(config)), out)
+    link_manager = LinkManager()
+    set_link_manager(link_manager)
+
+    result = apply_plan(read_plan(io.StringIO(out.getvalue())))
+
+    assert (result.items, result.linked, result.failed) == (3, 3, 0)
+    dest = os.path.join(config.movies_dir, 'Dune.2021.mkv')
+    source = os.path.join(config.watch_dir, 'Dune.2021.mkv')
+    assert os.path.samefile(dest, source)
+    assert link_manager.source_for(dest) == source
+    assert link_manager.get_stats()['total_links'] == 3
+
+
+def test_apply_plan_counts_missing_sources_as_failed(config):
+    source = _video(config, 'Dune.2021.mkv')
+    set_link_manager(LinkManager())
+    set_inode_index(InodeIndex.build([config.series_dir, config.movies_dir]))
+    plan = [{"op": "link", "source": source, "dest": os.path.join(config.movies_dir, 'Dune.2021.mkv')},
+            {"op": "link", "source": source + '.gone', "dest": os.path.join(config.movies_dir, 'gone.mkv')}]
+
+    result = apply_plan(plan)
+    assert (result.items, result.linked, result.failed) == (2, 1, 1)
+    assert os.listdir(config.movies_dir) == ['Dune.2021.mkv']
@@ -0,0 +1,87 @@
+import os
+import pytest
+from watchdog.events import DirDeletedEvent, DirMovedEvent, FileCreatedEvent, FileDeletedEvent, FileMovedEvent
+from src.polling import SnapshotObserver
+
+
+class _Recorder:
+    def __init__(self):
+        self.events = []
+
+    def dispatch(self, event):
+        self.events.append(event)
+
+
+def _write(path, content='x'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def _bump_mtime(dir_path):
+    """Fuerza un mtime distinto: en algunos sistemas de archivos la resolución es gruesa."""
+    stat = os.stat(dir_path)
+    os.utime(dir_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def observer(tmp_path):
+    """Observador sobre tmp_path/watch con una primera pasada ya hecha (línea base)."""
+    root = tmp_path / 'watch'
+    _write(str(root / 'show' / 'e1.mkv'))
+    _write(str(root / 'show' / 'e2.mkv'))
+    observer = SnapshotObserver(str(tmp_path / 'poll.json'), interval=1, max_stats=10000)
+    observer.recorder = _Recorder()
+    observer.schedule(observer.recorder, str(root))
+    observer.poll(emit=False)
+    return observer
+
+
+def _summary(events):
+    return [(type(event), event.src_path, getattr(event, 'dest_path', '')) for event in events]
+
+
+def test_file_replaced_in_place_is_deleted_then_created(observer):
+    path = os.path.join(observer._root, 'show', 'e1.mkv')
+    _write(path + '.new', 'y')
+    os.replace(path + '.new', path)  # Mismo nombre, otro inodo
+    _bump_mtime(os.path.dirname(path))
+
+    observer.poll()
+    assert _summary(observer.recorder.events) == [(FileDeletedEvent, path, ''), (FileCreatedEvent, path, '')]
+
+
+def test_rename_is_reported_as_move(observer):
+    show = os.path.join(observer._root, 'show')
+    os.rename(os.path.join(show, 'e2.mkv'), os.path.join(show, 'e3.mkv'))
+    _bump_mtime(show)
+
+    observer.poll()
+    assert _summary(observer.recorder.events) == [
+        (FileMovedEvent, os.path.join(show, 'e2.mkv'), os.path.join(show, 'e3.mkv'))]
+
+
+def test_directory_rename_and_delete(observer):
+    show, renamed = os.path.join(observer._root, 'show'), os.path.join(observer._root, 'renamed')
+    os.rename(show, renamed)
+    _bump_mtime(observer._root)
+    observer.poll()
+    assert _summary(observer.recorder.events) == [(DirMovedEvent, show, renamed)]
+
+    for name in os.listdir(renamed):
+        os.remove(os.path.join(renamed, name))
+    os.rmdir(renamed)
+    _bump_mtime(observer._root)
+    observer.recorder.events.clear()
+    observer.poll()
+    assert _summary(observer.recorder.events) == [(DirDeletedEvent, renamed, '')]
+
+
+def test_snapshot_is_persisted_between_runs(observer):
+    restarted = SnapshotObserver(observer.snapshot.path, interval=1, max_stats=10000)
+    restarted.schedule(observer.recorder, observer._root)
+    restarted.snapshot.load()
+    assert restarted.snapshot.loaded
+
+    restarted.poll()
+    assert observer.recorder.events == []
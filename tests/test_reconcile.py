@@ -0,0 +1,104 @@
+import os
+import shutil
+import pytest
+from src.fs_walk import DirSnapshot
+from src.reconcile import _remove_orphans, diff_watch_dir
+
+
+@pytest.fixture
+def link_manager(link_manager_class):
+    return link_manager_class()
+
+
+def _touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w'):
+        pass
+
+
+def _walk(config, link_manager, snapshot_path):
+    """Un arranque: diferencia con la instantánea guardada y la vuelve a guardar, como run.py."""
+    snapshot = DirSnapshot(snapshot_path)
+    diff = diff_watch_dir(link_manager, snapshot)
+    snapshot.prune(config.watch_dir)
+    snapshot.save()
+    return diff
+
+
+def _library(config, link_manager):
+    """WATCH_DIR con una temporada enlazada (A) y un video registrado sin links (B)."""
+    linked = [os.path.join(config.watch_dir, 'A', f'a{i}.mkv') for i in range(3)]
+    unlinked = os.path.join(config.watch_dir, 'B', 'b.mkv')
+    for source in linked:
+        _touch(source)
+        dest = os.path.join(config.series_dir, os.path.basename(source))
+        os.link(source, dest)
+        link_manager.add_link(source, dest)
+    _touch(unlinked)
+    link_manager.add_link(unlinked, os.path.join(config.movies_dir, 'b.mkv'))
+    link_manager.cleanup_broken_links(workers=1)  # El destino de b.mkv no existe: queda sin links
+    return linked, unlinked
+
+
+def test_diff_without_snapshot(config, link_manager):
+    linked, unlinked = _library(config, link_manager)
+    new = os.path.join(config.watch_dir, 'C', 'c.mkv')
+    _touch(new)
+    os.remove(linked[0])
+
+    diff = diff_watch_dir(link_manager)
+    assert diff == {"new": [new], "changed": [unlinked], "orphaned": [linked[0]]}
+
+
+def test_snapshot_detects_orphans_under_deleted_directory(config, link_manager, tmp_path):
+    linked, unlinked = _library(config, link_manager)
+    snapshot_path = str(tmp_path / 'snapshot.json')
+    _walk(config, link_manager, snapshot_path)
+
+    shutil.rmtree(os.path.join(config.watch_dir, 'A'))
+    diff = _walk(config, link_manager, snapshot_path)
+
+    assert diff["orphaned"] == sorted(linked)
+    assert diff["new"] == []
+
+
+def test_snapshot_relinks_unlinked_sources_in_unchanged_directories(config, link_manager, tmp_path):
+    _, unlinked = _library(config, link_manager)
+    snapshot_path = str(tmp_path / 'snapshot.json')
+    _walk(config, link_manager, snapshot_path)
+
+    # B no cambia: su video no se lista, pero sigue sin links y debe volver a enlazarse
+    diff = _walk(config, link_manager, snapshot_path)
+    assert diff == {"new": [], "changed": [unlinked], "orphaned": []}
+
+
+def test_snapshot_detects_changes_in_modified_directories(config, link_manager, tmp_path):
+    linked, _ = _library(config, link_manager)
+    snapshot_path = str(tmp_path / 'snapshot.json')
+    _walk(config, link_manager, snapshot_path)
+
+    new = os.path.join(config.watch_dir, 'A', 'a9.mkv')
+    os.remove(linked[1])
+    _touch(new)
+    diff = _walk(config, link_manager, snapshot_path)
+
+    assert diff["orphaned"] == [linked[1]]
+    assert diff["new"] == [new]
+
+
+def test_orphans_lose_their_hard_links(config, link_manager):
+    linked, _ = _library(config, link_manager)
+    os.remove(linked[0])
+
+    assert _remove_orphans(link_manager, [linked[0]], total_known=4) == 1
+    assert not os.path.exists(os.path.join(config.series_dir, 'a0.mkv'))
+    assert linked[0] not in link_manager.get_all_sources()
+
+
+def test_orphans_are_kept_when_watch_dir_looks_unmounted(config, link_manager):
+    linked, _ = _library(config, link_manager)
+    shutil.rmtree(os.path.join(config.watch_dir, 'A'))
+
+    assert _remove_orphans(link_manager, linked, total_known=4) == 0
+    assert all(os.path.exists(os.path.join(config.series_dir, os.path.basename(s))) for s in linked)
+    assert set(linked) <= link_manager.get_all_sources()
@@ -0,0 +1,82 @@
+import os
+import pytest
+from src.parse_cache import ParseCache, get_parse_cache
+from src.scanner import classify_paths, iter_classified
+
+
+@pytest.fixture
+def config_env(tmdb_stub):
+    return {'TMDB_API_URL': tmdb_stub.url, 'TMDB_RATE_LIMIT': '1000'}
+
+
+def _video(config, name):
+    path = os.path.join(config.watch_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write('x')
+    return path
+
+
+def _dangling(config, name):
+    path = os.path.join(config.watch_dir, name)
+    os.symlink(os.path.join(config.watch_dir, 'missing.mkv'), path)
+    return path
+
+
+def test_scan_skips_dangling_symlinks(config, tmdb_stub):
+    movie = _video(config, 'Dune.2021.1080p.mkv')
+    _dangling(config, 'Dark.S01E01.720p.mkv')
+
+    items = list(iter_classified())
+    assert [(path, type_) for path, type_, _, _ in items] == [(movie, 'movie')]
+
+
+def test_classify_paths_skips_vanished_files(config, tmdb_stub):
+    movie = _video(config, 'Dune.2021.1080p.mkv')
+    link = _dangling(config, 'Dark.S01E01.720p.mkv')
+    gone = os.path.join(config.watch_dir, 'Gone.2001.mkv')
+
+    items = classify_paths([movie, link, gone])
+    assert [path for path, _, _, _ in items] == [movie]
+
+
+def test_parse_cache_is_reused_between_scans(config, tmdb_stub):
+    path = _video(config, 'Dune.2021.1080p.mkv')
+    list(iter_classified())
+    assert get_parse_cache().get_stats()['misses'] == 1
+
+    list(iter_classified())
+    assert get_parse_cache().get_stats()['hits'] == 1
+
+    # Un archivo modificado cambia de clave y se vuelve a analizar
+    with open(path, 'a') as f:
+        f.write('more')
+    list(iter_classified())
+    assert get_parse_cache().get_stats()['misses'] == 2
+
+
+def test_parse_cache_evicts_least_recently_used(tmp_path):
+    cache = ParseCache(max_entries=2)
+    cache.set(('a.mkv', 1, 1), {'title': 'A'})
+    cache.set(('b.mkv', 1, 1), {'title': 'B'})
+    cache.get(('a.mkv', 1, 1))
+    cache.set(('c.mkv', 1, 1), {'title': 'C'})
+
+    assert cache.get(('b.mkv', 1, 1)) is None
+    assert cache.get(('a.mkv', 1, 1)) == {'title': 'A'}
+    assert cache.get_stats()['entries'] == 2
+
+
+def test_parse_cache_persists_committed_results(tmp_path):
+    db_path = str(tmp_path / 'parse_cache.sqlite3')
+    cache = ParseCache(max_entries=10, db_path=db_path)
+    cache.set(('a.mkv', 1, 1), {'title': 'A', 'year': 2001})
+    cache.flush()
+
+    reopened = ParseCache(max_entries=10, db_path=db_path)
+    data = reopened.get(('a.mkv', 1, 1))
+    assert data == {'title': 'A', 'year': 2001}
+    # Se devuelve una copia: modificarla no altera la caché
+    data['title'] = 'B'
+    assert reopened.get(('a.mkv', 1, 1))['title'] == 'A'
+    assert reopened.get(('a.mkv', 1, 2)) is None
@@ -0,0 +1,94 @@
+import os
+import threading
+import pytest
+from src.link_manager import LinkManager
+from src.sqlite_link_manager import SqliteLinkManager
+
+
+def _paths(config, *names):
+    return [os.path.join(config.watch_dir, name) for name in names]
+
+
+def _call_in_thread(func, timeout=5):
+    """Ejecuta `func` en otro hilo y falla si no termina a tiempo (p. ej. bloqueado por un lote)."""
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault('value', func()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "la llamada quedó bloqueada"
+    return result['value']
+
+
+def test_batch_is_committed_on_close(config):
+    first, second = _paths(config, 'a.mkv', 'b.mkv')
+    manager = SqliteLinkManager()
+    with manager.batch():
+        manager.add_link(first, '/dest/a.mkv')
+        manager.add_link(second, '/dest/b.mkv')
+        assert manager.get_links(first) == ['/dest/a.mkv']
+
+    reopened = SqliteLinkManager()
+    assert reopened.get_links(first) == ['/dest/a.mkv']
+    assert reopened.source_for('/dest/b.mkv') == second
+
+
+def test_batch_rolls_back_on_error(config):
+    source, = _paths(config, 'a.mkv')
+    manager = SqliteLinkManager()
+    with pytest.raises(RuntimeError):
+        with manager.batch():
+            manager.add_link(source, '/dest/a.mkv')
+            raise RuntimeError("fallo a mitad del lote")
+    assert manager.get_links(source) == []
+    assert manager.get_stats() == {"total_sources": 0, "total_links": 0}
+
+
+def test_open_batch_does_not_block_readers_in_other_threads(config):
+    source, pending = _paths(config, 'a.mkv', 'b.mkv')
+    manager = SqliteLinkManager()
+    manager.add_link(source, '/dest/a.mkv')
+    entered, release = threading.Event(), threading.Event()
+
+    def writer():
+        with manager.batch():
+            manager.add_link(pending, '/dest/b.mkv')
+            entered.set()
+            release.wait()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    entered.wait()
+    try:
+        # Los demás hilos ven el estado confirmado, sin esperar al lote
+        assert _call_in_thread(lambda: manager.get_links(source)) == ['/dest/a.mkv']
+        assert _call_in_thread(lambda: manager.sources_under(config.watch_dir)) == [source]
+        assert _call_in_thread(manager.get_stats) == {"total_sources": 1, "total_links": 1}
+    finally:
+        release.set()
+        thread.join()
+    assert manager.get_links(pending) == ['/dest/b.mkv']
+
+
+def test_imports_journal_only_json_map(config):
+    source, = _paths(config, 'a.mkv')
+    json_manager = LinkManager()
+    json_manager.add_link(source, '/dest/a.mkv')
+    json_manager.add_link(source, '/dest/b.mkv')
+    assert not os.path.exists(json_manager.db_path)
+
+    manager = SqliteLinkManager()
+    assert sorted(manager.get_links(source)) == ['/dest/a.mkv', '/dest/b.mkv']
+    assert manager.source_for('/dest/b.mkv') == source
+
+
+def test_json_map_is_imported_only_once(config):
+    source, = _paths(config, 'a.mkv')
+    json_manager = LinkManager()
+    json_manager.add_link(source, '/dest/a.mkv')
+    json_manager.save()
+
+    manager = SqliteLinkManager()
+    manager.remove_source(source)
+
+    # El mapa vacío es legítimo: el JSON antiguo no se vuelve a importar
+    assert SqliteLinkManager().get_stats() == {"total_sources": 0, "total_links": 0}
@@ -0,0 +1,60 @@
+import pytest
+import src.tmdb_cache as tmdb_cache
+from src.tmdb_cache import TmdbCache, get_tmdb_cache, normalize_title_for_cache, title_lookup_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj controlable para las caducidades de la caché."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(tmdb_cache.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return TmdbCache(tmp_path / 'tmdb.db', ttl_seconds=100, negative_ttl_seconds=10)
+
+
+def test_positive_entry_expires_after_ttl(cache, clock):
+    cache.set('movie', 'inception', None, ['Origen', '2010'], found=True)
+    assert cache.get('movie', 'inception') == (True, ['Origen', '2010'])
+
+    clock[0] += 101
+    assert cache.get('movie', 'inception') == (False, None)
+
+
+def test_negative_entry_uses_its_own_ttl(cache, clock):
+    cache.set('episode', 'nope', '2020', None, found=False)
+    assert cache.get('episode', 'nope', '2020') == (True, None)
+    # El año forma parte de la clave
+    assert cache.get('episode', 'nope') == (False, None)
+
+    clock[0] += 11
+    assert cache.get('episode', 'nope', '2020') == (False, None)
+
+
+def test_entries_survive_reopen_and_expired_ones_are_purged(tmp_path, cache, clock):
+    cache.set('episode', 'dark', None, 'Dark', found=True)
+    cache.set('episode', 'gone', None, None, found=False)
+    cache.close()
+
+    clock[0] += 50
+    reopened = TmdbCache(tmp_path / 'tmdb.db', ttl_seconds=100, negative_ttl_seconds=10)
+    assert reopened.get('episode', 'dark') == (True, 'Dark')
+    assert reopened.get_stats() == {"hits": 1, "misses": 0, "entries": 1}
+
+
+def test_global_cache_lives_in_config_dir(config):
+    cache = get_tmdb_cache()
+    assert cache is get_tmdb_cache()
+    assert cache.db_path == str(config.tmdb_cache_path)
+    assert cache.negative_ttl_seconds == config.tmdb_cache_negative_ttl_seconds
+
+
+def test_lookup_keys():
+    assert normalize_title_for_cache('  La  Casa de  PAPEL ') == 'la casa de papel'
+    assert normalize_title_for_cache('Élite') == 'elite'
+    assert title_lookup_key('episode', {'title': 'Dark', 'year': 2017}) == ('episode', 'dark', '2017')
+    # Las películas se buscan sin año
+    assert title_lookup_key('movie', {'title': 'Dune', 'year': 2021}) == ('movie', 'dune', None)
@@ -0,0 +1,94 @@
+import os
+import zlib
+import pytest
+import src.tmdb_export as tmdb_export
+from bench.tmdb_stub import write_export
+from src.resolver import resolve_titles
+from src.tmdb_cache import get_tmdb_cache
+from src.tmdb_export import TmdbExportIndex, build_export_index, get_export_index
+
+MOVIES = ['The Office', 'Breaking Bad', 'Game of Thrones', 'The Lord of the Rings', 'Dune', 'Dune: Part Two',
+          'The Thing', 'The Night', 'Night of the Living Dead', 'Office Space', 'Gone Girl', 'The Game']
+SERIES = ['Dark', 'The Office', 'Game of Thrones']
+
+
+def _id(title):
+    return zlib.crc32(title.encode('utf-8'))
+
+
+@pytest.fixture
+def export_dir(tmp_path):
+    """Exportaciones diarias pequeñas de películas y series, con los IDs del stub."""
+    path = tmp_path / 'exports'
+    path.mkdir()
+    write_export(str(path / 'movie_ids_01_01_2026.json.gz'), MOVIES, 'movie')
+    write_export(str(path / 'tv_series_ids_01_01_2026.json.gz'), SERIES, 'tv')
+    return path
+
+
+@pytest.fixture
+def index(tmp_path, export_dir):
+    db_path = str(tmp_path / 'index.sqlite3')
+    build_export_index(db_path, {'movie': str(export_dir / 'movie_ids_01_01_2026.json.gz'),
+                                 'tv': str(export_dir / 'tv_series_ids_01_01_2026.json.gz')})
+    index = TmdbExportIndex(db_path)
+    yield index
+    index.close()
+
+
+def test_exact_lookup_uses_normalized_title(index):
+    assert index.lookup('movie', 'dune part two').tmdb_id == _id('Dune: Part Two')
+    assert index.lookup('tv', 'THE OFFICE').title == 'The Office'
+    assert index.get_stats() == {'hits': 2, 'fuzzy_hits': 0, 'misses': 0}
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('Game of Throns', 'Game of Thrones'),          # Errata
+    ('The Lord of Rings', 'The Lord of the Rings'),  # Palabra de menos
+    ('The Office US', 'The Office'),                 # Palabra de más
+    ('Gone Girls', 'Gone Girl'),
+])
+def test_fuzzy_lookup_tolerates_typos_and_extra_words(index, query, expected):
+    match = index.lookup('movie', query)
+    assert match is not None and match.title == expected
+    assert index.get_stats()['fuzzy_hits'] == 1
+
+
+def test_unrelated_titles_are_not_matched(index):
+    assert index.lookup('movie', 'Interstellar') is None
+    assert index.lookup('tv', 'Breaking Bad') is None  # Solo existe como película
+    assert index.get_stats()['misses'] == 2
+
+
+@pytest.fixture
+def config_env(export_dir):
+    # Sin red: una petición a TMDb fallaría contra este puerto
+    return {'TMDB_EXPORT_DIR': str(export_dir), 'TMDB_OFFLINE': '1', 'TMDB_API_URL': 'http://127.0.0.1:9/3'}
+
+
+def test_offline_resolves_from_export_without_caching(config):
+    lookups = {
+        ('movie', 'game of throns', None): ('movie', 'game of throns', None, {'title': 'Game of Throns'}),
+        ('episode', 'dark', None): ('episode', 'dark', None, {'title': 'Dark'}),
+        ('episode', 'unknown show', None): ('episode', 'unknown show', None, {'title': 'Unknown Show'}),
+    }
+    assert resolve_titles(lookups) == {
+        ('movie', 'game of throns', None): ('Game of Thrones', None),
+        ('episode', 'dark', None): 'Dark',
+        ('episode', 'unknown show', None): None,
+    }
+    assert get_tmdb_cache().get_stats()['entries'] == 0
+
+
+def test_export_index_is_rebuilt_only_for_new_exports(config, export_dir, monkeypatch):
+    assert get_export_index().lookup('tv', 'Dark').tmdb_id == _id('Dark')
+    built = os.stat(config.tmdb_export_index_path).st_mtime_ns
+
+    monkeypatch.setattr(tmdb_export, '_export_index_loaded', False)
+    assert get_export_index().lookup('tv', 'Dark') is not None
+    assert os.stat(config.tmdb_export_index_path).st_mtime_ns == built
+
+    write_export(str(export_dir / 'tv_series_ids_01_02_2026.json.gz'), SERIES + ['Dark Matter'], 'tv')
+    os.utime(export_dir / 'tv_series_ids_01_02_2026.json.gz', ns=(built + 10**9, built + 10**9))
+    monkeypatch.setattr(tmdb_export, '_export_index_loaded', False)
+    assert get_export_index().lookup('tv', 'Dark Matter').tmdb_id == _id('Dark Matter')
@@ -0,0 +1,77 @@
+import zlib
+import pytest
+import requests
+from src.resolver import _fetch_title, resolve_titles
+from src.tmdb_cache import get_tmdb_cache
+from src.tmdb_utils import get_official_movie_title, get_official_series_title
+
+
+def _id(title):
+    """ID que el stub asigna a un título."""
+    return zlib.crc32(title.encode('utf-8'))
+
+
+@pytest.fixture
+def config_env(tmdb_stub):
+    return {'TMDB_API_URL': tmdb_stub.url, 'TMDB_MAX_RETRIES': '2', 'TMDB_RATE_LIMIT': '1000'}
+
+
+def test_rate_limited_request_is_retried(config, tmdb_stub):
+    tmdb_stub.fail(429, times=2, path='search/tv')
+    assert get_official_series_title({'title': 'Dark'}, raise_errors=True) == f"Serie {_id('Dark')}"
+    assert tmdb_stub.requests == 4  # 2 x 429, búsqueda y detalles
+
+
+def test_server_errors_exhaust_retries(config, tmdb_stub):
+    tmdb_stub.fail(503, times=3, path='search/movie')
+    with pytest.raises(requests.HTTPError):
+        get_official_movie_title({'title': 'Dune'}, raise_errors=True)
+    assert tmdb_stub.requests == 3
+    # Sin raise_errors el fallo equivale a "no encontrado"
+    tmdb_stub.fail(503, times=3, path='search/movie')
+    assert get_official_movie_title({'title': 'Dune'}) == (None, None)
+
+
+def test_transient_details_error_propagates_with_raise_errors(config, tmdb_stub):
+    tmdb_stub.fail(503, times=3, path='tv/')
+    with pytest.raises(requests.HTTPError):
+        get_official_series_title({'title': 'Dark'}, raise_errors=True)
+
+    # Sin raise_errors se conserva el título de la búsqueda en inglés
+    tmdb_stub.fail(503, times=3, path='tv/')
+    assert get_official_series_title({'title': 'Dark'}) == 'Dark'
+
+
+def test_missing_details_fall_back_to_search_title(config, tmdb_stub):
+    tmdb_stub.fail(404, path='movie/', retry_after=None)
+    assert get_official_movie_title({'title': 'Dune'}, raise_errors=True) == ('Dune', '2001')
+
+
+def test_transient_details_error_is_not_cached(config, tmdb_stub):
+    tmdb_stub.fail(502, times=3, path='tv/')
+    assert _fetch_title('episode', 'dark', None, {'title': 'Dark'}) is None
+    assert get_tmdb_cache().get('episode', 'dark') == (False, None)
+
+    assert _fetch_title('episode', 'dark', None, {'title': 'Dark'}) == f"Serie {_id('Dark')}"
+    assert get_tmdb_cache().get('episode', 'dark') == (True, f"Serie {_id('Dark')}")
+
+
+def test_resolve_titles_queries_each_title_once_and_caches(config, tmdb_stub):
+    lookups = {
+        ('movie', 'dune', None): ('movie', 'dune', None, {'title': 'Dune'}),
+        ('episode', 'dark', None): ('episode', 'dark', None, {'title': 'Dark'}),
+        ('episode', 'unknown show', None): ('episode', 'unknown show', None, {'title': 'Unknown Show'}),
+    }
+    tmdb_stub.fail(429, path='search/')
+
+    results = resolve_titles(lookups)
+    assert results == {
+        ('movie', 'dune', None): (f"Titulo {_id('Dune')}", '2001'),
+        ('episode', 'dark', None): f"Serie {_id('Dark')}",
+        ('episode', 'unknown show', None): None,
+    }
+    requests_made = tmdb_stub.requests
+
+    # Segunda pasada: todo sale de la caché (incluido el negativo)
+    assert resolve_titles(lookups) == results
+    assert tmdb_stub.requests == requests_made
@@ -0,0 +1,58 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from src.tracing import collect, export_trace, propagate, span
+
+
+@pytest.fixture
+def config_env():
+    return {'TRACING': '1'}
+
+
+def _names(path):
+    with open(path, encoding='utf-8') as f:
+        return sorted(event['name'] for event in json.load(f)['traceEvents'] if event['ph'] == 'X')
+
+
+def _request(name):
+    with span(name):
+        pass
+
+
+def _batch(name, started, finish):
+    """Un lote: span propio y otro en un hilo del pool, exportado cuando `finish` lo permite."""
+    with collect() as trace, span(name):
+        started.wait()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            list(executor.map(propagate(_request), [name + '_http']))
+        finish.wait()
+    return export_trace(name, trace)
+
+
+def test_concurrent_batches_export_only_their_own_spans(config):
+    started, finish = threading.Barrier(2), threading.Barrier(2)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(_batch, 'first', started, finish)
+        second = executor.submit(_batch, 'second', started, finish)
+        paths = [first.result(), second.result()]
+
+    assert paths[0] != paths[1]
+    assert _names(paths[0]) == ['first', 'first_http']
+    assert _names(paths[1]) == ['second', 'second_http']
+
+
+def test_spans_outside_a_trace_are_not_recorded(config):
+    with span('loose'):
+        pass
+    with collect() as trace:
+        pass
+    assert export_trace('empty', trace) is None
+
+
+def test_tracing_disabled_collects_nothing(config, monkeypatch):
+    monkeypatch.setattr('src.tracing._settings', (False, config.trace_dir, False, config.profile_dir))
+    with collect() as trace, span('ignored'):
+        pass
+    assert trace is None
+    assert export_trace('disabled', trace) is None
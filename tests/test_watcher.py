@@ -0,0 +1,85 @@
+import os
+import time
+import pytest
+from src.link_manager import LinkManager
+from src.watcher import MediaWatcher, _batch_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def watcher(config, clock):
+    return MediaWatcher(LinkManager(), workers=1, stable_seconds=1, max_stable_seconds=30,
+                        coalesce_seconds=60)
+
+
+def _queued(watcher):
+    batches = []
+    while not watcher._batches.empty():
+        key, files = watcher._batches.get()
+        batches.append((key, sorted(path for path, _ in files)))
+    return batches
+
+
+def test_batch_key_groups_episodes_and_season_folders(config):
+    watch = config.watch_dir
+    assert _batch_key(os.path.join(watch, 'The.Office.S01E01.720p.mkv')) == 'the office'
+    assert _batch_key(os.path.join(watch, 'The Office 1x02.mkv')) == 'the office'
+    assert _batch_key(os.path.join(watch, 'The.Office.S02.1080p', 'e1.mkv')) == 'the office'
+    assert _batch_key(os.path.join(watch, 'Dune.2021.mkv')) == 'dune'
+    assert _batch_key(os.path.join(watch, '1917.mkv')) == '1917'
+
+
+def test_group_is_held_while_a_sibling_is_still_copying(config, watcher, clock):
+    done = [os.path.join(config.watch_dir, f'Dark.S01E0{i}.mkv') for i in (1, 2)]
+    copying = os.path.join(config.watch_dir, 'Dark.S01E03.mkv')
+    other = os.path.join(config.watch_dir, 'Dune.2021.mkv')
+    watcher.pending_files.track(copying)
+    for path in done + [other]:
+        watcher.pending_files.mark_complete(path)
+
+    watcher.process_pending_files()
+    assert _queued(watcher) == [('dune', [other])]
+    assert watcher.queue_depth() == 3
+
+    # La copia termina dentro de la ventana: toda la temporada va en un lote
+    clock[0] += 5
+    watcher.pending_files.mark_complete(copying)
+    watcher.process_pending_files()
+    assert _queued(watcher) == [('dark', sorted(done + [copying]))]
+
+
+def test_held_group_is_released_after_coalesce_window(config, watcher, clock):
+    done = os.path.join(config.watch_dir, 'Dark.S01E01.mkv')
+    copying = os.path.join(config.watch_dir, 'Dark.S01E02.mkv')
+    watcher.pending_files.track(copying)
+    watcher.pending_files.mark_complete(done)
+
+    watcher.process_pending_files()
+    assert _queued(watcher) == []
+
+    clock[0] += 61
+    watcher.pending_files.track(copying)  # Sigue creciendo
+    watcher.process_pending_files()
+    assert _queued(watcher) == [('dark', [done])]
+
+
+def test_group_in_flight_is_not_dispatched_twice(config, watcher, clock):
+    first = os.path.join(config.watch_dir, 'Dark.S01E01.mkv')
+    second = os.path.join(config.watch_dir, 'Dark.S01E02.mkv')
+    watcher.pending_files.mark_complete(first)
+    watcher.process_pending_files()
+    assert _queued(watcher) == [('dark', [first])]
+
+    watcher.pending_files.mark_complete(second)
+    watcher.process_pending_files()
+    assert _queued(watcher) == []  # El lote anterior sigue en proceso
+
+    watcher._in_flight.discard('dark')
+    watcher.process_pending_files()
+    assert _queued(watcher) == [('dark', [second])]